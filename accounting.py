@@ -1,23 +1,347 @@
 import sqlite3
+import threading
+import queue
+import calendar
+import datetime
+import csv
+import io
+import json
+import os
+import re
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache, wraps
 import jdatetime
 from typing import List, Dict, Optional
 
+import tracing
+
 DB_FILE = "accounting.db"
+CONTRACTS_FOLDER = "contracts"
+
+# ===== مدیریت اتصال به پایگاه داده =====
+POOL_SIZE = 8
+PAGE_SIZE = 50
+SQL_IN_CHUNK = 500                    # حداکثر پارامتر در هر IN (...)
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",       # حدود ۱۶ مگابایت کش صفحات
+    "PRAGMA mmap_size=268435456",     # ۲۵۶ مگابایت
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=OFF",
+)
+
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)
+_local = threading.local()
+
+
+def _open_connection():
+    # isolation_level=None: تراکنش‌ها فقط با transaction() شروع می‌شوند
+    con = sqlite3.connect(DB_FILE, check_same_thread=False, isolation_level=None)
+    for pragma in SQLITE_PRAGMAS:
+        con.execute(pragma)
+    return con
+
+
+def _release_connection(con, db_file):
+    if con.in_transaction:
+        con.rollback()
+    if db_file != DB_FILE:
+        con.close()
+        return
+    try:
+        _pool.put_nowait((db_file, con))
+    except queue.Full:
+        con.close()
+
+
+class _ThreadConnection:
+    """اتصال اختصاص‌یافته به یک thread؛ با پایان thread به استخر برمی‌گردد"""
+
+    def __init__(self):
+        self.db_file = DB_FILE
+        self.con = None
+        while self.con is None:
+            try:
+                db_file, con = _pool.get_nowait()
+            except queue.Empty:
+                self.con = _open_connection()
+                break
+            if db_file == DB_FILE:
+                self.con = con
+            else:
+                con.close()
+        self.depth = 0
+        self.changed = set()
+
+    def __del__(self):
+        # threadهای pool کارهای پس‌زمینه تا خروج پروسه می‌مانند و آن موقع متغیرهای ماژول پاک شده‌اند
+        if self.con is not None and _pool is not None:
+            _release_connection(self.con, self.db_file)
+
+
+def _thread_connection():
+    holder = getattr(_local, "holder", None)
+    if holder is None or holder.db_file != DB_FILE:
+        holder = _ThreadConnection()
+        _local.holder = holder
+    return holder
+
 
 def get_connection():
-    return sqlite3.connect(DB_FILE, check_same_thread=False)
+    """اتصال ماندگار thread جاری (نباید توسط فراخواننده بسته شود)"""
+    return _thread_connection().con
 
-def init_db():
-    con = get_connection()
-    cur = con.cursor()
 
+def close_connections():
+    """بستن اتصال thread جاری و تمام اتصال‌های موجود در استخر"""
+    holder = getattr(_local, "holder", None)
+    if holder is not None:
+        _local.holder = None
+        holder.db_file = None
+        del holder
+    while True:
+        try:
+            _, con = _pool.get_nowait()
+        except queue.Empty:
+            break
+        con.close()
+
+
+@contextmanager
+def transaction(*tables):
+    """تراکنش نوشتنی؛ در پایان commit و در صورت خطا rollback می‌شود.
+    فراخوانی تو در تو به صورت SAVEPOINT داخل تراکنش بیرونی اجرا می‌شود.
+    tables جدول‌هایی است که تغییر می‌کنند؛ نسخه آن‌ها پس از commit بیرونی بالا می‌رود
+    و کش cached_read آن‌ها باطل می‌شود ("*" یعنی همه جدول‌ها)."""
+    holder = _thread_connection()
+    con = holder.con
+    savepoint = f"sp_{holder.depth}"
+    if holder.depth == 0:
+        con.execute("BEGIN IMMEDIATE")
+    else:
+        con.execute(f"SAVEPOINT {savepoint}")
+    holder.depth += 1
+    holder.changed.update(tables)
+    try:
+        yield con.cursor()
+    except BaseException:
+        holder.depth -= 1
+        if holder.depth == 0:
+            holder.changed.clear()
+            con.rollback()
+        else:
+            con.execute(f"ROLLBACK TO {savepoint}")
+            con.execute(f"RELEASE {savepoint}")
+        raise
+    holder.depth -= 1
+    if holder.depth == 0:
+        con.commit()
+        changed, holder.changed = holder.changed, set()
+        _bump_table_versions(changed)
+    else:
+        con.execute(f"RELEASE {savepoint}")
+
+
+# ===== کش خواندن با شمارنده نسخه جداول =====
+# هر جدول یک شمارنده نسخه در حافظه پروسه دارد که پس از commit هر نوشتن روی آن یکی بالا می‌رود.
+# نتیجه توابع cached_read با کلید (آرگومان‌ها، نسخه جدول‌های منبع) نگه داشته می‌شود و بین همه
+# sessionهای Streamlit همین پروسه مشترک است. نسخه پس از commit بالا می‌رود و پیش از پرس‌وجو
+# خوانده می‌شود، پس داده کهنه هیچ‌گاه با نسخه جدید ذخیره نمی‌شود.
+READ_CACHE_SIZE = 256
+_table_versions = {}
+_versions_lock = threading.Lock()
+
+def _bump_table_versions(tables):
+    if not tables:
+        return
+    with _versions_lock:
+        for table in tables:
+            _table_versions[table] = _table_versions.get(table, 0) + 1
+
+def table_versions(tables):
+    return tuple(_table_versions.get(table, 0) for table in (*tables, "*"))
+
+def cached_read(*tables):
+    """دکوراتور کش LRU برای توابع خواندنی که فقط به tables وابسته‌اند.
+    خروجی کش‌شده بین فراخواننده‌ها مشترک است و نباید تغییر داده شود."""
+    def decorator(func):
+        cache = OrderedDict()
+        lock = threading.Lock()
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _thread_connection().depth:
+                # داخل تراکنش نوشتنی داده commit نشده دیده می‌شود و نباید کش شود
+                return func(*args, **kwargs)
+            key = (DB_FILE, args, tuple(sorted(kwargs.items())))
+            versions = table_versions(tables)
+            with lock:
+                hit = cache.get(key)
+                if hit is not None and hit[0] == versions:
+                    cache.move_to_end(key)
+                    return hit[1]
+            result = func(*args, **kwargs)
+            with lock:
+                cache[key] = (versions, result)
+                cache.move_to_end(key)
+                while len(cache) > READ_CACHE_SIZE:
+                    cache.popitem(last=False)
+            return result
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
+
+
+def _fetch_dicts(query, params=()):
+    cur = get_connection().execute(query, params)
+    cols = [c[0] for c in cur.description]
+    return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+def _keyset_page(select, conditions, params, order_cols, cursor=None, limit=PAGE_SIZE, descending=True):
+    """یک صفحه از نتایج با صفحه‌بندی keyset (بدون OFFSET).
+    cursor مقدار ستون‌های order_cols در آخرین سطر صفحه قبل است.
+    ستون اول می‌تواند NULL باشد (مثلاً tx_epoch تاریخ نامعتبر) و ستون‌های بعدی یکتا و غیر NULL هستند.
+    مقایسه (col, id) < (?, ?) برای NULL هیچ‌گاه درست نیست، پس گروه NULL (در SQLite آخر ترتیب نزولی و
+    اول ترتیب صعودی) جداگانه با col IS NULL روی همان ایندکس پیمایش می‌شود.
+    خروجی: (سطرها، cursor صفحه بعد یا None اگر صفحه آخر باشد)"""
+    op, direction = ("<", "DESC") if descending else (">", "ASC")
+    first, rest = order_cols[0], order_cols[1:]
+
+    def fetch(extra_conditions, extra_params, count):
+        all_conditions = list(conditions) + extra_conditions
+        query = select
+        if all_conditions:
+            query += " WHERE " + " AND ".join(all_conditions)
+        query += " ORDER BY " + ", ".join(f"{c} {direction}" for c in order_cols) + " LIMIT ?"
+        return _fetch_dicts(query, list(params) + extra_params + [count])
+
+    def after(cols, values):
+        return [f"({', '.join(cols)}) {op} ({', '.join('?' * len(cols))})"], list(values)
+
+    if cursor is None:
+        rows = fetch([], [], limit + 1)
+    elif cursor[0] is None and rest:
+        extra, values = after(rest, cursor[1:])
+        rows = fetch([f"{first} IS NULL"] + extra, values, limit + 1)
+        if not descending and len(rows) <= limit:
+            rows += fetch([f"{first} IS NOT NULL"], [], limit + 1 - len(rows))
+    else:
+        rows = fetch(*after(order_cols, cursor), limit + 1)
+        if descending and rest and len(rows) <= limit:
+            rows += fetch([f"{first} IS NULL"], [], limit + 1 - len(rows))
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = tuple(rows[-1][c.split(".")[-1]] for c in order_cols)
+    return rows, next_cursor
+
+# ===== تاریخ شمسی/میلادی =====
+def _split_date_text(text):
+    """YYYY-MM-DD[ HH:MM[:SS]] (با - یا /) به (سال، ماه، روز، ساعت، دقیقه، ثانیه)"""
+    date_part, _, time_part = text.strip().replace("/", "-").partition(" ")
+    year, month, day = (int(p) for p in date_part.split("-")[:3])
+    hour, minute, second = ([int(p) for p in time_part.split(":")] + [0, 0, 0])[:3] if time_part else (0, 0, 0)
+    if not (0 <= hour < 24 and 0 <= minute < 60 and 0 <= second < 60):
+        raise ValueError(f"invalid time: {text}")
+    return year, month, day, hour, minute, second
+
+@lru_cache(maxsize=8192)
+def _day_info(year, month, day):
+    """برای یک روز شمسی (سال کمتر از ۱۷۰۰) یا میلادی: (epoch ابتدای روز، (سال، ماه، روز) شمسی).
+    تبدیل‌های jdatetime کند هستند و ورودی‌های گروهی روزهای تکراری زیادی دارند، پس نتیجه کش می‌شود."""
+    if year < 1700:
+        jalali = jdatetime.date(year, month, day)
+        gregorian = jalali.togregorian()
+    else:
+        gregorian = datetime.date(year, month, day)
+        jalali = jdatetime.date.fromgregorian(date=gregorian)
+    return calendar.timegm(gregorian.timetuple()), (jalali.year, jalali.month, jalali.day)
+
+def to_jalali(value):
+    """تبدیل تاریخ شمسی یا میلادی به jdatetime.datetime.
+    ورودی می‌تواند date/datetime میلادی، jdatetime یا رشته YYYY-MM-DD[ HH:MM[:SS]] باشد؛
+    رشته‌ای که سالش کمتر از ۱۷۰۰ است شمسی و در غیر این صورت میلادی در نظر گرفته می‌شود."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, jdatetime.datetime):
+        return value
+    if isinstance(value, jdatetime.date):
+        return jdatetime.datetime(value.year, value.month, value.day)
+    if isinstance(value, datetime.datetime):
+        return jdatetime.datetime.fromgregorian(datetime=value)
+    if isinstance(value, datetime.date):
+        return jdatetime.datetime.fromgregorian(date=value)
+
+    year, month, day, hour, minute, second = _split_date_text(str(value))
+    _, (year, month, day) = _day_info(year, month, day)
+    return jdatetime.datetime(year, month, day, hour, minute, second)
+
+def to_gregorian(value):
+    """تبدیل تاریخ شمسی یا میلادی به datetime.datetime میلادی"""
+    jalali = to_jalali(value)
+    return jalali.togregorian() if jalali else None
+
+def shamsi_date_keys(value):
+    """(متن شمسی YYYY-MM-DD HH:MM:SS، ثانیه از epoch، سال‌ماه شمسی مثل 140301) برای یک تاریخ
+    شمسی یا میلادی؛ برای ورودی خالی None و برای تاریخ نامعتبر ValueError."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        year, month, day, hour, minute, second = _split_date_text(value)
+    else:
+        jalali = to_jalali(value)
+        year, month, day = jalali.year, jalali.month, jalali.day
+        hour, minute, second = jalali.hour, jalali.minute, jalali.second
+    day_epoch, (year, month, day) = _day_info(year, month, day)
+    return (f"{year:04d}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}:{second:02d}",
+            day_epoch + hour * 3600 + minute * 60 + second,
+            year * 100 + month)
+
+def date_keys(value):
+    """کلیدهای عددی قابل ایندکس یک تاریخ: (ثانیه از epoch، سال‌ماه شمسی مثل 140301).
+    برای تاریخ خالی یا نامعتبر (None, None) برمی‌گردد."""
+    try:
+        keys = shamsi_date_keys(value)
+    except (ValueError, TypeError):
+        return None, None
+    if keys is None:
+        return None, None
+    return keys[1], keys[2]
+
+def _filter_epoch(value):
+    """epoch یک تاریخ فیلتر؛ برخلاف date_keys برای تاریخ نامعتبر ValueError می‌دهد"""
+    try:
+        keys = shamsi_date_keys(value)
+    except (ValueError, TypeError):
+        keys = None
+    if keys is None:
+        raise ValueError(f"تاریخ نامعتبر: {value}")
+    return keys[1]
+
+def today_epoch():
+    """epoch ابتدای امروز (همان مبنای ستون‌های *_epoch برای تاریخ‌های بدون ساعت)"""
+    return date_keys(jdatetime.date.today())[0]
+
+def _date_epoch(value):
+    return date_keys(value)[0]
+
+def _date_jalali_ym(value):
+    return date_keys(value)[1]
+
+# ===== مهاجرت‌های نسخه‌دار پایگاه داده =====
+def _migration_base_schema(cur):
+    """جدول‌های پایه (جایگزین init_db، migrate_db و migrate_db_v2 قبلی)"""
     # جدول طرف حساب‌ها
     cur.execute('''
         CREATE TABLE IF NOT EXISTS parties (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT NOT NULL,
             phone TEXT,
-            mobile TEXT,
+            mobile TEXT NOT NULL,
             national_id TEXT NOT NULL,
             address TEXT,
             type TEXT CHECK(type IN ('مشتری', 'همکار', 'سایر')),
@@ -90,16 +414,7 @@ def init_db():
         )
     """)
 
-
-
-    con.commit()
-    con.close()
-
-def migrate_db_v2():
-    """ایجاد جدول بانک‌ها در صورت نبودن"""
-    con = get_connection()
-    cur = con.cursor()
-
+    # جدول بانک‌ها
     cur.execute("""
         CREATE TABLE IF NOT EXISTS banks (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -110,125 +425,721 @@ def migrate_db_v2():
         )
     """)
 
-    con.commit()
-    con.close()
+    _migrate_legacy_parties(cur)
 
+_PARTIES_COLUMNS = ["id", "name", "phone", "mobile", "national_id", "address", "type",
+                    "account_status", "initial_balance", "notes"]
 
-def add_transaction(tx_type, amount, description="", contract_file="", party_id=None, sim_card_id=None, payment_method="", bank_account="", reference_number=""):
-    con = get_connection()
-    cur = con.cursor()
-    shamsi_datetime = jdatetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+def _migrate_legacy_parties(cur):
+    """تبدیل جدول parties نسخه‌های قدیمی (نوع «فروشنده» و ستون‌های ناقص) به ساختار فعلی"""
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(parties)")}
+    table_sql = cur.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='parties'").fetchone()[0]
+    if "'همکار'" in table_sql:
+        # اضافه کردن ستون‌ها به جدول قدیمی، اگر وجود نداشتند
+        for column, definition in (("mobile", "TEXT"), ("account_status", "TEXT"),
+                                   ("initial_balance", "INTEGER DEFAULT 0")):
+            if column not in columns:
+                cur.execute(f"ALTER TABLE parties ADD COLUMN {column} {definition}")
+        return
+
+    # تغییر نوع ستون type: ساخت جدول جدید، کپی داده‌ها و جایگزینی
     cur.execute('''
-        INSERT INTO transactions 
-        (tx_type, amount, shamsi_datetime, description, contract_file, party_id, sim_card_id, payment_method, bank_account, reference_number)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (tx_type, amount, shamsi_datetime, description, contract_file, party_id, sim_card_id, payment_method, bank_account, reference_number))
-    con.commit()
-    con.close()
+        CREATE TABLE parties_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            phone TEXT,
+            mobile TEXT NOT NULL,
+            national_id TEXT NOT NULL,
+            address TEXT,
+            type TEXT CHECK(type IN ('مشتری', 'همکار', 'سایر')),
+            account_status TEXT CHECK(account_status IN ('طلبکار', 'بدهکار')),
+            initial_balance INTEGER DEFAULT 0,
+            notes TEXT
+        )
+    ''')
+    copy_columns = [c for c in _PARTIES_COLUMNS if c in columns or c == "mobile"]
+    select = {
+        "type": "CASE WHEN type='فروشنده' THEN 'همکار' ELSE type END",
+        "mobile": "COALESCE(mobile, '')" if "mobile" in columns else "''",
+    }
+    cur.execute(f"""
+        INSERT INTO parties_new ({', '.join(copy_columns)})
+        SELECT {', '.join(select.get(c, c) for c in copy_columns)} FROM parties
+    """)
+    cur.execute("DROP TABLE parties")
+    cur.execute("ALTER TABLE parties_new RENAME TO parties")
 
-def get_all_transactions():
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("SELECT * FROM transactions ORDER BY id DESC")
-    rows = cur.fetchall()
-    cols = [c[0] for c in cur.description]
-    con.close()
-    return [dict(zip(cols, r)) for r in rows]
+def _migration_indexes(cur):
+    """ایندکس‌های ستون‌های پرکاربرد در فیلتر و JOIN"""
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_transactions_shamsi_datetime ON transactions(shamsi_datetime)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_transactions_party_id ON transactions(party_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_transactions_sim_card_id ON transactions(sim_card_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_transaction_payments_transaction_id ON transaction_payments(transaction_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sim_cards_current_owner_id ON sim_cards(current_owner_id)")
 
-def update_transaction(tx_id, tx_type, amount, description):
-    con = get_connection()
-    cur = con.cursor()
+# ستون‌های کلید تاریخ: (جدول، ستون تاریخ متنی، پیشوند ستون‌های کلید)
+DATE_KEY_COLUMNS = [
+    ("transactions", "shamsi_datetime", "tx"),
+    ("checks", "due_date", "due"),
+    ("sim_cards", "purchase_date", "purchase"),
+    ("sim_cards", "sale_date", "sale"),
+]
+
+def _migration_date_keys(cur):
+    """ستون‌های epoch و سال‌ماه شمسی برای تاریخ‌ها، پر کردن مقادیر موجود و ایندکس آن‌ها"""
+    cur.connection.create_function("date_epoch", 1, _date_epoch, deterministic=True)
+    cur.connection.create_function("date_jalali_ym", 1, _date_jalali_ym, deterministic=True)
+    for table, date_column, prefix in DATE_KEY_COLUMNS:
+        columns = {row[1] for row in cur.execute(f"PRAGMA table_info({table})")}
+        for column in (f"{prefix}_epoch", f"{prefix}_jalali_ym"):
+            if column not in columns:
+                cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER")
+        cur.execute(f"""
+            UPDATE {table}
+            SET {prefix}_epoch = date_epoch({date_column}), {prefix}_jalali_ym = date_jalali_ym({date_column})
+        """)
+    # ایندکس پوششی برای گزارش ماهانه (بازه تاریخ + GROUP BY ماه بدون مراجعه به جدول)
     cur.execute("""
-        UPDATE transactions SET tx_type=?, amount=?, description=? WHERE id=?
-    """, (tx_type, amount, description, tx_id))
-    con.commit()
-    con.close()
+        CREATE INDEX IF NOT EXISTS idx_transactions_jalali_ym
+        ON transactions(tx_jalali_ym, tx_epoch, tx_type, amount)
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_transactions_tx_epoch ON transactions(tx_epoch)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_checks_due_epoch ON checks(due_epoch)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sim_cards_purchase_jalali_ym ON sim_cards(purchase_jalali_ym)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sim_cards_sale_jalali_ym ON sim_cards(sale_jalali_ym)")
 
-def delete_transaction(tx_id):
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("DELETE FROM transactions WHERE id=?", (tx_id,))
-    con.commit()
-    con.close()
-    con = get_connection()
-    cur = con.cursor()
+def _migration_reference_indexes(cur):
+    """ایندکس شماره پیگیری برای جلوگیری از ثبت تکراری صورتحساب بانکی"""
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_transactions_reference_number ON transactions(reference_number)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_transaction_payments_reference_number ON transaction_payments(reference_number)")
+
+def _migration_contracts(cur):
+    """جدول آرشیو قراردادها به جای contracts/archive.json؛ محتوای فایل JSON قبلی یک بار وارد می‌شود"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS contracts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            contract_type TEXT,
+            filename TEXT NOT NULL UNIQUE,
+            shamsi_datetime TEXT,
+            sim_number TEXT,
+            party_name TEXT,
+            party_national_id TEXT,
+            amount INTEGER
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_contracts_shamsi_datetime ON contracts(shamsi_datetime, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_contracts_type ON contracts(contract_type, shamsi_datetime, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_contracts_sim_number ON contracts(sim_number)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_contracts_party_name ON contracts(party_name)")
+    _import_archive_json(cur)
+
+# جدول‌های FTS5 با محتوای خارجی: متن در خود جدول اصلی است و trigger ها فقط ایندکس را همگام نگه می‌دارند
+SEARCH_INDEXES = {
+    "parties_fts": ("parties", ("name", "mobile", "national_id")),
+    "sim_cards_fts": ("sim_cards", ("number", "notes")),
+}
+# ستون‌های ایندکس جستجوی سیم کارت از _migration_sim_search_canonical به بعد
+SIM_SEARCH_COLUMNS = ("number", "number_canonical", "notes")
+
+def _migration_search_index(cur):
+    """ایندکس جستجوی متنی (FTS5) روی نام/موبایل/کد ملی طرف حساب‌ها و شماره/توضیحات سیم کارت‌ها"""
+    for fts, (table, columns) in SEARCH_INDEXES.items():
+        _create_search_index(cur, fts, table, columns)
+
+def _create_search_index(cur, fts, table, columns):
+    """جدول FTS5 با محتوای خارجی table، trigger های همگام‌سازی و ساخت اولیه ایندکس"""
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"new.{c}" for c in columns)
+    old_values = ", ".join(f"old.{c}" for c in columns)
+    cur.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            {column_list}, content='{table}', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{fts}_insert AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts} (rowid, {column_list}) VALUES (new.id, {new_values});
+        END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{fts}_delete AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+        END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{fts}_update AFTER UPDATE OF {column_list} ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO {fts} (rowid, {column_list}) VALUES (new.id, {new_values});
+        END
+    """)
+    cur.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+def _migration_sim_canonical(cur):
+    """شماره استاندارد سیم کارت (09xxxxxxxxx) و معکوس آن برای جستجوی پیشوندی و پسوندی روی ایندکس"""
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(sim_cards)")}
+    for column in ("number_canonical", "number_reversed"):
+        if column not in columns:
+            cur.execute(f"ALTER TABLE sim_cards ADD COLUMN {column} TEXT")
+    rows = cur.execute("SELECT id, number FROM sim_cards").fetchall()
+    cur.executemany("UPDATE sim_cards SET number_canonical = ?, number_reversed = ? WHERE id = ?",
+                    [(*sim_number_keys(number), sim_id) for sim_id, number in rows])
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sim_cards_number_canonical ON sim_cards(number_canonical)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sim_cards_number_reversed ON sim_cards(number_reversed)")
+
+def _migration_sim_search_canonical(cur):
+    """ایندکس جستجوی سیم کارت روی شماره استاندارد هم (علاوه بر شماره خام) تا 912...، +98912... و 0912...
+    یکدیگر را پیدا کنند"""
+    for event in ("insert", "delete", "update"):
+        cur.execute(f"DROP TRIGGER IF EXISTS trg_sim_cards_fts_{event}")
+    cur.execute("DROP TABLE IF EXISTS sim_cards_fts")
+    _create_search_index(cur, "sim_cards_fts", "sim_cards", SIM_SEARCH_COLUMNS)
+
+def _migration_check_due_index(cur):
+    """ایندکس (status, due_epoch) برای چک‌های در جریان سررسید آینده/گذشته به ترتیب سررسید"""
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_checks_status_due ON checks(status, due_epoch)")
+
+def _migration_jobs(cur):
+    """جدول کارهای پس‌زمینه (تولید قرارداد و خروجی فایل) با وضعیت، پیشرفت و مسیر فایل نتیجه"""
     cur.execute('''
-        SELECT t.id, t.tx_type, t.amount, t.shamsi_datetime, t.description, 
-               t.contract_file, p.name, s.number, t.payment_method,
-               t.bank_account, t.reference_number
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            title TEXT,
+            status TEXT NOT NULL DEFAULT 'در صف',
+            done INTEGER NOT NULL DEFAULT 0,
+            total INTEGER,
+            message TEXT,
+            result_path TEXT,
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            finished_at TEXT
+        )
+    ''')
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+
+def _import_archive_json(cur):
+    archive_file = os.path.join(os.path.dirname(DB_FILE), CONTRACTS_FOLDER, "archive.json")
+    try:
+        with open(archive_file, "r", encoding="utf-8") as fa:
+            archive = json.load(fa)
+    except (OSError, ValueError):
+        return
+    cur.executemany(
+        "INSERT OR IGNORE INTO contracts (contract_type, filename, shamsi_datetime) VALUES (?, ?, ?)",
+        [(item.get("type"), item["filename"], _archive_datetime(item.get("datetime", "")))
+         for item in archive if item.get("filename")])
+
+def _archive_datetime(text):
+    """1403-05-01_142530 (قالب نام فایل‌های آرشیو) به 1403-05-01 14:25:30"""
+    date_part, _, time_part = text.partition("_")
+    if len(time_part) == 6:
+        return f"{date_part} {time_part[:2]}:{time_part[2:4]}:{time_part[4:]}"
+    return date_part
+
+# ===== جمع‌های دفتر کل (به‌روزرسانی تدریجی با trigger) =====
+LEDGER_TOTALS_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_ledger_totals_insert AFTER INSERT ON transactions
+    BEGIN
+        INSERT INTO ledger_totals (tx_type, total_amount, tx_count)
+        VALUES (COALESCE(NEW.tx_type, ''), COALESCE(NEW.amount, 0), 1)
+        ON CONFLICT(tx_type) DO UPDATE SET
+            total_amount = total_amount + excluded.total_amount,
+            tx_count = tx_count + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_ledger_totals_delete AFTER DELETE ON transactions
+    BEGIN
+        UPDATE ledger_totals
+        SET total_amount = total_amount - COALESCE(OLD.amount, 0), tx_count = tx_count - 1
+        WHERE tx_type = COALESCE(OLD.tx_type, '');
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_ledger_totals_update AFTER UPDATE OF tx_type, amount ON transactions
+    BEGIN
+        UPDATE ledger_totals
+        SET total_amount = total_amount - COALESCE(OLD.amount, 0), tx_count = tx_count - 1
+        WHERE tx_type = COALESCE(OLD.tx_type, '');
+        INSERT INTO ledger_totals (tx_type, total_amount, tx_count)
+        VALUES (COALESCE(NEW.tx_type, ''), COALESCE(NEW.amount, 0), 1)
+        ON CONFLICT(tx_type) DO UPDATE SET
+            total_amount = total_amount + excluded.total_amount,
+            tx_count = tx_count + 1;
+    END
+    """,
+)
+
+def _create_ledger_totals(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS ledger_totals (
+            tx_type TEXT PRIMARY KEY,
+            total_amount INTEGER NOT NULL DEFAULT 0,
+            tx_count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    for trigger in LEDGER_TOTALS_TRIGGERS:
+        cur.execute(trigger)
+    _rebuild_ledger_totals(cur)
+
+_LEDGER_TOTALS_FROM_SCRATCH = """
+    SELECT COALESCE(tx_type, ''), COALESCE(SUM(amount), 0), COUNT(*)
+    FROM transactions GROUP BY COALESCE(tx_type, '')
+"""
+
+def _rebuild_ledger_totals(cur):
+    cur.execute("DELETE FROM ledger_totals")
+    cur.execute(f"INSERT INTO ledger_totals (tx_type, total_amount, tx_count) {_LEDGER_TOTALS_FROM_SCRATCH}")
+
+def check_ledger_totals(rebuild=False):
+    """مقایسه جدول ledger_totals با محاسبه از ابتدا روی transactions.
+    خروجی: فهرست اختلاف‌ها به صورت (tx_type، مقدار ذخیره‌شده، مقدار صحیح)؛
+    اگر rebuild=True و اختلافی باشد، جدول از نو ساخته می‌شود."""
+    with transaction("ledger_totals") as cur:
+        stored = {r[0]: (r[1], r[2]) for r in cur.execute(
+            "SELECT tx_type, total_amount, tx_count FROM ledger_totals WHERE tx_count != 0 OR total_amount != 0")}
+        actual = {r[0]: (r[1], r[2]) for r in cur.execute(_LEDGER_TOTALS_FROM_SCRATCH)}
+        mismatches = [
+            (tx_type, stored.get(tx_type), actual.get(tx_type))
+            for tx_type in sorted(stored.keys() | actual.keys())
+            if stored.get(tx_type) != actual.get(tx_type)
+        ]
+        if mismatches and rebuild:
+            _rebuild_ledger_totals(cur)
+    return mismatches
+
+# ===== مانده طرف حساب‌ها (به‌روزرسانی تدریجی با trigger) =====
+# از دید حساب طرف: پرداخت ما به او بدهکار و دریافت ما از او بستانکار می‌کند.
+# مانده = مانده اولیه (مثبت برای «بدهکار»، منفی برای «طلبکار») + بدهکار - بستانکار؛
+# مانده مثبت یعنی طرف بدهکار است و منفی یعنی طلبکار.
+_PARTY_DEBIT = "CASE WHEN {0}.tx_type LIKE 'پرداخت%' THEN COALESCE({0}.amount, 0) ELSE 0 END"
+_PARTY_CREDIT = "CASE WHEN {0}.tx_type LIKE 'دریافت%' THEN COALESCE({0}.amount, 0) ELSE 0 END"
+_PARTY_OPENING = "CASE WHEN p.account_status = 'بدهکار' THEN 1 ELSE -1 END * COALESCE(p.initial_balance, 0)"
+
+_PARTY_BALANCE_ADD = f"""
+        INSERT INTO party_balances (party_id, debit, credit, tx_count)
+        SELECT NEW.party_id, {_PARTY_DEBIT.format("NEW")}, {_PARTY_CREDIT.format("NEW")}, 1
+        WHERE NEW.party_id IS NOT NULL
+        ON CONFLICT(party_id) DO UPDATE SET
+            debit = debit + excluded.debit,
+            credit = credit + excluded.credit,
+            tx_count = tx_count + 1;
+"""
+_PARTY_BALANCE_SUBTRACT = f"""
+        UPDATE party_balances
+        SET debit = debit - {_PARTY_DEBIT.format("OLD")},
+            credit = credit - {_PARTY_CREDIT.format("OLD")},
+            tx_count = tx_count - 1
+        WHERE party_id = OLD.party_id;
+"""
+PARTY_BALANCE_TRIGGERS = (
+    f"CREATE TRIGGER IF NOT EXISTS trg_party_balances_insert AFTER INSERT ON transactions BEGIN {_PARTY_BALANCE_ADD} END",
+    f"CREATE TRIGGER IF NOT EXISTS trg_party_balances_delete AFTER DELETE ON transactions BEGIN {_PARTY_BALANCE_SUBTRACT} END",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_party_balances_update AFTER UPDATE OF party_id, tx_type, amount ON transactions
+        BEGIN {_PARTY_BALANCE_SUBTRACT} {_PARTY_BALANCE_ADD} END""",
+)
+
+_PARTY_BALANCES_FROM_SCRATCH = f"""
+    SELECT t.party_id, SUM({_PARTY_DEBIT.format("t")}), SUM({_PARTY_CREDIT.format("t")}), COUNT(*)
+    FROM transactions t WHERE t.party_id IS NOT NULL GROUP BY t.party_id
+"""
+
+def _migration_party_balances(cur):
+    """جمع بدهکار/بستانکار هر طرف حساب و ایندکس (party_id, tx_epoch) برای صورتحساب بازه‌ای"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS party_balances (
+            party_id INTEGER PRIMARY KEY,
+            debit INTEGER NOT NULL DEFAULT 0,
+            credit INTEGER NOT NULL DEFAULT 0,
+            tx_count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    for trigger in PARTY_BALANCE_TRIGGERS:
+        cur.execute(trigger)
+    _rebuild_party_balances(cur)
+    # ایندکس جدید ایندکس تک‌ستونی party_id را هم پوشش می‌دهد
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_transactions_party_epoch ON transactions(party_id, tx_epoch)")
+    cur.execute("DROP INDEX IF EXISTS idx_transactions_party_id")
+
+def _rebuild_party_balances(cur):
+    cur.execute("DELETE FROM party_balances")
+    cur.execute(f"INSERT INTO party_balances (party_id, debit, credit, tx_count) {_PARTY_BALANCES_FROM_SCRATCH}")
+
+def check_party_balances(rebuild=False):
+    """مقایسه party_balances با محاسبه از ابتدا روی transactions (مانند check_ledger_totals).
+    خروجی: فهرست (party_id، مقدار ذخیره‌شده، مقدار صحیح) برای طرف حساب‌های دارای اختلاف."""
+    with transaction("party_balances") as cur:
+        stored = {r[0]: tuple(r[1:]) for r in cur.execute(
+            "SELECT party_id, debit, credit, tx_count FROM party_balances WHERE tx_count != 0 OR debit != 0 OR credit != 0")}
+        actual = {r[0]: tuple(r[1:]) for r in cur.execute(_PARTY_BALANCES_FROM_SCRATCH)}
+        mismatches = [
+            (party_id, stored.get(party_id), actual.get(party_id))
+            for party_id in sorted(stored.keys() | actual.keys())
+            if stored.get(party_id) != actual.get(party_id)
+        ]
+        if mismatches and rebuild:
+            _rebuild_party_balances(cur)
+    return mismatches
+
+# ===== جمع‌های موجودی و فروش سیم کارت (به‌روزرسانی تدریجی با trigger) =====
+# سیم کارت بدون sale_epoch موجودی انبار است و در sim_stock_rollup به تفکیک اپراتور و روز خرید جمع می‌شود
+# (روز برای دسته‌بندی سن موجودی لازم است)؛ سیم کارت فروخته‌شده در sim_sales_rollup به تفکیک
+# اپراتور، ماه فروش و ماه خرید. تاریخ نامعلوم با -1 (روز) و 0 (ماه) ذخیره می‌شود تا کلید NULL نداشته باشد.
+_SIM_STOCK_KEY = ("COALESCE({0}.operator, '')", "COALESCE({0}.purchase_epoch / 86400, -1)")
+_SIM_SALES_KEY = ("COALESCE({0}.operator, '')", "COALESCE({0}.sale_jalali_ym, 0)", "COALESCE({0}.purchase_jalali_ym, 0)")
+_SIM_DAYS_HELD = "COALESCE(({0}.sale_epoch - {0}.purchase_epoch) / 86400, 0)"
+
+_SIM_ROLLUP_ADD = f"""
+        INSERT INTO sim_stock_rollup (operator, purchase_day, purchase_jalali_ym, sim_count, cost)
+        SELECT {", ".join(_SIM_STOCK_KEY).format("NEW")}, COALESCE(NEW.purchase_jalali_ym, 0),
+               1, COALESCE(NEW.purchase_price, 0)
+        WHERE NEW.sale_epoch IS NULL
+        ON CONFLICT(operator, purchase_day) DO UPDATE SET
+            sim_count = sim_count + 1,
+            cost = cost + excluded.cost;
+        INSERT INTO sim_sales_rollup (operator, sale_jalali_ym, purchase_jalali_ym, sim_count, cost, revenue,
+                                      days_held, dated_count)
+        SELECT {", ".join(_SIM_SALES_KEY).format("NEW")}, 1, COALESCE(NEW.purchase_price, 0),
+               COALESCE(NEW.sale_price, 0), {_SIM_DAYS_HELD.format("NEW")}, NEW.purchase_epoch IS NOT NULL
+        WHERE NEW.sale_epoch IS NOT NULL
+        ON CONFLICT(operator, sale_jalali_ym, purchase_jalali_ym) DO UPDATE SET
+            sim_count = sim_count + 1,
+            cost = cost + excluded.cost,
+            revenue = revenue + excluded.revenue,
+            days_held = days_held + excluded.days_held,
+            dated_count = dated_count + excluded.dated_count;
+"""
+_SIM_ROLLUP_SUBTRACT = f"""
+        UPDATE sim_stock_rollup
+        SET sim_count = sim_count - 1, cost = cost - COALESCE(OLD.purchase_price, 0)
+        WHERE OLD.sale_epoch IS NULL
+          AND (operator, purchase_day) = ({", ".join(_SIM_STOCK_KEY).format("OLD")});
+        UPDATE sim_sales_rollup
+        SET sim_count = sim_count - 1,
+            cost = cost - COALESCE(OLD.purchase_price, 0),
+            revenue = revenue - COALESCE(OLD.sale_price, 0),
+            days_held = days_held - {_SIM_DAYS_HELD.format("OLD")},
+            dated_count = dated_count - (OLD.purchase_epoch IS NOT NULL)
+        WHERE OLD.sale_epoch IS NOT NULL
+          AND (operator, sale_jalali_ym, purchase_jalali_ym) = ({", ".join(_SIM_SALES_KEY).format("OLD")});
+"""
+SIM_ROLLUP_TRIGGERS = (
+    f"CREATE TRIGGER IF NOT EXISTS trg_sim_rollup_insert AFTER INSERT ON sim_cards BEGIN {_SIM_ROLLUP_ADD} END",
+    f"CREATE TRIGGER IF NOT EXISTS trg_sim_rollup_delete AFTER DELETE ON sim_cards BEGIN {_SIM_ROLLUP_SUBTRACT} END",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_sim_rollup_update
+        AFTER UPDATE OF operator, purchase_price, purchase_epoch, purchase_jalali_ym, sale_price, sale_epoch, sale_jalali_ym
+        ON sim_cards
+        BEGIN {_SIM_ROLLUP_SUBTRACT} {_SIM_ROLLUP_ADD} END""",
+)
+
+_SIM_STOCK_FROM_SCRATCH = f"""
+    SELECT {", ".join(_SIM_STOCK_KEY).format("s")}, MAX(COALESCE(s.purchase_jalali_ym, 0)),
+           COUNT(*), COALESCE(SUM(s.purchase_price), 0)
+    FROM sim_cards s WHERE s.sale_epoch IS NULL
+    GROUP BY 1, 2
+"""
+_SIM_SALES_FROM_SCRATCH = f"""
+    SELECT {", ".join(_SIM_SALES_KEY).format("s")}, COUNT(*), COALESCE(SUM(s.purchase_price), 0),
+           COALESCE(SUM(s.sale_price), 0), SUM({_SIM_DAYS_HELD.format("s")}), COUNT(s.purchase_epoch)
+    FROM sim_cards s WHERE s.sale_epoch IS NOT NULL
+    GROUP BY 1, 2, 3
+"""
+
+def _migration_sim_rollups(cur):
+    """جمع‌های موجودی و فروش سیم کارت برای گزارش ارزش موجودی و سودآوری"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS sim_stock_rollup (
+            operator TEXT NOT NULL,
+            purchase_day INTEGER NOT NULL,
+            purchase_jalali_ym INTEGER NOT NULL,
+            sim_count INTEGER NOT NULL DEFAULT 0,
+            cost INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (operator, purchase_day)
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS sim_sales_rollup (
+            operator TEXT NOT NULL,
+            sale_jalali_ym INTEGER NOT NULL,
+            purchase_jalali_ym INTEGER NOT NULL,
+            sim_count INTEGER NOT NULL DEFAULT 0,
+            cost INTEGER NOT NULL DEFAULT 0,
+            revenue INTEGER NOT NULL DEFAULT 0,
+            days_held INTEGER NOT NULL DEFAULT 0,
+            dated_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (operator, sale_jalali_ym, purchase_jalali_ym)
+        )
+    """)
+    for trigger in SIM_ROLLUP_TRIGGERS:
+        cur.execute(trigger)
+    _rebuild_sim_rollups(cur)
+
+def _rebuild_sim_rollups(cur):
+    cur.execute("DELETE FROM sim_stock_rollup")
+    cur.execute("DELETE FROM sim_sales_rollup")
+    cur.execute(f"""
+        INSERT INTO sim_stock_rollup (operator, purchase_day, purchase_jalali_ym, sim_count, cost)
+        {_SIM_STOCK_FROM_SCRATCH}
+    """)
+    cur.execute(f"""
+        INSERT INTO sim_sales_rollup (operator, sale_jalali_ym, purchase_jalali_ym, sim_count, cost, revenue,
+                                      days_held, dated_count)
+        {_SIM_SALES_FROM_SCRATCH}
+    """)
+
+def check_sim_rollups(rebuild=False):
+    """مقایسه sim_stock_rollup و sim_sales_rollup با محاسبه از ابتدا روی sim_cards (مانند check_ledger_totals).
+    خروجی: فهرست (جدول، کلید، مقدار ذخیره‌شده، مقدار صحیح) برای گروه‌های دارای اختلاف."""
+    checks = [
+        ("sim_stock_rollup", "SELECT operator, purchase_day, purchase_jalali_ym, sim_count, cost "
+                             "FROM sim_stock_rollup WHERE sim_count != 0 OR cost != 0", _SIM_STOCK_FROM_SCRATCH, 2),
+        ("sim_sales_rollup", "SELECT operator, sale_jalali_ym, purchase_jalali_ym, sim_count, cost, revenue, "
+                             "days_held, dated_count FROM sim_sales_rollup "
+                             "WHERE sim_count != 0 OR cost != 0 OR revenue != 0", _SIM_SALES_FROM_SCRATCH, 3),
+    ]
+    mismatches = []
+    with transaction("sim_stock_rollup", "sim_sales_rollup") as cur:
+        for table, stored_sql, actual_sql, key_size in checks:
+            stored = {r[:key_size]: r[key_size:] for r in cur.execute(stored_sql)}
+            actual = {r[:key_size]: r[key_size:] for r in cur.execute(actual_sql)}
+            mismatches.extend(
+                (table, key, stored.get(key), actual.get(key))
+                for key in sorted(stored.keys() | actual.keys())
+                if stored.get(key) != actual.get(key)
+            )
+        if mismatches and rebuild:
+            _rebuild_sim_rollups(cur)
+    return mismatches
+
+# ===== اجرای مهاجرت‌ها =====
+# ترتیب این فهرست نباید تغییر کند؛ مهاجرت جدید فقط به انتهای آن اضافه می‌شود.
+# شماره هر مهاجرت (از ۱) همان مقدار PRAGMA user_version پس از اجرای آن است.
+MIGRATIONS = [
+    _migration_base_schema,
+    _create_ledger_totals,
+    _migration_indexes,
+    _migration_date_keys,
+    _migration_reference_indexes,
+    _migration_contracts,
+    _migration_search_index,
+    _migration_sim_canonical,
+    _migration_party_balances,
+    _migration_sim_rollups,
+    _migration_check_due_index,
+    _migration_jobs,
+    _migration_sim_search_canonical,
+]
+
+def get_schema_version():
+    return get_connection().execute("PRAGMA user_version").fetchone()[0]
+
+def run_migrations():
+    """اجرای مهاجرت‌هایی که هنوز روی پایگاه داده اعمال نشده‌اند؛ هر مرحله در یک تراکنش جدا.
+    نسخه داخل همان تراکنش دوباره خوانده می‌شود تا دو پروسه هم‌زمان یک مرحله را دو بار اجرا نکنند."""
+    while True:
+        with transaction("*") as cur:
+            version = cur.execute("PRAGMA user_version").fetchone()[0]
+            if version >= len(MIGRATIONS):
+                return version
+            MIGRATIONS[version](cur)
+            cur.execute(f"PRAGMA user_version = {version + 1}")
+
+def init_db():
+    """ایجاد یا به‌روزرسانی ساختار پایگاه داده"""
+    run_migrations()
+
+
+def add_transaction(tx_type, amount, description="", contract_file="", party_id=None, sim_card_id=None, payment_method="", bank_account="", reference_number=""):
+    shamsi_datetime = jdatetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    tx_epoch, tx_jalali_ym = date_keys(shamsi_datetime)
+    with transaction("transactions") as cur:
+        cur.execute('''
+            INSERT INTO transactions 
+            (tx_type, amount, shamsi_datetime, tx_epoch, tx_jalali_ym, description, contract_file, party_id, sim_card_id, payment_method, bank_account, reference_number)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (tx_type, amount, shamsi_datetime, tx_epoch, tx_jalali_ym, description, contract_file, party_id, sim_card_id, payment_method, bank_account, reference_number))
+        return cur.lastrowid
+
+def _lookup_ids(cur, table, column, values):
+    """نگاشت value -> id برای مقادیر داده‌شده با پرس‌وجوهای IN تکه‌تکه"""
+    values = [v for v in set(values) if v]
+    found = {}
+    for i in range(0, len(values), SQL_IN_CHUNK):
+        chunk = values[i:i + SQL_IN_CHUNK]
+        placeholders = ", ".join("?" * len(chunk))
+        found.update(cur.execute(f"SELECT {column}, id FROM {table} WHERE {column} IN ({placeholders})", chunk))
+    return found
+
+def add_contract_transactions(contracts):
+    """ثبت تراکنش مالی گروهی از قراردادها در یک تراکنش پایگاه داده.
+    هر عضو dict با کلیدهای tx_type، amount، description، contract_file و اختیاری sim_number و party_national_id است؛
+    سیم کارت و طرف حساب در صورت وجود از روی شماره استاندارد و کد ملی پیدا می‌شوند."""
+    shamsi_datetime = jdatetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    tx_epoch, tx_jalali_ym = date_keys(shamsi_datetime)
+    with transaction("transactions") as cur:
+        sim_ids = _lookup_ids(cur, "sim_cards", "number_canonical",
+                              (normalize_sim_number(c.get("sim_number")) for c in contracts))
+        party_ids = _lookup_ids(cur, "parties", "national_id", (c.get("party_national_id") for c in contracts))
+        cur.executemany('''
+            INSERT INTO transactions
+            (tx_type, amount, shamsi_datetime, tx_epoch, tx_jalali_ym, description, contract_file, party_id, sim_card_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (c["tx_type"], c["amount"], shamsi_datetime, tx_epoch, tx_jalali_ym, c.get("description", ""),
+             c.get("contract_file", ""), party_ids.get(c.get("party_national_id")),
+             sim_ids.get(normalize_sim_number(c.get("sim_number"))))
+            for c in contracts
+        ])
+    return len(contracts)
+
+PAYMENT_COLUMNS = ["payment_method", "amount", "bank_account", "reference_number", "notes"]
+
+def record_transaction(tx, payments=()):
+    """ثبت یک تراکنش همراه با همه پرداخت‌هایش در یک تراکنش پایگاه داده (یک commit)؛ خروجی id تراکنش.
+    tx dict با کلیدهای tx_type و amount و اختیاری description، contract_file، party_id و sim_card_id است؛
+    به جای party_id و sim_card_id می‌توان party_national_id و sim_number داد تا مثل add_contract_transactions پیدا شوند.
+    هر پرداخت dict با کلیدهای PAYMENT_COLUMNS است. اگر پرداختی داده شود مبلغ هر پرداخت باید مثبت و جمع آن‌ها
+    برابر amount تراکنش باشد، وگرنه ValueError داده می‌شود و چیزی ثبت نمی‌شود."""
+    payments = list(payments)
+    if any(p["amount"] <= 0 for p in payments):
+        raise ValueError("مبلغ هر پرداخت باید بیشتر از صفر باشد")
+    paid = sum(p["amount"] for p in payments)
+    if payments and paid != tx["amount"]:
+        raise ValueError(f"جمع پرداخت‌ها ({paid:,}) با مبلغ تراکنش ({tx['amount']:,}) برابر نیست")
+    shamsi_datetime = jdatetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    tx_epoch, tx_jalali_ym = date_keys(shamsi_datetime)
+    with transaction("transactions", "transaction_payments") as cur:
+        party_id, sim_card_id = tx.get("party_id"), tx.get("sim_card_id")
+        if party_id is None and tx.get("party_national_id"):
+            national_id = tx["party_national_id"]
+            party_id = _lookup_ids(cur, "parties", "national_id", [national_id]).get(national_id)
+        if sim_card_id is None and tx.get("sim_number"):
+            number = normalize_sim_number(tx["sim_number"])
+            sim_card_id = _lookup_ids(cur, "sim_cards", "number_canonical", [number]).get(number)
+        cur.execute('''
+            INSERT INTO transactions
+            (tx_type, amount, shamsi_datetime, tx_epoch, tx_jalali_ym, description, contract_file, party_id, sim_card_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (tx["tx_type"], tx["amount"], shamsi_datetime, tx_epoch, tx_jalali_ym, tx.get("description", ""),
+              tx.get("contract_file", ""), party_id, sim_card_id))
+        tx_id = cur.lastrowid
+        cur.executemany(f'''
+            INSERT INTO transaction_payments (transaction_id, {", ".join(PAYMENT_COLUMNS)})
+            VALUES (?, {", ".join("?" * len(PAYMENT_COLUMNS))})
+        ''', [(tx_id, *(p.get(col, "") for col in PAYMENT_COLUMNS)) for p in payments])
+    return tx_id
+
+def get_all_transactions():
+    return _fetch_dicts("SELECT * FROM transactions ORDER BY id DESC")
+
+def get_transactions_page(cursor=None, limit=PAGE_SIZE, tx_type=None, party_id=None, sim_card_id=None,
+                          start_date=None, end_date=None):
+    """تراکنش‌ها به ترتیب زمان (جدیدترین اول) با صفحه‌بندی keyset روی (tx_epoch, id).
+    start_date و end_date شمسی یا میلادی (مانند to_jalali) و هر دو شامل هستند؛ بازه روی ایندکس tx_epoch
+    فیلتر می‌شود. برای تاریخ نامعتبر ValueError داده می‌شود."""
+    conditions, params = [], []
+    if tx_type:
+        conditions.append("t.tx_type = ?")
+        params.append(tx_type)
+    if party_id:
+        conditions.append("t.party_id = ?")
+        params.append(party_id)
+    if sim_card_id:
+        conditions.append("t.sim_card_id = ?")
+        params.append(sim_card_id)
+    if start_date:
+        conditions.append("t.tx_epoch >= ?")
+        params.append(date_keys(to_jalali(start_date).date())[0])
+    if end_date:
+        conditions.append("t.tx_epoch < ?")
+        params.append(date_keys(to_jalali(end_date).date())[0] + 24 * 3600)
+    return _keyset_page('''
+        SELECT t.id, t.tx_type, t.amount, t.shamsi_datetime, t.tx_epoch, t.description, t.contract_file,
+               t.party_id, p.name as party_name, t.sim_card_id, s.number as sim_number
         FROM transactions t
         LEFT JOIN parties p ON t.party_id = p.id
         LEFT JOIN sim_cards s ON t.sim_card_id = s.id
-        ORDER BY t.shamsi_datetime DESC
-    ''')
-    rows = cur.fetchall()
-    con.close()
-    return [
-        {
-            "id": row[0], "type": row[1], "amount": row[2], "date": row[3],
-            "description": row[4], "contract_file": row[5], "party_name": row[6],
-            "sim_number": row[7], "payment_method": row[8],
-            "bank_account": row[9], "reference_number": row[10]
-        }
-        for row in rows
-    ]
+    ''', conditions, params, ["t.tx_epoch", "t.id"], cursor, limit)
+
+def update_transaction(tx_id, tx_type, amount, description):
+    update_transactions([{"id": tx_id, "tx_type": tx_type, "amount": amount, "description": description}])
+
+def update_transactions(rows):
+    """ویرایش گروهی تراکنش‌ها با یک executemany؛ هر عضو dict با کلیدهای id، tx_type، amount و description.
+    خروجی تعداد تراکنش‌های ویرایش‌شده است."""
+    with transaction("transactions") as cur:
+        cur.executemany("""
+            UPDATE transactions SET tx_type=?, amount=?, description=? WHERE id=?
+        """, [(row["tx_type"], row["amount"], row["description"], row["id"]) for row in rows])
+        return cur.rowcount
+
+def delete_transaction(tx_id):
+    delete_transactions([tx_id])
+
+def delete_transactions(tx_ids):
+    """حذف گروهی تراکنش‌ها همراه با پرداخت‌هایشان در یک تراکنش؛ خروجی تعداد تراکنش‌های حذف‌شده"""
+    ids = [(int(tx_id),) for tx_id in tx_ids]
+    with transaction("transactions", "transaction_payments") as cur:
+        cur.executemany("DELETE FROM transaction_payments WHERE transaction_id=?", ids)
+        cur.executemany("DELETE FROM transactions WHERE id=?", ids)
+        return cur.rowcount
 
 def finance_summary():
-    txs = get_all_transactions()
-    total_income = sum(t["amount"] for t in txs if t["type"].startswith("دریافت"))
-    total_outcome = sum(t["amount"] for t in txs if t["type"].startswith("پرداخت"))
+    totals = get_connection().execute(
+        "SELECT tx_type, total_amount, tx_count FROM ledger_totals WHERE tx_count > 0").fetchall()
+    total_income = sum(amount for tx_type, amount, _ in totals if tx_type.startswith("دریافت"))
+    total_outcome = sum(amount for tx_type, amount, _ in totals if tx_type.startswith("پرداخت"))
     balance = total_income - total_outcome
     return {
         "total_income": total_income,
         "total_outcome": total_outcome,
-        "balance": balance
+        "balance": balance,
+        "counts": {tx_type: count for tx_type, _, count in totals}
     }
 
 def get_financial_reports(start_date=None, end_date=None):
-    con = get_connection()
-    cur = con.cursor()
-    
-    query = '''
-        SELECT 
-            strftime('%Y-%m', shamsi_datetime) as month,
-            SUM(CASE WHEN tx_type LIKE 'دریافت%' THEN amount ELSE 0 END) as income,
-            SUM(CASE WHEN tx_type LIKE 'پرداخت%' THEN amount ELSE 0 END) as expense,
-            SUM(CASE WHEN tx_type LIKE 'دریافت%' THEN amount ELSE -amount END) as balance
-        FROM transactions
-    '''
-    
-    params = []
-    if start_date and end_date:
-        query += " WHERE shamsi_datetime BETWEEN ? AND ?"
-        params = [start_date, end_date]
+    """گزارش ماهانه (بر اساس ماه شمسی) و تفکیک اپراتور.
+    start_date و end_date می‌توانند شمسی یا میلادی باشند (مانند to_jalali) و هر دو شامل می‌شوند."""
+    cur = get_connection().cursor()
+
+    conditions, params = [], []
+    start = to_jalali(start_date)
+    end = to_jalali(end_date)
+    if start:
+        start_epoch, start_ym = date_keys(start.date())
+        conditions += ["t.tx_jalali_ym >= ?", "t.tx_epoch >= ?"]
+        params += [start_ym, start_epoch]
+    if end:
+        end_epoch, end_ym = date_keys(end.date())
+        conditions += ["t.tx_jalali_ym <= ?", "t.tx_epoch < ?"]
+        params += [end_ym, end_epoch + 24 * 3600]
+    where = "".join(f" AND {c}" for c in conditions)
 
-    query += " GROUP BY strftime('%Y-%m', shamsi_datetime) ORDER BY month"
-    cur.execute(query, params)
+    cur.execute(f'''
+        SELECT 
+            printf('%04d-%02d', t.tx_jalali_ym / 100, t.tx_jalali_ym % 100) as month,
+            SUM(CASE WHEN t.tx_type LIKE 'دریافت%' THEN t.amount ELSE 0 END) as income,
+            SUM(CASE WHEN t.tx_type LIKE 'پرداخت%' THEN t.amount ELSE 0 END) as expense,
+            SUM(CASE WHEN t.tx_type LIKE 'دریافت%' THEN t.amount ELSE -t.amount END) as balance
+        FROM transactions t
+        WHERE t.tx_jalali_ym IS NOT NULL{where}
+        GROUP BY t.tx_jalali_ym ORDER BY t.tx_jalali_ym
+    ''', params)
     monthly_report = cur.fetchall()
-    
-    by_operator = []
-    try:
-        cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='sim_cards'")
-        if cur.fetchone():
-            query = '''
-                SELECT 
-                    s.operator,
-                    COUNT(*) as transaction_count,
-                    SUM(t.amount) as total_amount
-                FROM transactions t
-                LEFT JOIN sim_cards s ON t.sim_card_id = s.id
-                WHERE t.sim_card_id IS NOT NULL
-            '''
-            if start_date and end_date:
-                query += " AND t.shamsi_datetime BETWEEN ? AND ?"
-                cur.execute(query, [start_date, end_date])
-            else:
-                cur.execute(query)
-            by_operator = cur.fetchall()
-    except:
-        pass
-    
-    con.close()
+
+    cur.execute(f'''
+        SELECT 
+            s.operator,
+            COUNT(*) as transaction_count,
+            SUM(t.amount) as total_amount
+        FROM transactions t
+        JOIN sim_cards s ON t.sim_card_id = s.id
+        WHERE t.sim_card_id IS NOT NULL{where}
+        GROUP BY s.operator
+    ''', params)
+    by_operator = cur.fetchall()
     
     return {
         'monthly': monthly_report,
@@ -236,23 +1147,88 @@ def get_financial_reports(start_date=None, end_date=None):
     }
 
 def add_party(name, phone="", mobile="", national_id="", address="", party_type="مشتری", account_status="طلبکار", initial_balance=0, notes=""):
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute('''
-        INSERT INTO parties (name, phone, mobile, national_id, address, type, account_status, initial_balance, notes)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (name, phone, mobile, national_id, address, party_type, account_status, initial_balance, notes))
-    con.commit()
-    con.close()
+    with transaction("parties") as cur:
+        cur.execute('''
+            INSERT INTO parties (name, phone, mobile, national_id, address, type, account_status, initial_balance, notes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (name, phone, mobile, national_id, address, party_type, account_status, initial_balance, notes))
 
+@cached_read("parties")
 def get_parties():
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("SELECT * FROM parties")
-    rows = cur.fetchall()
-    cols = [c[0] for c in cur.description]
-    con.close()
-    return [dict(zip(cols, r)) for r in rows]
+    return _fetch_dicts("SELECT * FROM parties")
+
+def get_parties_page(cursor=None, limit=PAGE_SIZE, party_type=None, account_status=None):
+    """طرف حساب‌ها با صفحه‌بندی keyset روی id (جدیدترین اول)"""
+    conditions, params = [], []
+    if party_type:
+        conditions.append("type = ?")
+        params.append(party_type)
+    if account_status:
+        conditions.append("account_status = ?")
+        params.append(account_status)
+    return _keyset_page(f'''
+        SELECT p.*, COALESCE(b.debit, 0) as debit, COALESCE(b.credit, 0) as credit,
+               {_PARTY_OPENING} + COALESCE(b.debit, 0) - COALESCE(b.credit, 0) as balance
+        FROM parties p
+        LEFT JOIN party_balances b ON b.party_id = p.id
+    ''', conditions, params, ["p.id"], cursor, limit)
+
+@cached_read("parties", "transactions", "party_balances")
+def get_party_balances():
+    """مانده جاری همه طرف حساب‌ها از جدول party_balances (بدون پیمایش تراکنش‌ها).
+    balance مثبت: طرف بدهکار، منفی: طرف طلبکار؛ balance_status برچسب همین وضعیت است."""
+    return _fetch_dicts(f'''
+        SELECT p.id, p.name, p.mobile, p.national_id, p.type,
+               {_PARTY_OPENING} as opening_balance,
+               COALESCE(b.debit, 0) as debit, COALESCE(b.credit, 0) as credit,
+               COALESCE(b.tx_count, 0) as tx_count,
+               {_PARTY_OPENING} + COALESCE(b.debit, 0) - COALESCE(b.credit, 0) as balance,
+               CASE WHEN {_PARTY_OPENING} + COALESCE(b.debit, 0) - COALESCE(b.credit, 0) > 0 THEN 'بدهکار'
+                    WHEN {_PARTY_OPENING} + COALESCE(b.debit, 0) - COALESCE(b.credit, 0) < 0 THEN 'طلبکار'
+                    ELSE 'بی‌حساب' END as balance_status
+        FROM parties p
+        LEFT JOIN party_balances b ON b.party_id = p.id
+        ORDER BY p.id
+    ''')
+
+def get_party_statement(party_id, start_date=None, end_date=None):
+    """صورتحساب یک طرف حساب با مانده جاری هر ردیف (تابع پنجره‌ای SUM OVER).
+    start_date و end_date شمسی یا میلادی و شامل هستند. مانده ابتدای بازه (مانده اولیه + گردش قبل از start_date)
+    با یک جمع روی ایندکس (party_id, tx_epoch) به دست می‌آید و فقط ردیف‌های داخل بازه خوانده می‌شوند.
+    خروجی: {"opening_balance"، "rows"، "closing_balance"}"""
+    start_epoch = date_keys(to_jalali(start_date).date())[0] if start_date else None
+    end_epoch = date_keys(to_jalali(end_date).date())[0] + 24 * 3600 if end_date else None
+    before_start = f'''
+        + COALESCE((
+            SELECT SUM({_PARTY_DEBIT.format("t")} - {_PARTY_CREDIT.format("t")})
+            FROM transactions t WHERE t.party_id = p.id AND t.tx_epoch < ?
+        ), 0)''' if start_epoch is not None else ""
+    opening = get_connection().execute(
+        f"SELECT {_PARTY_OPENING} {before_start} FROM parties p WHERE p.id = ?",
+        ([start_epoch] if start_epoch is not None else []) + [party_id]).fetchone()
+    opening_balance = opening[0] if opening else 0
+
+    conditions, params = ["t.party_id = ?"], [opening_balance, party_id]
+    if start_epoch is not None:
+        conditions.append("t.tx_epoch >= ?")
+        params.append(start_epoch)
+    if end_epoch is not None:
+        conditions.append("t.tx_epoch < ?")
+        params.append(end_epoch)
+    rows = _fetch_dicts(f'''
+        SELECT t.id, t.shamsi_datetime, t.tx_type, t.description, t.contract_file,
+               {_PARTY_DEBIT.format("t")} as debit, {_PARTY_CREDIT.format("t")} as credit,
+               ? + SUM({_PARTY_DEBIT.format("t")} - {_PARTY_CREDIT.format("t")})
+                   OVER (ORDER BY t.tx_epoch, t.id ROWS UNBOUNDED PRECEDING) as running_balance
+        FROM transactions t
+        WHERE {" AND ".join(conditions)}
+        ORDER BY t.tx_epoch, t.id
+    ''', params)
+    return {
+        "opening_balance": opening_balance,
+        "rows": rows,
+        "closing_balance": rows[-1]["running_balance"] if rows else opening_balance,
+    }
 
 
 def add_sim_card(
@@ -264,170 +1240,798 @@ def add_sim_card(
     notes: str = ""
 ):
     shamsi_date = jdatetime.datetime.now().strftime("%Y-%m-%d") if not purchase_date else purchase_date
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute('''
-        INSERT INTO sim_cards 
-        (number, operator, status, purchase_date, purchase_price, current_owner_id, notes)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (number, operator, 'فعال', shamsi_date, purchase_price, current_owner_id, notes))
-    con.commit()
-    con.close()
+    purchase_epoch, purchase_jalali_ym = date_keys(shamsi_date)
+    number_canonical, number_reversed = sim_number_keys(number)
+    with transaction("sim_cards") as cur:
+        cur.execute('''
+            INSERT INTO sim_cards 
+            (number, number_canonical, number_reversed, operator, status, purchase_date, purchase_epoch, purchase_jalali_ym,
+             purchase_price, current_owner_id, notes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (number, number_canonical, number_reversed, operator, 'فعال', shamsi_date, purchase_epoch, purchase_jalali_ym,
+              purchase_price, current_owner_id, notes))
 
+@cached_read("sim_cards", "parties")
 def get_sim_cards():
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute('''
+    return _fetch_dicts('''
         SELECT s.id, s.number, s.operator, s.status, s.purchase_price, 
                s.sale_price, p.name as owner_name
         FROM sim_cards s
         LEFT JOIN parties p ON s.current_owner_id = p.id
         ORDER BY s.number
     ''')
-    rows = cur.fetchall()
-    con.close()
-    return [
-        {
-            "id": row[0], "number": row[1], "operator": row[2], 
-            "status": row[3], "purchase_price": row[4],
-            "sale_price": row[5], "owner_name": row[6]
-        }
-        for row in rows
-    ]
+
+def get_sim_cards_page(cursor=None, limit=PAGE_SIZE, operator=None, status=None, owner_id=None):
+    """سیم کارت‌ها به ترتیب شماره با صفحه‌بندی keyset روی number"""
+    conditions, params = [], []
+    if operator:
+        conditions.append("s.operator = ?")
+        params.append(operator)
+    if status:
+        conditions.append("s.status = ?")
+        params.append(status)
+    if owner_id:
+        conditions.append("s.current_owner_id = ?")
+        params.append(owner_id)
+    return _keyset_page('''
+        SELECT s.id, s.number, s.operator, s.status, s.purchase_price, 
+               s.sale_price, p.name as owner_name
+        FROM sim_cards s
+        LEFT JOIN parties p ON s.current_owner_id = p.id
+    ''', conditions, params, ["s.number"], cursor, limit, descending=False)
 
 def update_sim_owner(sim_id: int, new_owner_id: Optional[int], sale_price: Optional[int] = None):
     shamsi_date = jdatetime.datetime.now().strftime("%Y-%m-%d")
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute('''
-        UPDATE sim_cards 
-        SET current_owner_id = ?, sale_price = ?, sale_date = ?
-        WHERE id = ?
-    ''', (new_owner_id, sale_price, shamsi_date, sim_id))
-    con.commit()
-    con.close()
+    sale_epoch, sale_jalali_ym = date_keys(shamsi_date)
+    with transaction("sim_cards") as cur:
+        cur.execute('''
+            UPDATE sim_cards 
+            SET current_owner_id = ?, sale_price = ?, sale_date = ?, sale_epoch = ?, sale_jalali_ym = ?
+            WHERE id = ?
+        ''', (new_owner_id, sale_price, shamsi_date, sale_epoch, sale_jalali_ym, sim_id))
+
+@cached_read("sim_cards", "sim_stock_rollup", "sim_sales_rollup")
+def get_sim_inventory_rollups():
+    """گروه‌های موجودی (kind='stock'، به تفکیک روز خرید) و فروش (kind='sold'، به تفکیک ماه فروش و خرید)
+    در یک پرس‌وجو از جداول rollup؛ تعداد ردیف‌ها به تعداد روزها و ماه‌ها بستگی دارد نه به تعداد سیم کارت‌ها."""
+    return _fetch_dicts("""
+        SELECT 'stock' AS kind, operator, purchase_day, purchase_jalali_ym, 0 AS sale_jalali_ym,
+               sim_count, cost, 0 AS revenue, 0 AS days_held, 0 AS dated_count
+        FROM sim_stock_rollup WHERE sim_count != 0
+        UNION ALL
+        SELECT 'sold', operator, -1, purchase_jalali_ym, sale_jalali_ym,
+               sim_count, cost, revenue, days_held, dated_count
+        FROM sim_sales_rollup WHERE sim_count != 0
+    """)
+
+# ===== خواندن فایل‌های ورودی (CSV/XLSX) =====
+_PERSIAN_DIGITS = str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "01234567890123456789")
+
+def iter_file_rows(file, filename):
+    """خواندن جریانی سطرهای یک فایل CSV یا XLSX به صورت dict با کلید عنوان ستون‌ها.
+    کل فایل در حافظه بارگذاری نمی‌شود؛ برای XLSX به openpyxl نیاز است."""
+    if filename.lower().endswith((".xlsx", ".xlsm")):
+        from openpyxl import load_workbook
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(h).strip() if h is not None else "" for h in next(rows, ())]
+            for values in rows:
+                if any(v is not None and v != "" for v in values):
+                    yield dict(zip(header, values))
+        finally:
+            workbook.close()
+    else:
+        text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+        try:
+            for row in csv.DictReader(text):
+                yield {(k or "").strip(): v for k, v in row.items()}
+        finally:
+            text.detach()
+
+def _cell(row, *names):
+    """مقدار اولین ستون موجود از میان نام‌های انگلیسی/فارسی، به صورت رشته تمیز شده"""
+    for name in names:
+        value = row.get(name)
+        if value is not None and str(value).strip() != "":
+            return str(value).strip().translate(_PERSIAN_DIGITS)
+    return ""
+
+def _parse_amount(text):
+    """تبدیل مبلغ متنی (با جداکننده هزارگان یا اعشار .0 اکسل) به عدد صحیح"""
+    if not text:
+        return None
+    return int(float(text.replace(",", "").replace("٬", "")))
+
+# ===== ورود گروهی سیم کارت =====
+SIM_OPERATORS = {
+    "همراه اول": "همراه اول", "همراه‌اول": "همراه اول", "mci": "همراه اول", "hamrahe aval": "همراه اول",
+    "ایرانسل": "ایرانسل", "irancell": "ایرانسل", "mtn": "ایرانسل",
+    "رایتل": "رایتل", "rightel": "رایتل",
+}
+_SIM_NUMBER_RE = re.compile(r"^(?:\+98|0098|98|0)?9\d{9}$")
+SIM_IMPORT_CHUNK = 1000
+
+def _validate_sim_row(row):
+    """بررسی یک سطر فایل؛ خروجی (مقادیر درج، None) یا (None، دلیل رد)"""
+    number = _sim_digits(_cell(row, "number", "شماره", "شماره سیم کارت"))
+    number_canonical, number_reversed = sim_number_keys(number)
+    if number_canonical is None:
+        return None, "شماره نامعتبر"
+    operator = SIM_OPERATORS.get(_cell(row, "operator", "اپراتور").lower())
+    if operator is None:
+        return None, "اپراتور نامعتبر"
+    try:
+        purchase_price = _parse_amount(_cell(row, "purchase_price", "قیمت خرید"))
+    except ValueError:
+        return None, "قیمت خرید نامعتبر"
+    try:
+        keys = shamsi_date_keys(_cell(row, "purchase_date", "تاریخ خرید") or jdatetime.date.today())
+    except (ValueError, TypeError):
+        return None, "تاریخ خرید نامعتبر"
+    # متن تاریخ همان تاریخ شمسی است که epoch از آن ساخته شده (ورودی میلادی هم شمسی ذخیره می‌شود)
+    purchase_date, purchase_epoch, purchase_jalali_ym = keys[0][:10], keys[1], keys[2]
+    notes = _cell(row, "notes", "توضیحات")
+    return (number, number_canonical, number_reversed, operator, 'فعال', purchase_date, purchase_epoch,
+            purchase_jalali_ym, purchase_price, notes), None
+
+def import_sim_cards(rows, chunk_size=SIM_IMPORT_CHUNK, progress=None):
+    """درج گروهی سیم کارت‌ها از سطرهای iter_file_rows در یک تراکنش واحد.
+    سطرها تکه‌تکه با executemany درج می‌شوند؛ شماره‌های تکراری (UNIQUE(number)) و سطرهای نامعتبر
+    رد و گزارش می‌شوند بدون اینکه کل عملیات متوقف شود؛ تکراری بودن با شماره استاندارد سنجیده می‌شود
+    (0912...، 912... و +98912... یک شماره‌اند).
+    progress در صورت وجود پس از هر تکه با تعداد سطرهای پردازش‌شده فراخوانی می‌شود."""
+    result = {"inserted": 0, "duplicates": [], "invalid": []}
+    processed = 0
+
+    def flush(cur, chunk):
+        numbers = [values[1] for _, values in chunk]
+        existing = {
+            r[0] for r in cur.execute(
+                f"SELECT number_canonical FROM sim_cards WHERE number_canonical IN ({', '.join('?' * len(numbers))})",
+                numbers)
+        }
+        batch, seen = [], set()
+        for line_no, values in chunk:
+            if values[1] in existing or values[1] in seen:
+                result["duplicates"].append((line_no, values[0]))
+            else:
+                seen.add(values[1])
+                batch.append(values)
+        cur.executemany('''
+            INSERT OR IGNORE INTO sim_cards
+            (number, number_canonical, number_reversed, operator, status, purchase_date, purchase_epoch,
+             purchase_jalali_ym, purchase_price, notes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', batch)
+        result["inserted"] += cur.rowcount if cur.rowcount > 0 else 0
+
+    with transaction("sim_cards") as cur:
+        chunk = []
+        # شماره سطر با احتساب سطر عنوان (مطابق آنچه کاربر در اکسل می‌بیند)
+        for line_no, row in enumerate(rows, start=2):
+            values, error = _validate_sim_row(row)
+            if error:
+                result["invalid"].append((line_no, _cell(row, "number", "شماره", "شماره سیم کارت"), error))
+            else:
+                chunk.append((line_no, values))
+            processed += 1
+            if len(chunk) >= chunk_size:
+                flush(cur, chunk)
+                chunk = []
+            if progress and processed % chunk_size == 0:
+                progress(processed)
+        if chunk:
+            flush(cur, chunk)
+        if progress:
+            progress(processed)
+    return result
+
+# ===== شماره استاندارد و جستجوی الگوی سیم کارت =====
+SIM_NUMBER_LENGTH = 11
+SIM_PATTERN_LIMIT = 200
+SIM_MASK_WILDCARDS = "*?xX._"
+
+def _sim_digits(text):
+    """حذف فاصله، خط تیره و پرانتز، تبدیل ارقام فارسی و حذف .0 که اکسل به اعداد اضافه می‌کند"""
+    digits = re.sub(r"[\s\-()]", "", str(text or "")).translate(_PERSIAN_DIGITS)
+    return digits[:-2] if digits.endswith(".0") else digits
+
+def normalize_sim_number(text):
+    """شماره استاندارد 09xxxxxxxxx برای هر شکل ورودی (0912...، 912...، +98912...، 0098912...)؛ نامعتبر: None"""
+    digits = _sim_digits(text)
+    if not _SIM_NUMBER_RE.match(digits):
+        return None
+    return "0" + digits[-10:]
+
+def sim_number_keys(text):
+    """(شماره استاندارد، شماره استاندارد معکوس) برای ستون‌های ایندکس‌شده sim_cards"""
+    canonical = normalize_sim_number(text)
+    return (canonical, canonical[::-1]) if canonical else (None, None)
+
+def _canonical_prefix(text):
+    """ابتدای شماره به شکل استاندارد: 912 -> 0912، +98912 / 0098912 / 98912 -> 0912"""
+    digits = _sim_digits(text).lstrip("+")
+    if digits.startswith("0098"):
+        digits = digits[4:]
+    elif digits.startswith("989"):
+        digits = digits[2:]
+    if digits.startswith("9"):
+        digits = "0" + digits
+    return digits
+
+def _parse_sim_mask(mask):
+    """الگوی ۱۱ (یا ۱۰) نویسه‌ای: رقم = ثابت، * ? x . _ = هر رقم، حرف لاتین = متغیر رند
+    (حرف‌های یکسان رقم یکسان و حرف‌های متفاوت رقم متفاوت؛ مثل 0912***ABAB).
+    خروجی: (فهرست توکن‌ها، گروه‌های حروف {حرف: موقعیت‌ها})"""
+    text = _canonical_prefix(mask) if mask[:1].isdigit() or mask[:1] == "+" else _sim_digits(mask)
+    if len(text) == SIM_NUMBER_LENGTH - 1 and text[0] != "0":
+        text = "0" + text
+    if len(text) != SIM_NUMBER_LENGTH:
+        raise ValueError(f"الگو باید {SIM_NUMBER_LENGTH} نویسه باشد")
+    tokens, letters = [], {}
+    for position, char in enumerate(text):
+        if char.isdigit():
+            tokens.append(char)
+        elif char in SIM_MASK_WILDCARDS:
+            tokens.append(None)
+        elif char.isascii() and char.isalpha():
+            tokens.append(None)
+            letters.setdefault(char.upper(), []).append(position)
+        else:
+            raise ValueError(f"نویسه نامعتبر در الگو: {char}")
+    return tokens, letters
+
+def _fixed_run(tokens):
+    count = 0
+    for token in tokens:
+        if token is None:
+            break
+        count += 1
+    return count
+
+def _glob(tokens):
+    return "".join(token if token is not None else "[0-9]" for token in tokens)
+
+@cached_read("sim_cards", "parties")
+def search_sim_numbers(pattern, kind="mask", limit=SIM_PATTERN_LIMIT, operator=None, status=None):
+    """جستجوی شماره سیم کارت‌ها روی ستون‌های استاندارد ایندکس‌شده.
+    kind: "prefix" (ابتدای شماره)، "suffix" (انتهای شماره) یا "mask" (الگوی _parse_sim_mask).
+    در الگو اگر ارقام ثابت انتهایی از ارقام ثابت ابتدایی بیشتر باشد جستجو روی ستون معکوس انجام می‌شود
+    تا بازه ایندکس کوچک‌تر باشد؛ شرط حروف رند با substr در همان پرس‌وجو بررسی می‌شود."""
+    letters = {}
+    if kind == "mask":
+        tokens, letters = _parse_sim_mask(pattern)
+        if _fixed_run(tokens[::-1]) > _fixed_run(tokens):
+            column, glob = "s.number_reversed", _glob(tokens[::-1])
+        else:
+            column, glob = "s.number_canonical", _glob(tokens)
+    elif kind in ("prefix", "suffix"):
+        digits = _canonical_prefix(pattern) if kind == "prefix" else _sim_digits(pattern)
+        if not digits.isdigit():
+            raise ValueError("فقط رقم مجاز است")
+        column, glob = ("s.number_canonical", digits + "*") if kind == "prefix" else ("s.number_reversed", digits[::-1] + "*")
+    else:
+        raise ValueError(f"unknown pattern kind: {kind}")
+
+    conditions, params = [f"{column} GLOB ?"], [glob]
+    # شرط حروف رند با مقایسه رقم‌ها در خود SQLite (بدون برگرداندن سطرهای نامنطبق به پایتون)
+    digit = "substr(s.number_canonical, {}, 1)".format
+    groups = list(letters.values())
+    for positions in groups:
+        conditions.extend(f"{digit(p + 1)} = {digit(positions[0] + 1)}" for p in positions[1:])
+    for i, first in enumerate(groups):
+        conditions.extend(f"{digit(first[0] + 1)} <> {digit(other[0] + 1)}" for other in groups[i + 1:])
+    if operator:
+        conditions.append("s.operator = ?")
+        params.append(operator)
+    if status:
+        conditions.append("s.status = ?")
+        params.append(status)
+    return _fetch_dicts(f'''
+        SELECT s.id, s.number, s.number_canonical, s.operator, s.status, s.purchase_price, s.sale_price,
+               p.name as owner_name
+        FROM sim_cards s
+        LEFT JOIN parties p ON s.current_owner_id = p.id
+        WHERE {" AND ".join(conditions)}
+        ORDER BY {column}
+        LIMIT ?
+    ''', params + [limit])
 
 # ===== مدیریت بانک‌ها =====
 def add_bank(name, account_number, owner="", notes=""):
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("""
-        INSERT INTO banks (name, account_number, owner, notes)
-        VALUES (?, ?, ?, ?)
-    """, (name, account_number, owner, notes))
-    con.commit()
-    con.close()
+    with transaction("banks") as cur:
+        cur.execute("""
+            INSERT INTO banks (name, account_number, owner, notes)
+            VALUES (?, ?, ?, ?)
+        """, (name, account_number, owner, notes))
 
+@cached_read("banks")
 def get_banks():
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("SELECT * FROM banks")
-    rows = cur.fetchall()
-    cols = [c[0] for c in cur.description]
-    con.close()
-    return [dict(zip(cols, r)) for r in rows]
+    return _fetch_dicts("SELECT * FROM banks")
+
+CHECK_STATUSES = ("در جریان", "وصول شد", "برگشتی")
+CHECK_IN_FLIGHT = "در جریان"
 
 def add_check(check_number, type, bank_id, amount, due_date, status="در جریان", notes=""):
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("""
-        INSERT INTO checks (check_number, type, bank_id, amount, due_date, status, notes)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (check_number, type, bank_id, amount, due_date, status, notes))
-    con.commit()
-    con.close()
+    due_epoch, due_jalali_ym = date_keys(due_date)
+    with transaction("checks") as cur:
+        cur.execute("""
+            INSERT INTO checks (check_number, type, bank_id, amount, due_date, due_epoch, due_jalali_ym, status, notes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (check_number, type, bank_id, amount, due_date, due_epoch, due_jalali_ym, status, notes))
 
 def get_checks():
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("SELECT * FROM checks ORDER BY id DESC")
-    rows = cur.fetchall()
-    cols = [c[0] for c in cur.description]
-    con.close()
-    return [dict(zip(cols, r)) for r in rows]
+    return _fetch_dicts("SELECT * FROM checks ORDER BY id DESC")
+
+def get_checks_page(cursor=None, limit=PAGE_SIZE, check_type=None, status=None, bank_id=None,
+                    due_from=None, due_to=None):
+    """چک‌ها با صفحه‌بندی keyset روی id (جدیدترین اول)؛ due_from و due_to شمسی یا میلادی و شامل هستند.
+    برای تاریخ نامعتبر ValueError داده می‌شود تا اشتباه تایپی به شکل «چکی نیست» دیده نشود."""
+    conditions, params = [], []
+    if check_type:
+        conditions.append("type = ?")
+        params.append(check_type)
+    if status:
+        conditions.append("status = ?")
+        params.append(status)
+    if bank_id:
+        conditions.append("bank_id = ?")
+        params.append(bank_id)
+    if due_from:
+        conditions.append("due_epoch >= ?")
+        params.append(_filter_epoch(due_from))
+    if due_to:
+        conditions.append("due_epoch <= ?")
+        params.append(_filter_epoch(due_to))
+    return _keyset_page("SELECT * FROM checks", conditions, params, ["id"], cursor, limit)
+
+def _checks_due_page(conditions, params, check_type, cursor, limit):
+    """چک‌های در جریان به ترتیب سررسید (قدیمی‌ترین اول) با نام بانک؛ صفحه‌بندی keyset روی (due_epoch, id)"""
+    conditions = ["c.status = ?", *conditions]
+    params = [CHECK_IN_FLIGHT, *params]
+    if check_type:
+        conditions.append("c.type = ?")
+        params.append(check_type)
+    return _keyset_page("""
+        SELECT c.id, c.check_number, c.type, c.amount, c.due_date, c.due_epoch, c.status, c.notes,
+               c.bank_id, b.name AS bank_name
+        FROM checks c
+        LEFT JOIN banks b ON c.bank_id = b.id
+    """, conditions, params, ["c.due_epoch", "c.id"], cursor, limit, descending=False)
+
+def get_checks_due(days=7, cursor=None, limit=PAGE_SIZE, check_type=None):
+    """چک‌های در جریانی که از امروز تا days روز آینده سررسید می‌شوند"""
+    today = today_epoch()
+    return _checks_due_page(["c.due_epoch BETWEEN ? AND ?"], [today, today + days * 86400],
+                            check_type, cursor, limit)
+
+def get_overdue_checks(cursor=None, limit=PAGE_SIZE, check_type=None):
+    """چک‌های در جریانی که سررسیدشان گذشته است"""
+    return _checks_due_page(["c.due_epoch < ?"], [today_epoch()], check_type, cursor, limit)
+
+def get_check_totals_by_bank(days=7):
+    """جمع چک‌های هر بانک در یک GROUP BY: تعداد و مبلغ در جریان (دریافتی/پرداختی)، سررسید days روز آینده،
+    سررسید گذشته، وصول‌شده و برگشتی"""
+    today = today_epoch()
+    in_flight = f"c.status = '{CHECK_IN_FLIGHT}'"
+    return _fetch_dicts(f"""
+        SELECT c.bank_id, b.name AS bank_name, b.account_number,
+               COUNT(*) AS check_count,
+               SUM({in_flight}) AS in_flight_count,
+               COALESCE(SUM(CASE WHEN {in_flight} AND c.type = 'دریافت' THEN c.amount END), 0) AS in_flight_receivable,
+               COALESCE(SUM(CASE WHEN {in_flight} AND c.type = 'پرداخت' THEN c.amount END), 0) AS in_flight_payable,
+               COALESCE(SUM(CASE WHEN {in_flight} AND c.due_epoch BETWEEN :today AND :until THEN c.amount END), 0)
+                   AS due_soon_amount,
+               SUM({in_flight} AND c.due_epoch < :today) AS overdue_count,
+               COALESCE(SUM(CASE WHEN {in_flight} AND c.due_epoch < :today THEN c.amount END), 0) AS overdue_amount,
+               COALESCE(SUM(CASE WHEN c.status = 'وصول شد' THEN c.amount END), 0) AS cleared_amount,
+               COALESCE(SUM(CASE WHEN c.status = 'برگشتی' THEN c.amount END), 0) AS bounced_amount
+        FROM checks c
+        LEFT JOIN banks b ON c.bank_id = b.id
+        GROUP BY c.bank_id
+        ORDER BY overdue_amount DESC, in_flight_count DESC
+    """, {"today": today, "until": today + days * 86400})
+
+def set_checks_status(check_ids, status, from_status=CHECK_IN_FLIGHT):
+    """تغییر وضعیت گروهی چک‌ها با یک دستور UPDATE (مثلاً وصول همه چک‌های انتخاب‌شده).
+    فقط چک‌هایی که وضعیت فعلی‌شان from_status است تغییر می‌کنند (None یعنی هر وضعیتی)؛
+    خروجی تعداد چک‌های تغییرکرده است."""
+    if status not in CHECK_STATUSES:
+        raise ValueError(f"invalid check status: {status}")
+    ids = json.dumps([int(i) for i in check_ids])
+    with transaction("checks") as cur:
+        cur.execute(
+            "UPDATE checks SET status = ? WHERE id IN (SELECT value FROM json_each(?))"
+            + (" AND status = ?" if from_status else ""),
+            (status, ids, from_status) if from_status else (status, ids))
+        return cur.rowcount
 
 def update_check(check_id, **kwargs):
-    con = get_connection()
-    cur = con.cursor()
+    if "due_date" in kwargs:
+        kwargs["due_epoch"], kwargs["due_jalali_ym"] = date_keys(kwargs["due_date"])
     fields = ", ".join([f"{k}=?" for k in kwargs.keys()])
-    cur.execute(f"UPDATE checks SET {fields} WHERE id=?", (*kwargs.values(), check_id))
-    con.commit()
-    con.close()
+    with transaction("checks") as cur:
+        cur.execute(f"UPDATE checks SET {fields} WHERE id=?", (*kwargs.values(), check_id))
 
 def delete_check(check_id):
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("DELETE FROM checks WHERE id=?", (check_id,))
-    con.commit()
-    con.close()
+    with transaction("checks") as cur:
+        cur.execute("DELETE FROM checks WHERE id=?", (check_id,))
 
 # ===== پرداخت‌های چندگانه =====
 def add_payment_to_transaction(transaction_id, payment_method, amount, bank_account="", reference_number="", notes=""):
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("""
-        INSERT INTO transaction_payments
-        (transaction_id, payment_method, amount, bank_account, reference_number, notes)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (transaction_id, payment_method, amount, bank_account, reference_number, notes))
-    con.commit()
-    con.close()
+    with transaction("transaction_payments") as cur:
+        cur.execute("""
+            INSERT INTO transaction_payments
+            (transaction_id, payment_method, amount, bank_account, reference_number, notes)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (transaction_id, payment_method, amount, bank_account, reference_number, notes))
 
 def get_payments_by_transaction(transaction_id):
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("SELECT * FROM transaction_payments WHERE transaction_id=?", (transaction_id,))
-    rows = cur.fetchall()
-    cols = [c[0] for c in cur.description]
-    con.close()
-    return [dict(zip(cols, r)) for r in rows]
+    return _fetch_dicts("SELECT * FROM transaction_payments WHERE transaction_id=?", (transaction_id,))
+
+def get_payments_grouped(transaction_ids):
+    """پرداخت‌های چند تراکنش با پرس‌وجوی IN، گروه‌بندی‌شده بر اساس transaction_id"""
+    grouped = {tx_id: [] for tx_id in transaction_ids}
+    ids = list(grouped)
+    for i in range(0, len(ids), SQL_IN_CHUNK):
+        chunk = ids[i:i + SQL_IN_CHUNK]
+        rows = _fetch_dicts(
+            f"SELECT * FROM transaction_payments WHERE transaction_id IN ({', '.join('?' * len(chunk))}) ORDER BY id",
+            chunk)
+        for row in rows:
+            grouped[row["transaction_id"]].append(row)
+    return grouped
 
 def delete_payment(payment_id):
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("DELETE FROM transaction_payments WHERE id=?", (payment_id,))
-    con.commit()
-    con.close()
+    with transaction("transaction_payments") as cur:
+        cur.execute("DELETE FROM transaction_payments WHERE id=?", (payment_id,))
+
+# ===== ورود صورتحساب بانکی =====
+STATEMENT_FIELDS = {
+    "date": "تاریخ",
+    "amount": "مبلغ (مثبت واریز، منفی برداشت)",
+    "credit": "واریز (بستانکار)",
+    "debit": "برداشت (بدهکار)",
+    "description": "شرح",
+    "reference_number": "شماره پیگیری",
+}
+STATEMENT_BATCH = 5000
 
-def migrate_db():
-    con = get_connection()
-    cur = con.cursor()
+def _existing_references(cur, references):
+    refs = list(references)
+    found = set()
+    for i in range(0, len(refs), SQL_IN_CHUNK):
+        chunk = refs[i:i + SQL_IN_CHUNK]
+        placeholders = ", ".join("?" * len(chunk))
+        found.update(r[0] for r in cur.execute(f"""
+            SELECT reference_number FROM transaction_payments WHERE reference_number IN ({placeholders})
+            UNION
+            SELECT reference_number FROM transactions WHERE reference_number IN ({placeholders})
+        """, chunk + chunk))
+    return found
+
+def _parse_statement_row(row, mapping):
+    """خروجی (shamsi_date_keys تاریخ، مبلغ علامت‌دار، شرح، شماره پیگیری) یا ValueError با دلیل"""
+    def value(field):
+        column = mapping.get(field)
+        return _cell(row, column) if column else ""
 
-    # تغییر نوع ستون type
     try:
-        cur.execute("""
-            ALTER TABLE parties RENAME TO parties_old
-        """)
-        cur.execute('''
-            CREATE TABLE parties (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                phone TEXT,
-                mobile TEXT NOT NULL,
-                national_id TEXT NOT NULL,
-                address TEXT,
-                type TEXT CHECK(type IN ('مشتری', 'همکار', 'سایر')),
-                account_status TEXT CHECK(account_status IN ('طلبکار', 'بدهکار')),
-                initial_balance INTEGER DEFAULT 0,
-                notes TEXT
-            )
-        ''')
-        cur.execute('''
-            INSERT INTO parties (id, name, phone, mobile, national_id, address, type, notes)
-            SELECT id, name, phone, '' as mobile, national_id, address,
-                   CASE WHEN type='فروشنده' THEN 'همکار' ELSE type END as type,
-                   notes
-            FROM parties_old
-        ''')
-        cur.execute("DROP TABLE parties_old")
-    except sqlite3.OperationalError:
-        # اضافه کردن ستون‌ها به جدول قدیمی، اگر وجود نداشتند
-        try: cur.execute("ALTER TABLE parties ADD COLUMN mobile TEXT")
-        except: pass
-        try: cur.execute("ALTER TABLE parties ADD COLUMN account_status TEXT")
-        except: pass
-        try: cur.execute("ALTER TABLE parties ADD COLUMN initial_balance INTEGER DEFAULT 0")
-        except: pass
-
-    con.commit()
-    con.close()
\ No newline at end of file
+        keys = shamsi_date_keys(value("date"))
+    except (ValueError, TypeError):
+        raise ValueError("تاریخ نامعتبر")
+    if keys is None:
+        raise ValueError("تاریخ خالی است")
+    try:
+        if mapping.get("amount"):
+            amount = _parse_amount(value("amount")) or 0
+        else:
+            amount = (_parse_amount(value("credit")) or 0) - (_parse_amount(value("debit")) or 0)
+    except ValueError:
+        raise ValueError("مبلغ نامعتبر")
+    if amount == 0:
+        raise ValueError("مبلغ صفر است")
+    return keys, amount, value("description"), value("reference_number")
+
+def import_bank_statement(rows, mapping, bank_account="", income_type="دریافت فروش", expense_type="پرداخت خرید",
+                          batch_size=STATEMENT_BATCH, progress=None):
+    """ورود جریانی صورتحساب بانکی؛ هر سطر یک تراکنش و یک پرداخت «حواله بانکی» می‌سازد.
+    mapping نام ستون فایل برای هر کلید STATEMENT_FIELDS است (amount یا credit/debit لازم است).
+    سطرهایی که شماره پیگیری‌شان قبلاً ثبت شده (در پایگاه داده یا همین فایل) رد می‌شوند.
+    هر batch_size سطر در یک تراکنش جدا commit می‌شود تا حافظه و قفل پایگاه داده محدود بماند."""
+    result = {"imported": 0, "duplicates": [], "invalid": []}
+    processed = 0
+
+    def flush(batch):
+        with transaction("transactions", "transaction_payments") as cur:
+            existing = _existing_references(cur, {ref for _, (_, _, _, ref) in batch if ref})
+            seen = set()
+            payments = []
+            for line_no, ((shamsi_datetime, tx_epoch, tx_jalali_ym), amount, description, ref) in batch:
+                if ref and (ref in existing or ref in seen):
+                    result["duplicates"].append((line_no, ref))
+                    continue
+                seen.add(ref)
+                cur.execute('''
+                    INSERT INTO transactions
+                    (tx_type, amount, shamsi_datetime, tx_epoch, tx_jalali_ym, description,
+                     payment_method, bank_account, reference_number)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (income_type if amount > 0 else expense_type, abs(amount), shamsi_datetime,
+                      tx_epoch, tx_jalali_ym, description, "حواله بانکی", bank_account, ref))
+                payments.append((cur.lastrowid, "حواله بانکی", abs(amount), bank_account, ref, "صورتحساب بانکی"))
+            cur.executemany("""
+                INSERT INTO transaction_payments
+                (transaction_id, payment_method, amount, bank_account, reference_number, notes)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, payments)
+            result["imported"] += len(payments)
+
+    batch = []
+    for line_no, row in enumerate(rows, start=2):
+        try:
+            batch.append((line_no, _parse_statement_row(row, mapping)))
+        except ValueError as e:
+            result["invalid"].append((line_no, str(e)))
+        processed += 1
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+        if progress and processed % batch_size == 0:
+            progress(processed)
+    if batch:
+        flush(batch)
+    if progress:
+        progress(processed)
+    return result
+
+# ===== آرشیو قراردادها =====
+CONTRACT_COLUMNS = ("contract_type", "filename", "shamsi_datetime", "sim_number", "party_name", "party_national_id", "amount")
+_GLOB_SPECIAL = str.maketrans("", "", "*?[]")
+
+def add_contracts(contracts):
+    """ثبت گروهی فایل‌های قرارداد در آرشیو؛ هر عضو dict با کلیدهای CONTRACT_COLUMNS.
+    داخل transaction() بیرونی به صورت SAVEPOINT اجرا می‌شود."""
+    now = jdatetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with transaction("contracts") as cur:
+        cur.executemany(f'''
+            INSERT INTO contracts ({", ".join(CONTRACT_COLUMNS)})
+            VALUES ({", ".join("?" * len(CONTRACT_COLUMNS))})
+        ''', [
+            tuple(c.get(col) or (now if col == "shamsi_datetime" else None) for col in CONTRACT_COLUMNS)
+            for c in contracts
+        ])
+
+@cached_read("contracts")
+def get_contracts_page(cursor=None, limit=PAGE_SIZE, search=None, contract_type=None):
+    """قراردادهای آرشیو (جدیدترین اول) با صفحه‌بندی keyset روی (shamsi_datetime, id).
+    search با ابتدای شماره سیم کارت، نام طرف حساب یا تاریخ (مثل 1403-05) مقایسه می‌شود؛ هر سه ایندکس دارند."""
+    conditions, params = [], []
+    if contract_type:
+        conditions.append("contract_type = ?")
+        params.append(contract_type)
+    search = (search or "").strip().translate(_GLOB_SPECIAL)
+    if search:
+        conditions.append("(sim_number GLOB ? OR party_name GLOB ? OR shamsi_datetime GLOB ?)")
+        params.extend([f"{search}*"] * 3)
+    return _keyset_page(
+        f"SELECT id, {', '.join(CONTRACT_COLUMNS)} FROM contracts",
+        conditions, params, ["shamsi_datetime", "id"], cursor, limit)
+
+# ===== خروجی جریانی جداول =====
+# هر مجموعه: (FROM و ORDER BY، ستون‌ها به شکل (عبارت SQL، نام ستون خروجی، نوع int/text)).
+# ترتیب‌ها روی rowid جدول اصلی هستند تا SQLite بدون مرتب‌سازی موقت کل نتیجه، سطرها را جریانی بدهد.
+EXPORT_CHUNK_SIZE = 5000
+EXPORT_DATASETS = {
+    "transactions": ('''
+        transactions t
+        LEFT JOIN transaction_payments pm ON pm.transaction_id = t.id
+        LEFT JOIN parties p ON p.id = t.party_id
+        LEFT JOIN sim_cards s ON s.id = t.sim_card_id
+        ORDER BY t.id''', [
+        ("t.id", "transaction_id", "int"), ("t.shamsi_datetime", "shamsi_datetime", "text"),
+        ("t.tx_type", "tx_type", "text"), ("t.amount", "amount", "int"), ("t.description", "description", "text"),
+        ("t.contract_file", "contract_file", "text"), ("p.name", "party_name", "text"),
+        ("s.number", "sim_number", "text"), ("pm.id", "payment_id", "int"),
+        ("pm.payment_method", "payment_method", "text"), ("pm.amount", "payment_amount", "int"),
+        ("pm.bank_account", "bank_account", "text"), ("pm.reference_number", "reference_number", "text"),
+        ("pm.notes", "payment_notes", "text"),
+    ]),
+    "sim_cards": ('''
+        sim_cards s
+        LEFT JOIN parties p ON p.id = s.current_owner_id
+        ORDER BY s.id''', [
+        ("s.id", "id", "int"), ("s.number", "number", "text"), ("s.operator", "operator", "text"),
+        ("s.status", "status", "text"), ("s.purchase_date", "purchase_date", "text"),
+        ("s.purchase_price", "purchase_price", "int"), ("s.sale_date", "sale_date", "text"),
+        ("s.sale_price", "sale_price", "int"), ("p.name", "owner_name", "text"), ("s.notes", "notes", "text"),
+    ]),
+    "parties": ('''
+        parties p
+        LEFT JOIN party_balances b ON b.party_id = p.id
+        ORDER BY p.id''', [
+        ("p.id", "id", "int"), ("p.name", "name", "text"), ("p.phone", "phone", "text"),
+        ("p.mobile", "mobile", "text"), ("p.national_id", "national_id", "text"), ("p.address", "address", "text"),
+        ("p.type", "type", "text"), (_PARTY_OPENING, "opening_balance", "int"),
+        ("COALESCE(b.debit, 0)", "debit", "int"), ("COALESCE(b.credit, 0)", "credit", "int"),
+        ("COALESCE(b.tx_count, 0)", "tx_count", "int"),
+        (f"{_PARTY_OPENING} + COALESCE(b.debit, 0) - COALESCE(b.credit, 0)", "balance", "int"),
+        ("p.notes", "notes", "text"),
+    ]),
+    "checks": ('''
+        checks c
+        LEFT JOIN banks b ON b.id = c.bank_id
+        ORDER BY c.id''', [
+        ("c.id", "id", "int"), ("c.check_number", "check_number", "text"), ("c.type", "type", "text"),
+        ("b.name", "bank_name", "text"), ("c.amount", "amount", "int"), ("c.due_date", "due_date", "text"),
+        ("c.status", "status", "text"), ("c.notes", "notes", "text"),
+    ]),
+    "banks": ('''
+        banks
+        ORDER BY id''', [
+        ("id", "id", "int"), ("name", "name", "text"), ("account_number", "account_number", "text"),
+        ("owner", "owner", "text"), ("notes", "notes", "text"),
+    ]),
+}
+
+def _export_sql(dataset):
+    source, columns = EXPORT_DATASETS[dataset]
+    return f"SELECT {', '.join(expr for expr, _, _ in columns)} FROM {source}"
+
+# شمارش سطرهای JOIN تراکنش‌ها با پرداخت‌ها بدون پیمایش کل JOIN (یک سطر برای تراکنش بدون پرداخت)
+EXPORT_ROW_COUNTS = {
+    "transactions": """
+        SELECT (SELECT COUNT(*) FROM transactions) + (SELECT COUNT(*) FROM transaction_payments)
+               - (SELECT COUNT(DISTINCT transaction_id) FROM transaction_payments)""",
+}
+
+def get_export_row_count(dataset):
+    """تعداد سطرهای خروجی یک مجموعه برای نمایش پیشرفت (برای تراکنش‌ها با پرداخت‌های بی‌تراکنش تقریبی است)"""
+    source = EXPORT_DATASETS[dataset][0].split()[0]
+    sql = EXPORT_ROW_COUNTS.get(dataset, f"SELECT COUNT(*) FROM {source}")
+    return get_connection().execute(sql).fetchone()[0]
+
+def iter_export_chunks(dataset, chunk_size=EXPORT_CHUNK_SIZE):
+    """سطرهای یک مجموعه EXPORT_DATASETS به صورت فهرست‌های حداکثر chunk_size تاپلی با cursor.fetchmany.
+    در هر لحظه فقط یک تکه در حافظه است و همه سطرها از یک snapshot خوانده می‌شوند.
+    خواندن روی اتصال جداگانه و در تراکنش خواندنی خودش انجام می‌شود؛ اگر cursor باز روی اتصال thread بماند،
+    نوشتن‌های همان thread در طول خروجی (مثل ثبت پیشرفت کار) پس از commit نویسنده دیگری با
+    «database is locked» شکست می‌خورند چون snapshot اتصال کهنه شده است."""
+    con = _open_connection()
+    try:
+        con.execute("BEGIN")
+        cur = con.execute(_export_sql(dataset))
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield rows
+    finally:
+        con.close()
+
+# ===== کارهای پس‌زمینه =====
+JOB_QUEUED = "در صف"
+JOB_RUNNING = "در حال اجرا"
+JOB_DONE = "انجام شد"
+JOB_FAILED = "خطا"
+JOB_ACTIVE_STATUSES = (JOB_QUEUED, JOB_RUNNING)
+JOB_COLUMNS = ["status", "done", "total", "message", "result_path", "started_at", "finished_at"]
+
+def add_job(kind, title=""):
+    """ثبت یک کار در صف؛ خروجی id کار"""
+    now = jdatetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with transaction("jobs") as cur:
+        cur.execute("INSERT INTO jobs (kind, title, status, created_at) VALUES (?, ?, ?, ?)",
+                    (kind, title, JOB_QUEUED, now))
+        return cur.lastrowid
+
+def _update_job_sql(fields):
+    unknown = set(fields) - set(JOB_COLUMNS)
+    if unknown:
+        raise ValueError(f"invalid job fields: {', '.join(sorted(unknown))}")
+    return f"UPDATE jobs SET {', '.join(f'{k}=?' for k in fields)} WHERE id=?"
+
+def update_job(job_id, **fields):
+    """به‌روزرسانی ستون‌های JOB_COLUMNS یک کار (وضعیت، پیشرفت، پیام یا مسیر نتیجه)"""
+    sql = _update_job_sql(fields)
+    with transaction("jobs") as cur:
+        cur.execute(sql, (*fields.values(), job_id))
+
+def update_job_on_new_connection(job_id, **fields):
+    """مثل update_job ولی روی یک اتصال تازه و جدا از اتصال thread؛ برای ثبت وضعیت پایانی کار وقتی
+    اتصال thread در وضعیت خطا مانده است"""
+    sql = _update_job_sql(fields)
+    con = _open_connection()
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        con.execute(sql, (*fields.values(), job_id))
+        con.execute("COMMIT")
+    finally:
+        con.close()
+
+def get_jobs(job_ids):
+    """کارهای داده‌شده به همان ترتیب job_ids (کارهای ناموجود حذف می‌شوند)"""
+    ids = [int(i) for i in job_ids]
+    jobs = {job["id"]: job for job in _fetch_dicts(
+        "SELECT * FROM jobs WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(ids),))}
+    return [jobs[i] for i in ids if i in jobs]
+
+def get_recent_jobs(limit=20):
+    return _fetch_dicts("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,))
+
+def prune_jobs(before):
+    """حذف کارهای پایان‌یافته‌ای که پیش از before (تاریخ شمسی YYYY-MM-DD HH:MM:SS) ثبت شده‌اند؛
+    خروجی تعداد کارهای حذف‌شده"""
+    with transaction("jobs") as cur:
+        cur.execute(f"""
+            DELETE FROM jobs
+            WHERE created_at < ? AND status NOT IN ({", ".join("?" * len(JOB_ACTIVE_STATUSES))})
+        """, (before, *JOB_ACTIVE_STATUSES))
+        return cur.rowcount
+
+def fail_interrupted_jobs():
+    """کارهای در صف یا در حال اجرا از اجرای قبلی برنامه که دیگر کارگری ندارند به وضعیت خطا می‌روند"""
+    with transaction("jobs") as cur:
+        cur.execute(f"""
+            UPDATE jobs SET status = ?, message = ?
+            WHERE status IN ({", ".join("?" * len(JOB_ACTIVE_STATUSES))})
+        """, (JOB_FAILED, "برنامه پیش از پایان کار دوباره راه‌اندازی شد", *JOB_ACTIVE_STATUSES))
+        return cur.rowcount
+
+# ===== جستجوی متنی (FTS5) =====
+SEARCH_LIMIT = 10
+_ARABIC_LETTERS = str.maketrans("يكة", "یکه")
+
+def _fts_query(text):
+    """متن کاربر به عبارت MATCH: هر کلمه به صورت پیشوندی و همه کلمه‌ها با AND"""
+    words = (text or "").translate(_ARABIC_LETTERS).translate(_PERSIAN_DIGITS).replace('"', " ").split()
+    return " ".join(f'"{word}"*' for word in words)
+
+@cached_read("parties")
+def search_parties(text, limit=SEARCH_LIMIT):
+    """بهترین طرف حساب‌ها برای متن جستجو (ابتدای نام، موبایل یا کد ملی) به ترتیب امتیاز bm25"""
+    query = _fts_query(text)
+    if not query:
+        return []
+    return _fetch_dicts('''
+        SELECT p.id, p.name, p.mobile, p.national_id, p.type
+        FROM parties_fts JOIN parties p ON p.id = parties_fts.rowid
+        WHERE parties_fts MATCH ?
+        ORDER BY parties_fts.rank
+        LIMIT ?
+    ''', (query, limit))
+
+@cached_read("sim_cards", "parties")
+def search_sim_cards(text, limit=SEARCH_LIMIT):
+    """سیم کارت‌های منطبق با متن جستجو (ابتدای شماره یا کلمات توضیحات).
+    کلمه‌های عددی مثل search_sim_numbers به ابتدای شماره استاندارد تبدیل می‌شوند (912 و +98912 -> 0912).
+    مرتب‌سازی bm25 روی صدها هزار شماره با پیشوند مشترک کند است، پس نتایج به ترتیب ثبت برمی‌گردند
+    و FTS پس از limit نتیجه اول متوقف می‌شود."""
+    query = _fts_query(" ".join(
+        _canonical_prefix(word) if _sim_digits(word).lstrip("+").isdigit() else word
+        for word in (text or "").split()))
+    if not query:
+        return []
+    return _fetch_dicts('''
+        SELECT s.id, s.number, s.operator, s.status, p.name as owner_name
+        FROM sim_cards_fts
+        JOIN sim_cards s ON s.id = sim_cards_fts.rowid
+        LEFT JOIN parties p ON s.current_owner_id = p.id
+        WHERE sim_cards_fts MATCH ?
+        LIMIT ?
+    ''', (query, limit))
+
+# ===== ردیابی توابع عمومی =====
+# همه توابع عمومی داده (get_/add_/...) با tracing.traced پوشانده می‌شوند؛ import‌های app.py و
+# فراخوانی‌های داخلی همین ماژول از نسخه پوشانده‌شده استفاده می‌کنند. وقتی ردیابی خاموش است
+# هزینه آن فقط یک بررسی پرچم در هر فراخوانی است.
+TRACED_PREFIXES = ("get_", "add_", "record_", "update_", "delete_", "import_", "search_", "set_", "check_", "finance_")
+TRACE_EXCLUDED = {"get_connection", "get_schema_version"}
+
+tracing.connection_getter = get_connection
+for _name, _func in list(globals().items()):
+    if (_name.startswith(TRACED_PREFIXES) and _name not in TRACE_EXCLUDED
+            and callable(_func) and getattr(_func, "__module__", None) == __name__):
+        globals()[_name] = tracing.traced(_func)
+del _name, _func
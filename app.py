@@ -1,30 +1,53 @@
 import streamlit as st
 from accounting import (
-    add_bank, add_check, add_payment_to_transaction, delete_transaction, get_banks, get_checks, get_payments_by_transaction, init_db, add_transaction, get_all_transactions, finance_summary,
-    get_financial_reports, add_party, get_parties, add_sim_card,
-    get_sim_cards, migrate_db, update_sim_owner, update_transaction
+    add_bank, add_check, delete_transactions, get_banks, get_checks_page, get_transactions_page, get_payments_grouped, run_migrations, record_transaction, finance_summary,
+    get_financial_reports, import_bank_statement, STATEMENT_FIELDS, add_party, get_parties_page, add_sim_card,
+    get_sim_cards_page, import_sim_cards, iter_file_rows, update_sim_owner, update_transactions,
+    add_contract_transactions, add_contracts, get_contracts_page, transaction, search_parties, search_sim_cards,
+    search_sim_numbers, SIM_PATTERN_LIMIT, get_party_statement,
+    CHECK_STATUSES, get_checks_due, get_overdue_checks, get_check_totals_by_bank, set_checks_status,
+    get_jobs, get_recent_jobs, fail_interrupted_jobs, JOB_ACTIVE_STATUSES, JOB_FAILED
 )
-from contract_generator import ContractGenerator
+from reports import sim_inventory_report
+import tracing
+from tracing import traced
+import jobs
+from forecast import cash_flow_forecast, FORECAST_DAYS
+from exports import EXPORT_FORMATS, export_job
+from contract_generator import (
+    ContractGenerator, render_contract, render_contracts, contract_data_from_row, parse_sale_amount, BATCH_COLUMNS
+)
+import csv
 import io
 import os
-import json
+import tempfile
+import uuid
+from functools import partial
+import zipfile
 import pandas as pd
-from docx import Document
-from docx.shared import Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
 import jdatetime
 from typing import Optional
 
 # ---------- تنظیمات اولیه --------------
-init_db()
+@st.cache_resource(show_spinner=False)
+def setup_database():
+    """اجرای مهاجرت‌های پایگاه داده؛ فقط یک بار در هر پروسه و نه در هر rerun.
+    کارهای پس‌زمینه نیمه‌تمام اجرای قبلی پروسه هم به وضعیت خطا می‌روند و کارها و فایل‌های نتیجه قدیمی پاک می‌شوند."""
+    version = run_migrations()
+    fail_interrupted_jobs()
+    jobs.cleanup()
+    return version
+
+setup_database()
 CONTRACT_TYPES = {
     "قرارداد فروش": "فروش",
     "قرارداد خرید/صلح (با مفاد ویژه)": "خرید"
 }
+SIM_PATTERN_KINDS = {"الگوی رند": "mask", "پیشوند": "prefix", "پسوند": "suffix"}
+TX_TYPES = ["دریافت فروش", "پرداخت خرید", "دریافت وام", "پرداخت وام", "سایر"]
 
-migrate_db()
 CONTRACTS_FOLDER = "contracts"
-ARCHIVE_FILE = os.path.join(CONTRACTS_FOLDER, "archive.json")
+ARCHIVE_PAGE_SIZE = 10
 LOGO_FOLDER = "logo"
 LOGO_PATH = os.path.join(LOGO_FOLDER, "uploaded_logo.png")
 
@@ -44,7 +67,108 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# -------------- صفحه‌بندی --------------
+def paginate(key, fetch_page, container=st, **filters):
+    """نمایش یک صفحه از fetch_page همراه با دکمه‌های قبلی/بعدی (در container، پیش‌فرض بدنه اصلی).
+    cursorهای صفحه‌های دیده‌شده در session_state نگه داشته می‌شوند و با تغییر فیلترها صفحه اول می‌آید.
+    دکمه‌ها با on_click پیش از اجرای دوباره صفحه را عوض می‌کنند تا داخل fragment هم فقط همان بخش اجرا شود."""
+    stack_key, filters_key = f"{key}_cursors", f"{key}_filters"
+    if st.session_state.get(filters_key) != filters:
+        st.session_state[filters_key] = filters
+        st.session_state[stack_key] = [None]
+    stack = st.session_state[stack_key]
+    rows, next_cursor = fetch_page(cursor=stack[-1], **filters)
+
+    cols = container.columns([1, 1, 4])
+    cols[0].button("◀ قبلی", key=f"{key}_prev", disabled=len(stack) == 1, on_click=stack.pop)
+    cols[1].button("بعدی ▶", key=f"{key}_next", disabled=next_cursor is None,
+                   on_click=stack.append, args=(next_cursor,))
+    cols[2].caption(f"صفحه {len(stack)}")
+    return rows
+
+# -------------- انتخاب با جستجو (autocomplete) --------------
+def party_picker(label, key, container=st):
+    """جستجوی طرف حساب در ایندکس FTS و انتخاب از بهترین نتایج؛ خروجی dict طرف حساب یا None"""
+    query = container.text_input(f"جستجوی {label}", key=f"{key}_query", placeholder="نام، موبایل یا کد ملی")
+    matches = search_parties(query)
+    return container.selectbox(label, [None] + matches, key=key,
+                               format_func=lambda p: f"{p['name']} ({p['mobile']})" if p else "")
+
+def sim_picker(label, key, container=st):
+    """جستجوی سیم کارت در ایندکس FTS و انتخاب از بهترین نتایج؛ خروجی dict سیم کارت یا None"""
+    query = container.text_input(f"جستجوی {label}", key=f"{key}_query", placeholder="شماره یا توضیحات")
+    matches = search_sim_cards(query)
+    return container.selectbox(label, [None] + matches, key=key,
+                               format_func=lambda s: f"{s['number']} ({s['operator']})" if s else "")
+
+# -------------- کارهای پس‌زمینه --------------
+JOB_POLL_SECONDS = 1
+JOB_PANEL_LIMIT = 5
+
+def submit_job(key, kind, title, func, *args):
+    """سپردن کار به صف پس‌زمینه و افزودن id آن به کارهای این بخش در session_state[key]"""
+    st.session_state.setdefault(key, []).insert(0, jobs.submit(kind, title, func, *args))
+
+def job_panel(key):
+    """وضعیت آخرین کارهای این بخش؛ بررسی دوره‌ای فقط تا وقتی انجام می‌شود که کاری در صف یا در حال اجرا باشد"""
+    if not st.session_state.get(key):
+        return
+    job_rows = get_jobs(st.session_state[key][:JOB_PANEL_LIMIT])
+    if any(job["status"] in JOB_ACTIVE_STATUSES for job in job_rows):
+        job_status_fragment(key)
+    else:
+        render_jobs(key, job_rows)
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def job_status_fragment(key):
+    """بررسی دوره‌ای کارهای فعال؛ وقتی همه کارها تمام شوند کل صفحه دوباره اجرا می‌شود تا job_panel
+    آن‌ها را بدون زمان‌سنج نمایش دهد"""
+    job_rows = get_jobs(st.session_state[key][:JOB_PANEL_LIMIT])
+    if not any(job["status"] in JOB_ACTIVE_STATUSES for job in job_rows):
+        st.rerun()
+    render_jobs(key, job_rows)
+
+def render_jobs(key, job_rows):
+    """نوار پیشرفت، پیام خطا یا دکمه دانلود هر کار"""
+    for job in job_rows:
+        label = f"{job['title']} ({job['status']})"
+        if job["status"] in JOB_ACTIVE_STATUSES:
+            total = job["total"]
+            st.progress(min(job["done"] / total, 1.0) if total else 0.0,
+                        text=f"{label} — {job['done']:,} از {total:,}" if total else label)
+        elif job["status"] == JOB_FAILED:
+            st.error(f"{label}: {job['message']}")
+        else:
+            if job["message"]:
+                st.info(f"{job['title']}: {job['message']}")
+            if job["result_path"] and os.path.exists(job["result_path"]):
+                extension = os.path.splitext(job["result_path"])[1].lstrip(".")
+                st.download_button(f"⬇️ دانلود {job['title']}", data=partial(read_contract_file, job["result_path"]),
+                                   file_name=os.path.basename(job["result_path"]),
+                                   mime=EXPORT_FORMATS[extension][1] if extension in EXPORT_FORMATS else None,
+                                   key=f"{key}_download_{job['id']}", on_click="ignore")
+
+EXPORT_LABELS = {
+    "transactions": "تراکنش‌ها و پرداخت‌ها", "sim_cards": "سیم کارت‌ها", "parties": "طرف‌های حساب",
+    "checks": "چک‌ها", "banks": "حساب‌های بانکی",
+}
+
+def export_controls(dataset):
+    """انتخاب قالب و تهیه خروجی کامل dataset در پس‌زمینه (جریانی و با حافظه محدود)؛
+    دکمه دانلود پس از پایان کار در همین بخش نمایش داده می‌شود"""
+    key = f"{dataset}_export"
+    cols = st.columns([1, 2])
+    fmt = cols[0].selectbox("قالب فایل", list(EXPORT_FORMATS), key=f"{key}_format", format_func=str.upper,
+                            label_visibility="collapsed")
+    if cols[1].button(f"تهیه فایل {EXPORT_LABELS[dataset]} ({fmt.upper()})", key=key):
+        submit_job(f"{key}_jobs", "export", f"{EXPORT_LABELS[dataset]} ({fmt.upper()})", export_job, dataset, fmt)
+    job_panel(f"{key}_jobs")
+
 # -------------- نوار کناری: لوگو و آرشیو --------------
+def read_contract_file(file_path):
+    with open(file_path, "rb") as fx:
+        return fx.read()
+
 def sidebar_content():
     st.sidebar.header("تنظیمات/امکانات")
     
@@ -57,29 +181,32 @@ def sidebar_content():
     show_archive = st.sidebar.checkbox("🗂️ مشاهده آرشیو قراردادها")
     if show_archive:
         st.sidebar.subheader("آرشیو قراردادها")
-        if os.path.exists(ARCHIVE_FILE):
-            with open(ARCHIVE_FILE, "r", encoding='utf-8') as fa:
-                archive = json.load(fa)
-            for item in reversed(archive):
-                st.sidebar.write(f"{item['type']} | {item['datetime']}")
+        search = st.sidebar.text_input("جستجو (شماره سیم کارت، طرف حساب یا تاریخ)", key="archive_search")
+        archive = paginate("archive", get_contracts_page, container=st.sidebar, limit=ARCHIVE_PAGE_SIZE, search=search)
+        if archive:
+            for item in archive:
+                label = " | ".join(v for v in (item['contract_type'], item['shamsi_datetime'], item['sim_number'], item['party_name']) if v)
+                st.sidebar.write(label)
                 file_path = os.path.join(CONTRACTS_FOLDER, item["filename"])
                 if os.path.exists(file_path):
-                    with open(file_path, "rb") as fx:
-                        st.sidebar.download_button(
-                            label=f"دانلود [{item['filename']}]",
-                            data=fx,
-                            file_name=item["filename"],
-                            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                            key=item["filename"])
+                    # فایل فقط هنگام کلیک خوانده می‌شود؛ rerun فقط فهرست را از پایگاه داده می‌خواند
+                    st.sidebar.download_button(
+                        label=f"دانلود [{item['filename']}]",
+                        data=partial(read_contract_file, file_path),
+                        file_name=item["filename"],
+                        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                        on_click="ignore",
+                        key=item["filename"])
         else:
-            st.sidebar.info("هنوز قراردادی ثبت نشده.")
+            st.sidebar.info("قراردادی پیدا نشد." if search else "هنوز قراردادی ثبت نشده.")
 
     menu_options = [
         "تولید قرارداد سیم‌کارت",
         "🧾 حسابداری معاملات",
         "📱 مدیریت سیم کارت‌ها",
         "👥 مدیریت مشتریان/فروشندگان",
-        "🏦 مدیریت بانک‌ها"
+        "🏦 مدیریت بانک‌ها",
+        "🛠 پایش عملکرد"
     ]
     selected_menu = st.sidebar.radio("انتخاب بخش", menu_options)
     
@@ -158,7 +285,7 @@ def show_contract_form():
 def sim_management_tab():
     st.header("مدیریت سیم کارت‌ها")
     
-    tabs = st.tabs(["ثبت سیم کارت جدید", "لیست سیم کارت‌ها", "تغییر مالکیت"])
+    tabs = st.tabs(["ثبت سیم کارت جدید", "لیست سیم کارت‌ها", "تغییر مالکیت", "ورود گروهی از فایل", "ارزش موجودی و سود"])
     
     with tabs[0]:
         with st.form("sim_card_form"):
@@ -177,8 +304,7 @@ def sim_management_tab():
                     # یافتن ID مالک اگر وجود دارد
                     owner_id = None
                     if owner_name:
-                        parties = get_parties()
-                        matching_parties = [p for p in parties if owner_name.lower() in p["name"].lower()]
+                        matching_parties = search_parties(owner_name, limit=1)
                         if matching_parties:
                             owner_id = matching_parties[0]["id"]
                     
@@ -191,64 +317,158 @@ def sim_management_tab():
                         notes=notes
                     )
                     st.success("سیم کارت با موفقیت ثبت شد.")
-                    st.experimental_rerun()
+                    st.rerun()
                 else:
                     st.error("پر کردن فیلدهای ستاره‌دار الزامی است.")
     
     with tabs[1]:
         st.subheader("لیست سیم کارت‌ها")
-        sim_cards = get_sim_cards()
+        fcols = st.columns(2)
+        f_operator = fcols[0].selectbox("اپراتور", ["", "همراه اول", "ایرانسل", "رایتل"], key="simf_operator")
+        f_status = fcols[1].selectbox("وضعیت", ["", "فعال", "غیرفعال", "مسدود"], key="simf_status")
+
+        pcols = st.columns([1, 3])
+        pattern_kind = pcols[0].selectbox("جستجوی شماره", list(SIM_PATTERN_KINDS), key="simf_pattern_kind")
+        pattern = pcols[1].text_input(
+            "الگو", key="simf_pattern",
+            help="پیشوند: 0912 یا 912 | پسوند: 1234 | الگو: ۱۱ نویسه، * یا ? برای هر رقم و حروف لاتین برای رقم‌های رند "
+                 "(حرف یکسان = رقم یکسان)، مثلاً 0912***1234 یا 0912***ABAB")
+        if pattern.strip():
+            try:
+                matches = search_sim_numbers(pattern, SIM_PATTERN_KINDS[pattern_kind],
+                                             operator=f_operator or None, status=f_status or None)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                st.caption(f"{len(matches):,} شماره" + (" (حداکثر نتایج نمایش داده شده)" if len(matches) >= SIM_PATTERN_LIMIT else ""))
+                if matches:
+                    st.dataframe(pd.DataFrame(matches))
+
+        sim_cards = paginate("sim_list", get_sim_cards_page,
+                             operator=f_operator or None, status=f_status or None)
         if sim_cards:
-            df = pd.DataFrame(sim_cards)
-            st.dataframe(df)
-            
-            # دکمه دانلود
-            csv = df.to_csv(index=False).encode('utf-8-sig')
-            st.download_button(
-                label="دانلود لیست سیم کارت‌ها (CSV)",
-                data=csv,
-                file_name="sim_cards.csv",
-                mime="text/csv"
-            )
+            st.dataframe(pd.DataFrame(sim_cards))
+            export_controls("sim_cards")
         else:
             st.info("هنوز سیم کارتی ثبت نشده است.")
     
     with tabs[2]:
         st.subheader("تغییر مالکیت سیم کارت")
-        sim_cards = get_sim_cards()
-        parties = get_parties()
-        
-        if sim_cards and parties:
-            sim_options = [f"{sc['number']} ({sc['operator']})" for sc in sim_cards]
-            selected_sim = st.selectbox("انتخاب سیم کارت", sim_options)
-            
-            party_options = [p["name"] for p in parties]
-            selected_party = st.selectbox("انتخاب مالک جدید", [""] + party_options)
-            
-            sale_price = st.number_input("قیمت فروش (ریال)", min_value=0)
-            
-            if st.button("ثبت تغییر مالکیت"):
-                if selected_sim and selected_party:
-                    sim_number = selected_sim.split(" ")[0]
-                    sim_id = next((sc["id"] for sc in sim_cards if sc["number"] == sim_number), None)
-                    party_id = next((p["id"] for p in parties if p["name"] == selected_party), None)
-                    
-                    if sim_id and party_id:
-                        update_sim_owner(sim_id, party_id, sale_price)
-                        st.success("مالکیت سیم کارت با موفقیت به روز شد.")
-                        st.experimental_rerun()
-                    else:
-                        st.error("خطا در یافتن سیم کارت یا مالک")
-                else:
-                    st.error("لطفاً سیم کارت و مالک جدید را انتخاب کنید")
-        else:
-            st.warning("برای تغییر مالکیت، حداقل باید یک سیم کارت و یک طرف حساب وجود داشته باشد.")
+        cols = st.columns(2)
+        selected_sim = sim_picker("سیم کارت", "owner_change_sim", cols[0])
+        selected_party = party_picker("مالک جدید", "owner_change_party", cols[1])
+
+        sale_price = st.number_input("قیمت فروش (ریال)", min_value=0)
+
+        if st.button("ثبت تغییر مالکیت"):
+            if selected_sim and selected_party:
+                update_sim_owner(selected_sim["id"], selected_party["id"], sale_price)
+                st.success("مالکیت سیم کارت با موفقیت به روز شد.")
+                st.rerun()
+            else:
+                st.error("لطفاً سیم کارت و مالک جدید را انتخاب کنید")
+
+    with tabs[3]:
+        st.subheader("ورود گروهی سیم کارت از فایل")
+        st.caption("ستون‌ها: number/شماره، operator/اپراتور، purchase_price/قیمت خرید، purchase_date/تاریخ خرید، notes/توضیحات")
+        uploaded = st.file_uploader("فایل CSV یا Excel", type=["csv", "xlsx"], key="sim_import_file")
+        if uploaded and st.button("شروع ورود اطلاعات"):
+            total_rows = uploaded.getvalue().count(b"\n") if uploaded.name.lower().endswith(".csv") else None
+            progress_bar = st.progress(0.0, text="در حال ورود اطلاعات...")
+
+            def on_progress(done):
+                fraction = min(done / total_rows, 1.0) if total_rows else 0.0
+                progress_bar.progress(fraction, text=f"{done:,} سطر پردازش شد")
+
+            try:
+                result = import_sim_cards(iter_file_rows(uploaded, uploaded.name), progress=on_progress)
+            except ImportError:
+                st.error("برای خواندن فایل Excel بسته openpyxl باید نصب باشد.")
+            except (ValueError, UnicodeDecodeError) as e:
+                st.error(f"خطا در خواندن فایل: {e}")
+            else:
+                progress_bar.progress(1.0, text="ورود اطلاعات به پایان رسید")
+                st.success(f"{result['inserted']:,} سیم کارت ثبت شد.")
+                if result['duplicates']:
+                    st.warning(f"{len(result['duplicates']):,} شماره تکراری بود و ثبت نشد.")
+                    st.dataframe(pd.DataFrame(result['duplicates'], columns=["سطر", "شماره"]))
+                if result['invalid']:
+                    st.warning(f"{len(result['invalid']):,} سطر نامعتبر بود.")
+                    st.dataframe(pd.DataFrame(result['invalid'], columns=["سطر", "شماره", "دلیل"]))
+
+    with tabs[4]:
+        sim_inventory_section()
+
+INVENTORY_SUMMARY_COLUMNS = {
+    "operator": "اپراتور", "stock_count": "موجودی", "stock_value": "ارزش موجودی (خرید)",
+    "avg_stock_age_days": "میانگین سن موجودی (روز)", "sold_count": "تعداد فروش", "revenue": "مبلغ فروش",
+    "cost_of_sold": "بهای خرید فروش‌رفته‌ها", "margin": "سود محقق‌شده", "margin_pct": "درصد سود",
+    "avg_days_held": "میانگین روز نگهداری",
+}
+INVENTORY_MONTHLY_COLUMNS = {
+    "operator": "اپراتور", "month": "ماه", "purchased_count": "تعداد خرید", "purchased_cost": "مبلغ خرید",
+    "sold_count": "تعداد فروش", "revenue": "مبلغ فروش", "cost_of_sold": "بهای خرید فروش‌رفته‌ها",
+    "margin": "سود محقق‌شده", "margin_pct": "درصد سود", "avg_days_held": "میانگین روز نگهداری",
+    "stock_count": "موجودی پایان ماه", "stock_value": "ارزش موجودی پایان ماه",
+}
+
+def sim_inventory_section():
+    """گزارش ارزش موجودی، سن موجودی و سود محقق‌شده سیم کارت‌ها به تفکیک اپراتور و ماه"""
+    st.subheader("ارزش موجودی و سودآوری سیم کارت‌ها")
+    report = sim_inventory_report()
+    summary = report["summary"]
+    if summary.empty:
+        st.info("سیم کارتی ثبت نشده است")
+        return
+
+    cols = st.columns(3)
+    cols[0].metric("موجودی انبار", f"{summary['stock_count'].sum():,}")
+    cols[1].metric("ارزش موجودی (ریال)", f"{summary['stock_value'].sum():,}")
+    cols[2].metric("سود محقق‌شده (ریال)", f"{summary['margin'].sum():,}")
+    st.dataframe(summary.rename(columns=INVENTORY_SUMMARY_COLUMNS), hide_index=True)
+
+    st.markdown("#### سن موجودی فروش‌نرفته")
+    aging = report["aging"]
+    if aging.empty:
+        st.info("همه سیم کارت‌ها فروخته شده‌اند")
+    else:
+        st.bar_chart(aging.pivot(index="bucket", columns="operator", values="stock_count").fillna(0))
+        st.dataframe(aging.rename(columns={"operator": "اپراتور", "bucket": "سن موجودی",
+                                           "stock_count": "تعداد", "stock_value": "ارزش (ریال)"}),
+                     hide_index=True)
+
+    st.markdown("#### گردش ماهانه")
+    operator = st.selectbox("اپراتور", ["همه"] + summary["operator"].tolist(), key="inventory_operator")
+    monthly = report["monthly"]
+    if operator != "همه":
+        monthly = monthly[monthly["operator"] == operator]
+    monthly = monthly[list(INVENTORY_MONTHLY_COLUMNS)].rename(columns=INVENTORY_MONTHLY_COLUMNS)
+    st.dataframe(monthly, hide_index=True)
+    st.download_button("دانلود گردش ماهانه (CSV)", monthly.to_csv(index=False).encode('utf-8-sig'),
+                       "sim_inventory_monthly.csv", "text/csv")
+
+# ----------------- پیش‌بینی جریان نقدی ------------------
+def cash_flow_forecast_section():
+    st.subheader(f"پیش‌بینی مانده {FORECAST_DAYS} روز آینده")
+    forecast = cash_flow_forecast()
+    lowest = forecast["balance"].idxmin()
+    cols = st.columns(2)
+    cols[0].metric(f"مانده پیش‌بینی‌شده در {forecast['jalali_date'].iloc[-1]}", f"{forecast['balance'].iloc[-1]:,} ریال")
+    cols[1].metric(f"کمترین مانده ({forecast.loc[lowest, 'jalali_date']})", f"{forecast.loc[lowest, 'balance']:,} ریال")
+    st.line_chart(forecast.set_index("jalali_date")["balance"].rename("مانده پیش‌بینی‌شده"))
+    with st.expander("جزئیات روزانه"):
+        st.dataframe(forecast.rename(columns={
+            "jalali_date": "تاریخ", "checks_in": "وصول چک", "checks_out": "پرداخت چک",
+            "recurring_in": "دریافت تکرارشونده", "recurring_out": "پرداخت تکرارشونده",
+            "net": "خالص روز", "balance": "مانده",
+        }), hide_index=True)
+    st.caption("بر اساس مانده فعلی، چک‌های در جریان و الگوی هفتگی و ماهانه تراکنش‌های شش ماه گذشته")
 
 # ----------------- مدیریت مشتریان/فروشندگان ------------------
 def parties_management_tab():
     st.header("مدیریت مشتریان و فروشندگان")
 
-    tabs = st.tabs(["ثبت طرف حساب جدید", "لیست طرف‌های حساب"])
+    tabs = st.tabs(["ثبت طرف حساب جدید", "لیست طرف‌های حساب", "صورتحساب طرف حساب"])
 
     with tabs[0]:
         with st.form("party_form"):
@@ -279,33 +499,127 @@ def parties_management_tab():
                         notes=notes
                     )
                     st.success("طرف حساب با موفقیت ثبت شد.")
-                    st.experimental_rerun()
+                    st.rerun()
                 else:
                     st.error("پر کردن فیلدهای ستاره‌دار الزامی است.")
     
     with tabs[1]:
         st.subheader("لیست طرف‌های حساب")
-        parties = get_parties()
+        fcols = st.columns(2)
+        f_type = fcols[0].selectbox("نوع", ["", "مشتری", "همکار", "سایر"], key="partyf_type")
+        f_status = fcols[1].selectbox("وضعیت حساب", ["", "طلبکار", "بدهکار"], key="partyf_status")
+        parties = paginate("party_list", get_parties_page,
+                           party_type=f_type or None, account_status=f_status or None)
         if parties:
-            df = pd.DataFrame(parties)
-            st.dataframe(df)
-            
-            # دکمه دانلود
-            csv = df.to_csv(index=False).encode('utf-8-sig')
-            st.download_button(
-                label="دانلود لیست طرف‌های حساب (CSV)",
-                data=csv,
-                file_name="parties.csv",
-                mime="text/csv"
-            )
+            st.dataframe(pd.DataFrame(parties))
+            export_controls("parties")
         else:
             st.info("هنوز طرف حسابی ثبت نشده است.")
 
+    with tabs[2]:
+        st.subheader("صورتحساب طرف حساب")
+        cols = st.columns(3)
+        party = party_picker("طرف حساب", "statement_party", cols[0])
+        start_date = cols[1].text_input("از تاریخ (مثلاً 1403-01-01)", key="statement_start")
+        end_date = cols[2].text_input("تا تاریخ", key="statement_end")
+        if party:
+            try:
+                statement = get_party_statement(party["id"], start_date or None, end_date or None)
+            except ValueError:
+                st.error("تاریخ نامعتبر است.")
+            else:
+                mcols = st.columns(2)
+                mcols[0].metric("مانده ابتدای دوره", f"{statement['opening_balance']:,} ریال")
+                mcols[1].metric("مانده پایان دوره", f"{statement['closing_balance']:,} ریال")
+                st.caption("مانده مثبت یعنی طرف حساب بدهکار و منفی یعنی طلبکار است.")
+                if statement['rows']:
+                    df = pd.DataFrame(statement['rows']).rename(columns={
+                        "shamsi_datetime": "تاریخ", "tx_type": "نوع", "description": "شرح", "contract_file": "قرارداد",
+                        "debit": "بدهکار", "credit": "بستانکار", "running_balance": "مانده"})
+                    st.dataframe(df.drop(columns=["id"]))
+                else:
+                    st.info("در این بازه تراکنشی برای این طرف حساب ثبت نشده است.")
+
 # ----------------- حسابداری معاملات ------------------
+TX_GRID_COLUMNS = {
+    "selected": "انتخاب", "id": "شناسه", "shamsi_datetime": "تاریخ", "tx_type": "نوع تراکنش",
+    "amount": "مبلغ (ریال)", "description": "توضیحات", "party_name": "طرف حساب", "sim_number": "سیم کارت",
+    "payments": "پرداخت‌ها",
+}
+TX_EDITABLE_COLUMNS = ["tx_type", "amount", "description"]
+
+def transaction_grid_frame(transactions):
+    """DataFrame جدول تراکنش‌ها با ستون انتخاب و خلاصه پرداخت‌های هر تراکنش"""
+    payments_by_tx = get_payments_grouped([tx['id'] for tx in transactions])
+    df = pd.DataFrame(transactions)
+    df["description"] = df["description"].fillna("")
+    df["payments"] = [" | ".join(f"{p['payment_method']}: {p['amount']:,}" for p in payments_by_tx[tx['id']])
+                      for tx in transactions]
+    df.insert(0, "selected", False)
+    return df[list(TX_GRID_COLUMNS)]
+
+def finish_transaction_grid_change(message):
+    """پس از حذف یا ویرایش: پاک کردن ویرایش‌های جدول و اجرای دوباره کل برنامه تا داشبورد هم به‌روز شود"""
+    st.session_state["tx_grid_version"] = st.session_state.get("tx_grid_version", 0) + 1
+    st.toast(message)
+    st.rerun()
+
+@st.fragment
+def transaction_list_section():
+    """فهرست صفحه‌بندی‌شده تراکنش‌ها در یک جدول قابل ویرایش با حذف و تغییر گروهی.
+    فیلتر، صفحه‌بندی و انتخاب ردیف‌ها فقط همین fragment را دوباره اجرا می‌کنند."""
+    st.subheader("لیست تراکنش‌ها")
+    fcols = st.columns(4)
+    f_type = fcols[0].selectbox("نوع تراکنش", [""] + TX_TYPES, key="txf_type")
+    f_party = party_picker("طرف حساب", "txf_party", fcols[1])
+    f_start = fcols[2].text_input("از تاریخ (مثلاً 1403-01-01)", key="txf_start")
+    f_end = fcols[3].text_input("تا تاریخ", key="txf_end")
+    try:
+        transactions = paginate("tx_list", get_transactions_page,
+                                tx_type=f_type or None, party_id=f_party["id"] if f_party else None,
+                                start_date=f_start or None, end_date=f_end or None)
+    except ValueError:
+        st.error("تاریخ نامعتبر است.")
+        return
+    if not transactions:
+        st.info("هیچ تراکنشی ثبت نشده.")
+        return
+
+    original = transaction_grid_frame(transactions)
+    # کلید جدول با صفحه و هر تغییر عوض می‌شود تا ویرایش‌های ذخیره‌نشده به ردیف‌های دیگر منتقل نشوند
+    page_key = f"{transactions[0]['id']}_{len(transactions)}_{st.session_state.get('tx_grid_version', 0)}"
+    edited = st.data_editor(
+        original, key=f"tx_grid_{page_key}", hide_index=True,
+        disabled=[c for c in TX_GRID_COLUMNS if c not in TX_EDITABLE_COLUMNS and c != "selected"],
+        column_config={
+            **{c: label for c, label in TX_GRID_COLUMNS.items()},
+            "selected": st.column_config.CheckboxColumn(TX_GRID_COLUMNS["selected"]),
+            "tx_type": st.column_config.SelectboxColumn(TX_GRID_COLUMNS["tx_type"], options=TX_TYPES, required=True),
+            "amount": st.column_config.NumberColumn(TX_GRID_COLUMNS["amount"], min_value=0, step=10000,
+                                                    format="%d", required=True),
+        },
+    )
+
+    selected = edited.loc[edited["selected"], "id"].tolist()
+    changed = edited[(edited[TX_EDITABLE_COLUMNS] != original[TX_EDITABLE_COLUMNS]).any(axis=1)]
+    cols = st.columns([1, 1, 1, 1])
+    if cols[0].button(f"💾 ذخیره ویرایش‌ها ({len(changed)})", key="tx_grid_save", disabled=changed.empty):
+        rows = [{"id": int(r.id), "tx_type": r.tx_type, "amount": int(r.amount), "description": r.description}
+                for r in changed.itertuples()]
+        finish_transaction_grid_change(f"{update_transactions(rows)} تراکنش ویرایش شد.")
+    if cols[1].button(f"🗑 حذف انتخاب‌شده‌ها ({len(selected)})", key="tx_grid_delete", disabled=not selected):
+        finish_transaction_grid_change(f"{delete_transactions(selected)} تراکنش همراه با پرداخت‌هایش حذف شد.")
+    bulk_type = cols[2].selectbox("نوع جدید برای انتخاب‌شده‌ها", TX_TYPES, key="tx_grid_bulk_type",
+                                  label_visibility="collapsed")
+    if cols[3].button(f"تغییر نوع انتخاب‌شده‌ها ({len(selected)})", key="tx_grid_set_type", disabled=not selected):
+        rows = [{"id": int(r.id), "tx_type": bulk_type, "amount": int(r.amount), "description": r.description}
+                for r in edited[edited["selected"]].itertuples()]
+        finish_transaction_grid_change(f"نوع {update_transactions(rows)} تراکنش به «{bulk_type}» تغییر کرد.")
+
 def accounting_tab():
     st.title("🧾 حسابداری خرید و فروش سیم‌کارت")
 
-    tabs = st.tabs(["داشبورد", "ثبت تراکنش", "لیست تراکنش‌ها", "گزارشات مالی"])
+    tabs = st.tabs(["داشبورد", "ثبت تراکنش", "لیست تراکنش‌ها", "گزارشات مالی", "ورود صورتحساب بانکی"])
 
     # ================== 📊 داشبورد ==================
     with tabs[0]:
@@ -315,39 +629,40 @@ def accounting_tab():
         col1.metric("موجودی کل", f"{summary['balance']:,} ریال")
         col2.metric("کل دریافتی‌ها", f"{summary['total_income']:,} ریال")
         col3.metric("کل پرداختی‌ها", f"{summary['total_outcome']:,} ریال")
+        if summary['counts']:
+            st.caption(" | ".join(f"{tx_type or 'بدون نوع'}: {count:,} تراکنش" for tx_type, count in summary['counts'].items()))
 
-        st.subheader("گردش مالی ماهانه")
-        reports = get_financial_reports()
-        if reports['monthly']:
-            df_monthly = pd.DataFrame(reports['monthly'], columns=["ماه", "درآمد", "هزینه", "مانده"])
-            st.line_chart(df_monthly.set_index("ماه"))
-        else:
-            st.info("داده‌ای برای نمایش وجود ندارد")
+        chart_cols = st.columns(2)
+        with chart_cols[0]:
+            st.subheader("گردش مالی ماهانه")
+            reports = get_financial_reports()
+            if reports['monthly']:
+                df_monthly = pd.DataFrame(reports['monthly'], columns=["ماه", "درآمد", "هزینه", "مانده"])
+                st.line_chart(df_monthly.set_index("ماه"))
+            else:
+                st.info("داده‌ای برای نمایش وجود ندارد")
+        with chart_cols[1]:
+            cash_flow_forecast_section()
 
     # ================== 📝 ثبت تراکنش ==================
     with tabs[1]:
         st.subheader("ثبت تراکنش جدید")
 
+        # انتخاب‌های جستجودار بیرون از فرم هستند تا با تایپ کردن نتایج به‌روز شوند
+        pick_cols = st.columns(3)
+        selected_party = party_picker("طرف حساب", "tx_party", pick_cols[0])
+        selected_sim = sim_picker("سیم کارت مرتبط", "tx_sim", pick_cols[1])
+        contract_search = pick_cols[2].text_input("جستجوی قرارداد مرتبط (شماره سیم کارت، نام طرف حساب یا تاریخ)")
+
         # فرم اصلی تراکنش
         with st.form("transaction_form"):
             cols = st.columns(2)
             with cols[0]:
-                tx_type = st.selectbox("نوع تراکنش*", ["دریافت فروش", "پرداخت خرید", "دریافت وام", "پرداخت وام", "سایر"])
-                parties = get_parties()
-                party_options = [""] + [f"{p['name']} ({p['type']})" for p in parties]
-                selected_party = st.selectbox("طرف حساب", party_options)
-
-                # انتخاب سیم کارت
-                sim_cards = get_sim_cards()
-                sim_options = [""] + [f"{sc['number']} ({sc['operator']})" for sc in sim_cards]
-                selected_sim = st.selectbox("سیم کارت مرتبط", sim_options)
+                tx_type = st.selectbox("نوع تراکنش*", TX_TYPES)
 
             with cols[1]:
-                contract_choices = [""]
-                if os.path.exists(ARCHIVE_FILE):
-                    with open(ARCHIVE_FILE, "r", encoding='utf-8') as fa:
-                        archive_list = json.load(fa)
-                        contract_choices += [f['filename'] for f in archive_list]
+                contracts, _ = get_contracts_page(search=contract_search)
+                contract_choices = [""] + [c['filename'] for c in contracts]
                 contract_file = st.selectbox("قرارداد مرتبط", contract_choices)
                 description = st.text_area("توضیحات")
 
@@ -360,41 +675,29 @@ def accounting_tab():
             payments_data = []
             for i in range(st.session_state["payment_rows"]):
                 c = st.columns([2, 2, 2, 2, 3])
-                method = c[0].selectbox("روش پرداخت", ["نقدی", "کارت به کارت", "حواله بانکی", "چک"], key=f"pmethod_{i}")
-                amount_pm = c[1].number_input("مبلغ (ریال)", min_value=0, step=10000, key=f"pamount_{i}")
-                bank_acc = c[2].text_input("حساب/کارت", key=f"pbank_{i}")
-                ref_num = c[3].text_input("شماره پیگیری", key=f"pref_{i}")
-                notes_pm = c[4].text_input("توضیحات", key=f"pnotes_{i}")
-                payments_data.append((method, amount_pm, bank_acc, ref_num, notes_pm))
+                payments_data.append({
+                    "payment_method": c[0].selectbox("روش پرداخت", ["نقدی", "کارت به کارت", "حواله بانکی", "چک"], key=f"pmethod_{i}"),
+                    "amount": c[1].number_input("مبلغ (ریال)", min_value=0, step=10000, key=f"pamount_{i}"),
+                    "bank_account": c[2].text_input("حساب/کارت", key=f"pbank_{i}"),
+                    "reference_number": c[3].text_input("شماره پیگیری", key=f"pref_{i}"),
+                    "notes": c[4].text_input("توضیحات", key=f"pnotes_{i}"),
+                })
 
             if st.form_submit_button("ثبت تراکنش"):
-                total_amount = sum(p[1] for p in payments_data)
+                payments = [p for p in payments_data if p["amount"] > 0]
+                total_amount = sum(p["amount"] for p in payments)
                 if total_amount > 0:
-                    # پیدا کردن ID طرف حساب
-                    party_id = None
-                    if selected_party:
-                        party_name = selected_party.split(" (")[0]
-                        party_id = next((p["id"] for p in parties if p["name"] == party_name), None)
-                    # پیدا کردن ID سیم کارت
-                    sim_card_id = None
-                    if selected_sim:
-                        sim_number = selected_sim.split(" ")[0]
-                        sim_card_id = next((sc["id"] for sc in sim_cards if sc["number"] == sim_number), None)
-
-                    tx_id = add_transaction(
-                        tx_type=tx_type,
-                        amount=total_amount,
-                        description=description,
-                        contract_file=contract_file,
-                        party_id=party_id,
-                        sim_card_id=sim_card_id
-                    )
-                    for method, amount_pm, bank_acc, ref_num, notes_pm in payments_data:
-                        if amount_pm > 0:
-                            add_payment_to_transaction(tx_id, method, amount_pm, bank_acc, ref_num, notes_pm)
-
+                    # تراکنش و همه پرداخت‌ها با یک commit ثبت می‌شوند
+                    record_transaction({
+                        "tx_type": tx_type,
+                        "amount": total_amount,
+                        "description": description,
+                        "contract_file": contract_file,
+                        "party_id": selected_party["id"] if selected_party else None,
+                        "sim_card_id": selected_sim["id"] if selected_sim else None,
+                    }, payments)
                     st.success("تراکنش و پرداخت‌ها ثبت شدند.")
-                    st.experimental_rerun()
+                    st.rerun()
                 else:
                     st.error("مجموع مبالغ پرداخت باید بیشتر از صفر باشد.")
 
@@ -410,45 +713,42 @@ def accounting_tab():
                         add_party(name=quick_name, mobile=quick_mobile,
                                   national_id=quick_national_id, party_type=quick_type)
                         st.success("طرف حساب افزوده شد.")
-                        st.experimental_rerun()
+                        st.rerun()
                     else:
                         st.error("پر کردن نام، موبایل و کد ملی اجباری است.")
 
     # ================== 📜 لیست تراکنش‌ها ==================
     with tabs[2]:
-        st.subheader("لیست تراکنش‌ها")
-        transactions = get_all_transactions()
-        if transactions:
-            for tx in transactions:
-                st.markdown(f"**{tx['id']}** | {tx['tx_type']} | {tx['amount']:,} ریال")
-                payments = get_payments_by_transaction(tx['id'])
-                if payments:
-                    for p in payments:
-                        st.write(f"▫ {p['payment_method']}: {p['amount']:,} ریال ({p['bank_account']}) [{p['reference_number']}]")
-                cols = st.columns(2)
-                if cols[0].button("✏ ویرایش", key=f"edit_{tx['id']}"):
-                    st.warning("ویرایش تراکنش هنوز پیاده‌سازی نشده!")
-                if cols[1].button("🗑 حذف", key=f"del_{tx['id']}"):
-                    delete_transaction(tx['id'])
-                    st.warning("تراکنش حذف شد.")
-                    st.experimental_rerun()
-        else:
-            st.info("هیچ تراکنشی ثبت نشده.")
+        transaction_list_section()
+        st.markdown("#### خروجی کامل دفتر")
+        export_controls("transactions")
 
     # ================== 📈 گزارشات مالی ==================
     with tabs[3]:
         st.subheader("گزارشات مالی")
+        date_calendar = st.radio("تقویم", ["شمسی", "میلادی"], horizontal=True)
         col1, col2 = st.columns(2)
         with col1:
-            start_date = st.date_input("تاریخ شروع", value=None)
+            if date_calendar == "شمسی":
+                start_date = st.text_input("تاریخ شروع (مثلاً 1403-01-01)")
+            else:
+                start_date = st.date_input("تاریخ شروع", value=None)
         with col2:
-            end_date = st.date_input("تاریخ پایان", value=None)
+            if date_calendar == "شمسی":
+                end_date = st.text_input("تاریخ پایان (مثلاً 1403-12-29)")
+            else:
+                end_date = st.date_input("تاریخ پایان", value=None)
         if st.button("اعمال فیلتر"):
-            start_str = start_date.strftime("%Y-%m-%d") if start_date else None
-            end_str = end_date.strftime("%Y-%m-%d") if end_date else None
-            reports = get_financial_reports(start_str, end_str)
+            try:
+                reports = get_financial_reports(start_date, end_date)
+            except ValueError:
+                st.error("تاریخ وارد شده معتبر نیست.")
+                reports = get_financial_reports()
         else:
             reports = get_financial_reports()
+        if reports['monthly']:
+            st.subheader("گردش ماهانه")
+            st.dataframe(pd.DataFrame(reports['monthly'], columns=["ماه", "درآمد", "هزینه", "مانده"]))
         if reports['by_operator']:
             st.subheader("تراکنش‌ها بر اساس اپراتور")
             df_operator = pd.DataFrame(reports['by_operator'], columns=["اپراتور", "تعداد تراکنش", "جمع مبلغ"])
@@ -456,8 +756,55 @@ def accounting_tab():
             st.bar_chart(df_operator.set_index("اپراتور")["جمع مبلغ"])
         else:
             st.info("تراکنشی مرتبط با سیم کارت‌ها وجود ندارد")
+
+    # ================== 🏦 ورود صورتحساب بانکی ==================
+    with tabs[4]:
+        st.subheader("ورود صورتحساب بانکی")
+        uploaded = st.file_uploader("فایل صورتحساب (CSV یا Excel)", type=["csv", "xlsx"], key="statement_file")
+        if uploaded:
+            header = list(next(iter_file_rows(uploaded, uploaded.name), {}).keys())
+            uploaded.seek(0)
+            st.caption("ستون متناظر با هر فیلد را انتخاب کنید (مبلغ یا واریز/برداشت کافی است).")
+            mapping = {}
+            map_cols = st.columns(3)
+            for i, (field, label) in enumerate(STATEMENT_FIELDS.items()):
+                mapping[field] = map_cols[i % 3].selectbox(label, [""] + header, key=f"stmt_map_{field}")
+
+            cols = st.columns(3)
+            banks = get_banks()
+            bank = cols[0].selectbox("حساب بانکی", [None] + banks, key="stmt_bank",
+                                     format_func=lambda b: f"{b['name']} - {b['account_number']}" if b else "")
+            income_type = cols[1].selectbox("نوع تراکنش واریزها", TX_TYPES, index=0, key="stmt_income_type")
+            expense_type = cols[2].selectbox("نوع تراکنش برداشت‌ها", TX_TYPES, index=1, key="stmt_expense_type")
+
+            if st.button("ورود صورتحساب"):
+                if not mapping["date"] or not (mapping["amount"] or mapping["credit"] or mapping["debit"]):
+                    st.error("انتخاب ستون تاریخ و مبلغ (یا واریز/برداشت) الزامی است.")
+                else:
+                    total_rows = uploaded.getvalue().count(b"\n") if uploaded.name.lower().endswith(".csv") else None
+                    progress_bar = st.progress(0.0, text="در حال ورود صورتحساب...")
+
+                    def on_progress(done):
+                        fraction = min(done / total_rows, 1.0) if total_rows else 0.0
+                        progress_bar.progress(fraction, text=f"{done:,} سطر پردازش شد")
+
+                    result = import_bank_statement(
+                        iter_file_rows(uploaded, uploaded.name),
+                        {k: v for k, v in mapping.items() if v},
+                        bank_account=bank["account_number"] if bank else "",
+                        income_type=income_type, expense_type=expense_type,
+                        progress=on_progress)
+                    progress_bar.progress(1.0, text="ورود صورتحساب به پایان رسید")
+                    st.success(f"{result['imported']:,} تراکنش ثبت شد.")
+                    if result['duplicates']:
+                        st.warning(f"{len(result['duplicates']):,} سطر با شماره پیگیری تکراری نادیده گرفته شد.")
+                        st.dataframe(pd.DataFrame(result['duplicates'], columns=["سطر", "شماره پیگیری"]))
+                    if result['invalid']:
+                        st.warning(f"{len(result['invalid']):,} سطر نامعتبر بود.")
+                        st.dataframe(pd.DataFrame(result['invalid'], columns=["سطر", "دلیل"]))
+
 def banks_management_tab():
-    st.header("🏦 مدیریت بانک‌ها")
+    st.subheader("حساب‌های بانکی")
 
     with st.form("bank_form"):
         name = st.text_input("نام بانک*")
@@ -468,19 +815,20 @@ def banks_management_tab():
             if name and account_number:
                 add_bank(name, account_number, owner, notes)
                 st.success("بانک ثبت شد.")
-                st.experimental_rerun()
+                st.rerun()
             else:
                 st.error("نام و شماره حساب اجباری است.")
 
-    st.subheader("لیست بانک‌ها")
+    st.markdown("#### لیست بانک‌ها")
     banks = get_banks()
     if banks:
         df = pd.DataFrame(banks)
         st.dataframe(df)
+        export_controls("banks")
     else:
         st.info("هیچ بانکی ثبت نشده است.")
 def checks_management_tab():
-    st.header("📑 مدیریت چک‌ها")
+    st.subheader("📑 ثبت و فهرست چک‌ها")
 
     with st.form("check_form"):
         check_number = st.text_input("شماره چک*")
@@ -490,7 +838,7 @@ def checks_management_tab():
         selected_bank = st.selectbox("بانک*", bank_options)
         amount = st.number_input("مبلغ (ریال)*", min_value=0, step=10000)
         due_date = st.date_input("تاریخ سررسید")
-        status = st.selectbox("وضعیت", ["در جریان", "وصول شد", "برگشتی"])
+        status = st.selectbox("وضعیت", CHECK_STATUSES)
         notes = st.text_area("توضیحات")
 
         if st.form_submit_button("ثبت چک"):
@@ -498,18 +846,137 @@ def checks_management_tab():
                 bank_id = next((b["id"] for b in banks if f"{b['name']} - {b['account_number']}" == selected_bank), None)
                 add_check(check_number, type_, bank_id, amount, due_date.strftime("%Y-%m-%d"), status, notes)
                 st.success("چک با موفقیت ثبت شد.")
-                st.experimental_rerun()
+                st.rerun()
             else:
                 st.error("فیلدهای ستاره‌دار را پر کنید.")
 
-    st.subheader("لیست چک‌ها")
-    chs = get_checks()
+    st.markdown("#### لیست چک‌ها")
+    fcols = st.columns(3)
+    f_type = fcols[0].selectbox("نوع", ["", "دریافت", "پرداخت"], key="checkf_type")
+    f_status = fcols[1].selectbox("وضعیت", ["", *CHECK_STATUSES], key="checkf_status")
+    f_bank = fcols[2].selectbox("بانک", [None] + banks, key="checkf_bank",
+                                format_func=lambda b: f"{b['name']} - {b['account_number']}" if b else "")
+    chs = paginate("check_list", get_checks_page, check_type=f_type or None,
+                   status=f_status or None, bank_id=f_bank["id"] if f_bank else None)
     if chs:
         df = pd.DataFrame(chs)
         st.dataframe(df)
+        export_controls("checks")
     else:
         st.info("هیچ چکی ثبت نشده است.")
+
+CHECK_TOTALS_COLUMNS = {
+    "bank_name": "بانک", "account_number": "شماره حساب", "check_count": "تعداد چک",
+    "in_flight_count": "در جریان", "in_flight_receivable": "دریافتنی در جریان", "in_flight_payable": "پرداختنی در جریان",
+    "due_soon_amount": "سررسید نزدیک", "overdue_count": "تعداد سررسید گذشته", "overdue_amount": "مبلغ سررسید گذشته",
+    "cleared_amount": "وصول‌شده", "bounced_amount": "برگشتی",
+}
+DUE_CHECK_COLUMNS = {
+    "check_number": "شماره چک", "type": "نوع", "bank_name": "بانک", "amount": "مبلغ",
+    "due_date": "سررسید", "status": "وضعیت", "notes": "توضیحات",
+}
+
+def check_status_actions(key, checks):
+    """جدول چک‌ها با انتخاب چند ردیف و دکمه‌های تغییر وضعیت گروهی"""
+    if not checks:
+        st.info("چکی در این بازه وجود ندارد.")
+        return
+    df = pd.DataFrame(checks)[list(DUE_CHECK_COLUMNS)].rename(columns=DUE_CHECK_COLUMNS)
+    event = st.dataframe(df, key=f"{key}_table", on_select="rerun", selection_mode="multi-row", hide_index=True)
+    selected = [checks[i]["id"] for i in event.selection.rows]
+    cols = st.columns([1, 1, 3])
+    for col, status in zip(cols, ("وصول شد", "برگشتی")):
+        if col.button(f"{status} ({len(selected)})", key=f"{key}_{status}", disabled=not selected):
+            changed = set_checks_status(selected, status)
+            st.success(f"وضعیت {changed} چک به «{status}» تغییر کرد.")
+            st.rerun()
+
+def checks_due_tab():
+    st.subheader("سررسید چک‌ها")
+    days = st.number_input("سررسید تا چند روز آینده", min_value=1, max_value=365, value=7, key="checks_due_days")
+    totals = get_check_totals_by_bank(days)
+    if not totals:
+        st.info("هیچ چکی ثبت نشده است.")
+        return
+
+    cols = st.columns(4)
+    cols[0].metric("دریافتنی در جریان", f"{sum(t['in_flight_receivable'] for t in totals):,} ریال")
+    cols[1].metric("پرداختنی در جریان", f"{sum(t['in_flight_payable'] for t in totals):,} ریال")
+    cols[2].metric(f"سررسید {days} روز آینده", f"{sum(t['due_soon_amount'] for t in totals):,} ریال")
+    cols[3].metric("سررسید گذشته", f"{sum(t['overdue_amount'] for t in totals):,} ریال")
+    st.markdown("#### جمع چک‌ها به تفکیک بانک")
+    st.dataframe(pd.DataFrame(totals)[list(CHECK_TOTALS_COLUMNS)].rename(columns=CHECK_TOTALS_COLUMNS),
+                 hide_index=True)
+
+    st.markdown("#### چک‌های در جریان با سررسید گذشته")
+    check_status_actions("overdue_checks", paginate("overdue_checks", get_overdue_checks))
+    st.markdown(f"#### چک‌های در جریان با سررسید تا {days} روز آینده")
+    check_status_actions("due_checks", paginate("due_checks", get_checks_due, days=days))
+
+def banks_page():
+    st.header("🏦 مدیریت بانک‌ها")
+    tabs = st.tabs(["سررسید چک‌ها", "ثبت و فهرست چک‌ها", "حساب‌های بانکی"])
+    with tabs[0]:
+        checks_due_tab()
+    with tabs[1]:
+        checks_management_tab()
+    with tabs[2]:
+        banks_management_tab()
+
+# ----------------- پایش عملکرد ------------------
+JOB_TABLE_COLUMNS = {
+    "id": "شناسه", "title": "کار", "status": "وضعیت", "done": "انجام‌شده", "total": "کل", "message": "پیام",
+    "created_at": "ثبت", "started_at": "شروع", "finished_at": "پایان",
+}
+TRACE_COLUMNS = {"count": "تعداد", "mean_ms": "میانگین (ms)", "max_ms": "بیشینه (ms)", "total_ms": "مجموع (ms)"}
+
+def _trace_table(stats, name_label, rows_label):
+    if not stats:
+        return pd.DataFrame()
+    df = pd.DataFrame.from_dict(stats, orient="index").drop(columns="histogram")
+    return df.rename(columns={**TRACE_COLUMNS, "rows": rows_label}).rename_axis(name_label).reset_index()
+
+def performance_page():
+    st.header("🛠 پایش عملکرد")
+    recent_jobs = get_recent_jobs()
+    if recent_jobs:
+        st.subheader("کارهای پس‌زمینه")
+        st.caption(f"حداکثر {jobs.MAX_WORKERS} کار هم‌زمان؛ بقیه در صف می‌مانند.")
+        st.dataframe(pd.DataFrame(recent_jobs)[list(JOB_TABLE_COLUMNS)].rename(columns=JOB_TABLE_COLUMNS),
+                     hide_index=True)
+
+    st.toggle("ردیابی زمان توابع و دستورهای SQL", value=tracing.is_enabled(), key="trace_enabled",
+              on_change=lambda: tracing.set_enabled(st.session_state.trace_enabled))
+    report = tracing.snapshot()
+
+    cols = st.columns([1, 1, 3])
+    if cols[0].button("پاک کردن آمار"):
+        tracing.reset()
+        st.rerun()
+    cols[1].download_button("دانلود JSON", data=tracing.export_json, file_name="trace.json",
+                            mime="application/json", on_click="ignore")
+    cols[2].caption(f"آمار از {report['since']}")
+    if not report["functions"]:
+        st.info("هنوز فراخوانی ثبت نشده است؛ ردیابی را روشن کنید و از بخش‌های دیگر برنامه استفاده کنید.")
+        return
+
+    st.subheader("توابع")
+    st.dataframe(_trace_table(report["functions"], "تابع", "سطرهای خروجی"), hide_index=True)
+    selected = st.selectbox("هیستوگرام زمان", list(report["functions"]), key="trace_histogram_function")
+    st.bar_chart(pd.Series(report["functions"][selected]["histogram"], name="تعداد"), sort=False)
+
+    st.subheader("دستورهای SQL")
+    st.dataframe(_trace_table(report["statements"], "دستور", "سطرهای تغییرکرده"), hide_index=True)
+
+    st.subheader("کندترین دستورها")
+    for entry in report["slowest"]:
+        with st.expander(f"{entry['elapsed_ms']:,.1f} ms | {entry['function']} | {entry['sql'][:80]}"):
+            st.code(entry["sql"], language="sql")
+            if entry["plan"]:
+                st.code("\n".join(entry["plan"]), language="text")
+
 # ----------------- تولید قرارداد ------------------
+@traced
 def generate_contract(contract_type, contract_data):
     if CONTRACT_TYPES[contract_type] == "فروش":
         generator = ContractGenerator()
@@ -519,134 +986,179 @@ def generate_contract(contract_type, contract_data):
     return word_file
 
 def generate_buy_contract(contract_data):
-    doc = Document()
-    if os.path.exists(LOGO_PATH):
-        doc.add_picture(LOGO_PATH, width=Pt(100))
-        doc.paragraphs[-1].alignment = WD_ALIGN_PARAGRAPH.RIGHT
-
-    def rtl(text, bold=False):
-        p = doc.add_paragraph()
-        run = p.add_run(text)
-        run.bold = bold
-        p.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-        p.paragraph_format.space_after = Pt(0)
-
-    rtl("بسمه تعالی", bold=True)
-    doc.add_paragraph().alignment = WD_ALIGN_PARAGRAPH.RIGHT
-
-    rtl(f"فروشنده: {contract_data['seller_name']}")
-    rtl(f"تلفن: {contract_data['seller_phone']}")
-    rtl(f"نشانی: {contract_data['seller_address']}")
-    rtl(f"متولد: {contract_data['seller_birth']}   صادره از: {contract_data['seller_issued']}   شماره کد ملی: {contract_data['seller_national_id']}   فرزند: {contract_data['seller_child']}")
-
-    rtl(f"متصالح (خریدار): {contract_data['buyer_name']}")
-    rtl(f"تلفن: {contract_data['buyer_phone']}")
-    rtl(f"نشانی: {contract_data['buyer_address']}")
-    rtl(f"متولد: {contract_data['buyer_birth']}   صادره از: {contract_data['buyer_issued']}   شماره کد ملی: {contract_data['buyer_national_id']}   فرزند: {contract_data['buyer_child']}")
-
-    rtl(f"مورد فروش: کلیه حقوق عینه، متصوره و فرضیه متعلق به یک رشته سیم کارت شرکت همراه اول به شماره {contract_data['sim_number']}\n"
-        "اعم از حق الامتیاز و حق الاشتراک و وام و ودیعه متعلقه احتمالی به نحوی که دیگر هیچگونه حق و ادعایی برای فروشنده در مورد صلح باقی نماند و خریدار قائم مقام قانونی و رسمی فروشنده در شرکت همراه اول می باشد تا مطابق مقررات بنام و نفع خود استفاده نماید.")
-    rtl(f"مبلغ مورد فروش: مبلغ {contract_data['sale_amount']} ریال معادل {contract_data['sale_amount_toman']} تومان که تمامی آن به اقرار تسلیم فروشنده گردیده است.")
-
-    table = doc.add_table(rows=1, cols=5)
-    hdrs = ["توضیحات", "مبلغ واریزی (ریال)", "بانک", "شرح واریز", "نحوه پرداخت"]
-    for i, h in enumerate(hdrs):
-        cell = table.rows[0].cells[i]
-        cell.text = h
-        cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
-        cell.paragraphs[0].runs[0].font.bold = True
-        cell.paragraphs[0].runs[0].font.name = "B Nazanin"
-    for payment in contract_data['payment_methods']:
-        if any(payment):
-            row = table.add_row().cells
-            for i, item in enumerate(payment):
-                row[i].text = str(item)
-                row[i].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
-                row[i].paragraphs[0].runs[0].font.name = "B Nazanin"
-    rtl(f"تاریخ و زمان تحویل سیم کارت به متصالح: {contract_data['payment_date']}")
-
-    solh_text = (
-"""مفاد و شرایط:
-1- مورد صلح صحیح و سالم به رویت متصالح رسیده و متصالح اقرار به دریافت و تصرف صحیح و سالم آن نموده است.
-2- هزینه کلیه مکالمات داخل و خارج کشور تا زمان تنظیم صلحنامه به عهده متصالح خواهد بود.
-3- متصالح متعهد به همکاری و حضور در تمام مراجع قانونی و قضایی در صورت لزوم می‌باشد.
-4- مسئولیت کامل هرگونه سوءاستفاده یا مزاحمت و پرداخت حقوق و دیون مربوطه از زمان تنظیم صلحنامه به عهده متصالح است.
-5- متصالح ضامن کشف فساد احتمالی گردید و تعهد به جبران خسارت دارد.
-6- سیم کارت تلفن همراه به صورت مال الاجاره می‌باشد و هزینه‌های ما به التفاوت به عهده متصالح است.
-7- متصالح هیچگونه حقی نسبت به قطع و سلب امتیاز نخواهد داشت.
-8- در صورت کشف فساد مبلغ سیم کارت به خریدار عودت خواهد شد.
-9- این سیم کارت به صورت اسقاط کافه خیارات حتی خیار غبن تنظیم و بر اساس مواد 10، 190 و 362 قانون مدنی معتبر است.
-""")
-    rtl(solh_text)
-    rtl(f"توضیحات: {contract_data['notes']}")
-    rtl("شاهد                                     شاهد         خریدار         فروشنده")
-
-    file_stream = io.BytesIO()
-    doc.save(file_stream)
-    file_stream.seek(0)
-    return file_stream
-
-def save_contract_file(word_file, contract_type):
+    return render_contract("خرید", contract_data)
+
+def contract_archive_entry(contract_type, filename, contract_data):
+    """سطر آرشیو یک قرارداد؛ طرف حساب در فروش خریدار و در خرید فروشنده است"""
+    side = "buyer" if contract_type == "فروش" else "seller"
+    try:
+        amount = parse_sale_amount(contract_data['sale_amount'])
+    except ValueError:
+        amount = None
+    return {
+        "contract_type": contract_type,
+        "filename": filename,
+        "sim_number": contract_data['sim_number'],
+        "party_name": contract_data[f'{side}_name'],
+        "party_national_id": contract_data[f'{side}_national_id'],
+        "amount": amount,
+    }
+
+def create_contract_file(stem):
+    """ایجاد فایل .docx با نام یکتا در پوشه قراردادها (O_EXCL تا دو کار هم‌زمان فایل هم را بازنویسی نکنند)؛
+    اگر نام گرفته شده باشد _2، _3 ... به آن افزوده می‌شود. خروجی (مسیر، فایل باز برای نوشتن)"""
+    path, i = os.path.join(CONTRACTS_FOLDER, f"{stem}.docx"), 1
+    while True:
+        try:
+            return path, open(path, "xb")
+        except FileExistsError:
+            i += 1
+            path = os.path.join(CONTRACTS_FOLDER, f"{stem}_{i}.docx")
+
+def save_contract_file(word_file, contract_type, contract_data):
     now_jalali = jdatetime.datetime.now().strftime("%Y-%m-%d_%H%M%S")
-    filename = f"contract_{contract_type}_{now_jalali}.docx"
-    file_path = os.path.join(CONTRACTS_FOLDER, filename)
-    with open(file_path, "wb") as f:
+    file_path, f = create_contract_file(f"contract_{contract_type}_{now_jalali}")
+    with f:
         f.write(word_file.getbuffer())
-    
     try:
-        with open(ARCHIVE_FILE, "r", encoding='utf-8') as fa:
-            archive = json.load(fa)
-    except:
-        archive = []
-    
-    archive.append({
-        "type": contract_type,
-        "filename": filename,
-        "datetime": now_jalali
-    })
-    
-    with open(ARCHIVE_FILE, "w", encoding='utf-8') as fa:
-        json.dump(archive, fa, ensure_ascii=False, indent=2)
-    
+        add_contracts([contract_archive_entry(contract_type, os.path.basename(file_path), contract_data)])
+    except Exception:
+        os.remove(file_path)
+        raise
     return file_path
 
+# ----------------- تولید گروهی قرارداد ------------------
+INVALID_ROWS_FILE = "invalid_rows.csv"
+
+def generate_contract_batch(rows, default_kind, zip_path, progress=None, workers=None):
+    """تولید موازی قراردادهای فایل گروهی (با workers پروسه، پیش‌فرض همه هسته‌ها)، ذخیره در پوشه قراردادها و
+    فایل ZIP در zip_path. فایل‌ها در آرشیو و تراکنش‌های مالی همه با هم در یک تراکنش پایگاه داده ثبت می‌شوند.
+    فایل‌ها ابتدا در پوشه موقت نوشته و فقط پس از commit به پوشه قراردادها منتقل می‌شوند تا در صورت خطا
+    فایل بدون سطر آرشیو باقی نماند."""
+    contracts, invalid = [], []
+    for line, row in enumerate(rows, start=2):
+        try:
+            kind, data = contract_data_from_row(row, default_kind)
+            amount = parse_sale_amount(data['sale_amount'])
+        except ValueError as e:
+            invalid.append((line, row.get("sim_number", ""), str(e)))
+            continue
+        contracts.append((kind, data, amount))
+
+    now_jalali = jdatetime.datetime.now().strftime("%Y-%m-%d_%H%M%S")
+    # شناسه تصادفی دسته تا نام فایل‌های دو تولید گروهی هم‌زمان یکی نشود
+    batch_id = uuid.uuid4().hex[:8]
+    archive_entries, tx_entries = [], []
+    staging = tempfile.TemporaryDirectory(dir=CONTRACTS_FOLDER, prefix=".batch_")
+    with staging, zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_STORED) as zf:
+        rendered = render_contracts(((kind, data) for kind, data, _ in contracts), workers)
+        for i, ((kind, data, amount), content) in enumerate(zip(contracts, rendered), start=1):
+            filename = f"contract_{kind}_{now_jalali}_{batch_id}_{i:04d}.docx"
+            with open(os.path.join(staging.name, filename), "wb") as f:
+                f.write(content)
+            zf.writestr(filename, content)
+            archive_entries.append(contract_archive_entry(kind, filename, data))
+            tx_entries.append({
+                "tx_type": "دریافت فروش" if kind == "فروش" else "پرداخت خرید",
+                "amount": amount,
+                "description": f"قرارداد {kind} سیم کارت {data['sim_number']}",
+                "contract_file": filename,
+                "sim_number": data['sim_number'],
+                "party_national_id": data['buyer_national_id'] if kind == "فروش" else data['seller_national_id'],
+            })
+            if progress:
+                progress(i, len(contracts))
+        if invalid:
+            report = io.StringIO()
+            writer = csv.writer(report)
+            writer.writerow(["سطر", "شماره سیم کارت", "دلیل"])
+            writer.writerows(invalid)
+            zf.writestr(INVALID_ROWS_FILE, report.getvalue().encode("utf-8-sig"))
+
+        if tx_entries:
+            with transaction():
+                add_contract_transactions(tx_entries)
+                add_contracts(archive_entries)
+            for entry in tx_entries:
+                os.replace(os.path.join(staging.name, entry["contract_file"]),
+                           os.path.join(CONTRACTS_FOLDER, entry["contract_file"]))
+    return len(contracts), invalid
+
+def contract_batch_job(progress, content, filename, default_kind):
+    """کار پس‌زمینه تولید گروهی قرارداد از محتوای فایل بارگذاری‌شده؛ خروجی (مسیر ZIP، پیام)"""
+    zip_path = jobs.output_path("contracts.zip")
+    try:
+        count, invalid = generate_contract_batch(
+            iter_file_rows(io.BytesIO(content), filename), default_kind, zip_path, progress=progress,
+            workers=jobs.CPU_SHARE)
+    except ImportError:
+        raise ValueError("برای خواندن فایل Excel بسته openpyxl باید نصب باشد.")
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"خطا در خواندن فایل: {e}")
+    message = f"{count:,} قرارداد تولید، در آرشیو ذخیره و تراکنش مالی آن‌ها ثبت شد."
+    if invalid:
+        message += f" {len(invalid):,} سطر نامعتبر بود؛ فهرست آن‌ها در {INVALID_ROWS_FILE} داخل ZIP است."
+    return zip_path, message
+
+def batch_contract_tab(default_kind):
+    st.caption("هر سطر یک قرارداد است. ستون contract_type (فروش/خرید/صلح) اختیاری است و در نبود آن نوع انتخاب‌شده در نوار کناری استفاده می‌شود.")
+    template = io.StringIO()
+    csv.writer(template).writerow(BATCH_COLUMNS)
+    st.download_button("⬇️ دریافت فایل نمونه CSV", data=template.getvalue().encode("utf-8-sig"),
+                       file_name="contracts_template.csv", mime="text/csv", on_click="ignore")
+
+    uploaded = st.file_uploader("فایل CSV یا Excel قراردادها", type=["csv", "xlsx"], key="contract_batch_file")
+    if uploaded and st.button("📦 تولید گروهی قراردادها"):
+        submit_job("contract_batch_jobs", "contract_batch", f"قراردادهای {uploaded.name} (ZIP)",
+                   contract_batch_job, uploaded.getvalue(), uploaded.name, default_kind)
+    job_panel("contract_batch_jobs")
+
+def post_contract_transaction(kind, contract_data, filename):
+    """ثبت خودکار تراکنش مالی قرارداد؛ طرف حساب و سیم کارت مثل ثبت گروهی از روی کد ملی و شماره پیدا می‌شوند.
+    خروجی پیام نتیجه برای نمایش"""
+    try:
+        amount = parse_sale_amount(contract_data['sale_amount'])
+    except ValueError:
+        return "مبلغ قرارداد عدد معتبری نیست؛ تراکنش مالی ثبت نشد. لطفاً به صورت دستی ثبت کنید."
+    record_transaction({
+        "tx_type": "دریافت فروش" if kind == "فروش" else "پرداخت خرید",
+        "amount": amount,
+        "description": f"قرارداد {kind} سیم کارت {contract_data['sim_number']}",
+        "contract_file": filename,
+        "sim_number": contract_data['sim_number'],
+        "party_national_id": contract_data['buyer_national_id'] if kind == "فروش" else contract_data['seller_national_id'],
+    })
+    return "قرارداد ذخیره شد و تراکنش مالی مرتبط نیز به صورت خودکار ثبت شد."
+
+def contract_job(progress, contract_type, contract_data):
+    """کار پس‌زمینه تولید، ذخیره و ثبت مالی یک قرارداد؛ خروجی (مسیر فایل Word، پیام)"""
+    word_file = generate_contract(contract_type, contract_data)
+    file_path = save_contract_file(word_file, CONTRACT_TYPES[contract_type], contract_data)
+    progress(1, 1)
+    return file_path, post_contract_transaction(CONTRACT_TYPES[contract_type], contract_data,
+                                                os.path.basename(file_path))
+
+def contract_form_tab(contract_type):
+    contract_data = show_contract_form()
+    if st.button("📝 تولید و ذخیره قرارداد"):
+        if not contract_type or contract_type not in CONTRACT_TYPES:
+            st.error("لطفاً نوع قرارداد را انتخاب کنید.")
+        else:
+            title = f"قرارداد {CONTRACT_TYPES[contract_type]} {contract_data['sim_number']}".strip()
+            submit_job("contract_jobs", "contract", title, contract_job, contract_type, contract_data)
+    job_panel("contract_jobs")
+
 # ----------------- اجرای اصلی برنامه ------------------
 def main():
     selected_menu, contract_type = sidebar_content()
     
     if selected_menu == "تولید قرارداد سیم‌کارت":
         st.header(f"تولید قرارداد {contract_type}")
-        contract_data = show_contract_form()
-        if st.button("📝 تولید و ذخیره قرارداد"):
-            if not contract_type or contract_type not in CONTRACT_TYPES:
-                st.error("لطفاً نوع قرارداد را انتخاب کنید.")
-            else:
-                word_file = generate_contract(contract_type, contract_data)
-                file_path = save_contract_file(word_file, CONTRACT_TYPES[contract_type])
-                filename = os.path.basename(file_path)
-                st.success(f"فایل قرارداد با نام {filename} ثبت و ذخیره شد.")
-                st.download_button(
-                    "⬇️ دانلود فایل Word همین قرارداد", 
-                    data=word_file, 
-                    file_name=filename
-                )
-                
-                # ثبت خودکار تراکنش مالی
-                try:
-                    amount = int(contract_data['sale_amount'].replace(',', ''))
-                    tx_type = "دریافت فروش" if CONTRACT_TYPES[contract_type] == "فروش" else "پرداخت خرید"
-                    party_name = contract_data['buyer_name'] if CONTRACT_TYPES[contract_type] == "فروش" else contract_data['seller_name']
-                    
-                    add_transaction(
-                        tx_type=tx_type,
-                        amount=amount,
-                        description=f"قرارداد {CONTRACT_TYPES[contract_type]} سیم کارت {contract_data['sim_number']}",
-                        contract_file=filename,
-                        party_name=party_name
-                    )
-                    st.info("تراکنش مالی مرتبط نیز به صورت خودکار ثبت شد.")
-                except:
-                    st.warning("ثبت خودکار تراکنش مالی با خطا مواجه شد. لطفاً به صورت دستی ثبت کنید.")
+        single_tab, batch_tab = st.tabs(["قرارداد تکی", "تولید گروهی از فایل"])
+        with single_tab:
+            contract_form_tab(contract_type)
+        with batch_tab:
+            batch_contract_tab(CONTRACT_TYPES[contract_type])
     
     elif selected_menu == "🧾 حسابداری معاملات":
         accounting_tab()
@@ -657,5 +1169,11 @@ def main():
     elif selected_menu == "👥 مدیریت مشتریان/فروشندگان":
         parties_management_tab()
 
+    elif selected_menu == "🏦 مدیریت بانک‌ها":
+        banks_page()
+
+    elif selected_menu == "🛠 پایش عملکرد":
+        performance_page()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
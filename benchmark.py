@@ -0,0 +1,168 @@
+"""سنجش تأخیر هر فراخوانی توابع accounting.py
+
+اجرا:
+    python benchmark.py [تعداد تکرار]
+
+روی یک پایگاه داده موقت اجرا می‌شود و به accounting.db دست نمی‌زند.
+"""
+import io
+import os
+import sys
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import accounting
+import contract_generator
+import tracing
+
+
+# ===== پیاده‌سازی قبلی (یک اتصال جدید برای هر فراخوانی) =====
+def _legacy_connection():
+    return sqlite3.connect(accounting.DB_FILE, check_same_thread=False)
+
+def legacy_add_party(name, mobile, national_id):
+    con = _legacy_connection()
+    cur = con.cursor()
+    cur.execute('''
+        INSERT INTO parties (name, phone, mobile, national_id, address, type, account_status, initial_balance, notes)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (name, "", mobile, national_id, "", "مشتری", "طلبکار", 0, ""))
+    con.commit()
+    con.close()
+
+def legacy_get_parties():
+    con = _legacy_connection()
+    cur = con.cursor()
+    cur.execute("SELECT * FROM parties")
+    rows = cur.fetchall()
+    cols = [c[0] for c in cur.description]
+    con.close()
+    return [dict(zip(cols, r)) for r in rows]
+
+def legacy_get_payments_by_transaction(transaction_id):
+    con = _legacy_connection()
+    cur = con.cursor()
+    cur.execute("SELECT * FROM transaction_payments WHERE transaction_id=?", (transaction_id,))
+    rows = cur.fetchall()
+    cols = [c[0] for c in cur.description]
+    con.close()
+    return [dict(zip(cols, r)) for r in rows]
+
+
+# ===== ابزار اندازه‌گیری =====
+def measure(func, repeat):
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func(i)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        "mean_us": statistics.fmean(samples),
+        "p50_us": samples[len(samples) // 2],
+        "p95_us": samples[int(len(samples) * 0.95) - 1],
+    }
+
+def print_row(name, stats):
+    print(f"{name:<50} mean={stats['mean_us']:9.1f}µs  p50={stats['p50_us']:9.1f}µs  p95={stats['p95_us']:9.1f}µs")
+
+
+def bench_connections(repeat):
+    cases = [
+        ("add_party",
+         lambda i: legacy_add_party(f"legacy {i}", "0912", str(i)),
+         lambda i: accounting.add_party(f"pooled {i}", mobile="0912", national_id=str(i))),
+        ("get_parties",
+         lambda i: legacy_get_parties(),
+         lambda i: accounting.get_parties.__wrapped__()),
+        ("get_payments_by_transaction",
+         lambda i: legacy_get_payments_by_transaction(i),
+         lambda i: accounting.get_payments_by_transaction(i)),
+    ]
+    for name, legacy, pooled in cases:
+        before = measure(legacy, repeat)
+        after = measure(pooled, repeat)
+        print_row(f"{name} (قبل: اتصال جدید)", before)
+        print_row(f"{name} (بعد: اتصال ماندگار)", after)
+        print(f"{'':<50} speedup x{before['mean_us'] / after['mean_us']:.1f}")
+
+
+def bench_read_cache(repeat):
+    """خواندن مستقیم در برابر cached_read؛ هر دهمین فراخوانی یک نوشتن دارد که کش را باطل می‌کند"""
+    def with_writes(read):
+        def run(i):
+            if i % 10 == 0:
+                accounting.add_bank(f"bank {i}", str(i))
+            read()
+        return run
+
+    for name, func in [("get_parties", accounting.get_parties), ("get_banks", accounting.get_banks)]:
+        before = measure(with_writes(func.__wrapped__), repeat)
+        after = measure(with_writes(func), repeat)
+        print_row(f"{name} (قبل: بدون کش)", before)
+        print_row(f"{name} (بعد: کش با نسخه جدول)", after)
+        print(f"{'':<50} speedup x{before['mean_us'] / after['mean_us']:.1f}")
+
+
+def bench_tracing(repeat):
+    """هزینه لایه ردیابی: تابع بدون پوشش، پوشش با ردیابی خاموش و روشن"""
+    func = accounting.get_payments_by_transaction
+    print_row("get_payments_by_transaction (بدون پوشش)", measure(lambda i: func.__wrapped__(i), repeat))
+    print_row("get_payments_by_transaction (ردیابی خاموش)", measure(lambda i: func(i), repeat))
+    tracing.set_enabled(True)
+    try:
+        print_row("get_payments_by_transaction (ردیابی روشن)", measure(lambda i: func(i), repeat))
+    finally:
+        tracing.set_enabled(False)
+        tracing.reset()
+
+
+# ===== سرعت تولید قرارداد =====
+SAMPLE_CONTRACT = {
+    **{field: f"نمونه {field}" for field in contract_generator.CONTRACT_FIELDS},
+    "sim_number": "09121234567",
+    "sale_amount": "150,000,000",
+    "sale_amount_toman": "15,000,000",
+    "notes": "خط اول\nخط دوم <آزمایشی> & ...",
+    "payment_methods": [
+        ("", "100,000,000", "ملت", "کارت به کارت", "نقدی"),
+        ("", "50,000,000", "ملی", "چک", "چک"),
+        ("", "", "", "", ""),
+    ],
+}
+
+def _build_with_python_docx(kind, data):
+    stream = io.BytesIO()
+    contract_generator.TEMPLATE_BUILDERS[kind](data).save(stream)
+    return stream
+
+def bench_contracts(repeat):
+    repeat = min(repeat, 200)
+    for kind in contract_generator.TEMPLATE_BUILDERS:
+        contract_generator.get_contract_template(kind)  # ساخت قالب خارج از زمان‌سنجی
+        before = measure(lambda i: _build_with_python_docx(kind, SAMPLE_CONTRACT), repeat)
+        after = measure(lambda i: contract_generator.render_contract(kind, SAMPLE_CONTRACT), repeat)
+        print_row(f"قرارداد {kind} (قبل: python-docx)", before)
+        print_row(f"قرارداد {kind} (بعد: قالب پیش‌کامپایل‌شده)", after)
+        print(f"{'':<50} {1e6 / before['mean_us']:.0f} → {1e6 / after['mean_us']:.0f} قرارداد در ثانیه"
+              f"  speedup x{before['mean_us'] / after['mean_us']:.1f}")
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    with tempfile.TemporaryDirectory() as tmp:
+        accounting.DB_FILE = os.path.join(tmp, "bench.db")
+        accounting.init_db()
+        try:
+            bench_connections(repeat)
+            bench_read_cache(repeat)
+            bench_tracing(repeat)
+            bench_contracts(repeat)
+        finally:
+            accounting.close_connections()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,435 @@
+"""سنجش توابع accounting.py و تولید قرارداد روی داده مصنوعی در مقیاس واقعی
+
+اجرا:
+    python benchmark_scale.py [--scale 1.0] [--db scratch.db] [--output results.json]
+                              [--baseline baseline.json] [--tolerance 0.25] [--only نام]
+
+در مقیاس 1.0 یک پایگاه داده موقت با ۱ میلیون تراکنش، ۲۰۰ هزار سیم کارت، ۵۰ هزار طرف حساب،
+۵۰۰ هزار پرداخت و ۲۰ هزار چک ساخته می‌شود (با --db فایل نگه داشته می‌شود و اجرای بعدی از همان داده
+استفاده می‌کند؛ سنجش روی یک کپی تازه از آن انجام می‌شود تا نوشتن‌ها داده اجرای بعدی را تغییر ندهند). زمان هر تابع عمومی accounting.py، ContractGenerator.generate_contract و قرارداد خرید
+(generate_buy_contract در app.py) اندازه‌گیری و به صورت JSON ذخیره می‌شود.
+با --baseline نتیجه با یک اجرای قبلی مقایسه می‌شود و اگر میانه زمان تابعی بیش از tolerance کندتر
+شده باشد کد خروج 1 است.
+"""
+import argparse
+import csv
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+import accounting
+import contract_generator
+import exports
+from benchmark import SAMPLE_CONTRACT
+
+BASE_COUNTS = {
+    "parties": 50_000,
+    "sim_cards": 200_000,
+    "transactions": 1_000_000,
+    "transaction_payments": 500_000,
+    "checks": 20_000,
+    "banks": 20,
+    "contracts": 20_000,
+}
+HISTORY_DAYS = 3 * 365
+INSERT_CHUNK = 20_000
+DEFAULT_REPEAT = 20
+TIME_BUDGET = 5.0  # حداکثر ثانیه برای تکرارهای هر مورد (حداقل یک اجرا)
+MIN_DELTA_MS = 1.0  # اختلاف کمتر از این مقدار پسرفت حساب نمی‌شود
+
+OPERATORS = {"همراه اول": "0912", "ایرانسل": "0935", "رایتل": "0921"}
+FIRST_NAMES = ["علی", "محمد", "رضا", "حسین", "زهرا", "فاطمه", "مریم", "سارا", "امیر", "نرگس"]
+LAST_NAMES = ["رضایی", "محمدی", "احمدی", "کریمی", "حسینی", "موسوی", "جعفری", "صادقی", "نوری", "رحیمی"]
+TX_TYPES = ["دریافت فروش", "پرداخت خرید", "دریافت وام", "پرداخت وام", "سایر"]
+PAYMENT_METHODS = ["نقدی", "کارت به کارت", "چک", "واریز"]
+
+
+# ===== ساخت داده مصنوعی =====
+def _days():
+    """کلیدهای تاریخ روزهای بازه سابقه: (متن شمسی، epoch ابتدای روز، سال‌ماه شمسی)"""
+    today = datetime.date.today()
+    days = []
+    for back in range(HISTORY_DAYS, -1, -1):
+        text, epoch, ym = accounting.shamsi_date_keys(today - datetime.timedelta(days=back))
+        days.append((text[:10], epoch, ym))
+    return days
+
+def _future_days(count):
+    today = datetime.date.today()
+    return [accounting.shamsi_date_keys(today + datetime.timedelta(days=i)) for i in range(1, count + 1)]
+
+def _insert(cur, sql, rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= INSERT_CHUNK:
+            cur.executemany(sql, chunk)
+            chunk = []
+    if chunk:
+        cur.executemany(sql, chunk)
+
+def _parties(rng, count):
+    for i in range(count):
+        yield (f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}", "", f"0912{i:07d}", f"{i:010d}", "",
+               rng.choice(["مشتری", "همکار", "سایر"]), rng.choice(["طلبکار", "بدهکار"]),
+               rng.randrange(0, 50) * 1_000_000, "")
+
+def _sim_cards(rng, count, parties, days):
+    for i in range(count):
+        operator, prefix = rng.choice(list(OPERATORS.items()))
+        number = f"{prefix}{i:07d}"
+        canonical, reversed_ = accounting.sim_number_keys(number)
+        purchase = rng.randrange(len(days))
+        price = rng.randrange(10, 500) * 100_000
+        row = [number, canonical, reversed_, operator, "فعال", days[purchase][0], days[purchase][1],
+               days[purchase][2], price, None, None, None, None, None, ""]
+        if rng.random() < 0.4:
+            sale = rng.randrange(purchase, len(days))
+            row[9:14] = [days[sale][0], days[sale][1], days[sale][2], price + rng.randrange(-20, 80) * 100_000,
+                         rng.randrange(1, parties + 1)]
+        yield row
+
+def _transactions(rng, count, parties, sims, days):
+    for i in range(count):
+        text, epoch, ym = rng.choice(days)
+        seconds = rng.randrange(8 * 3600, 20 * 3600)
+        yield (rng.choice(TX_TYPES), rng.randrange(1, 2000) * 100_000,
+               f"{text} {seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}", epoch + seconds, ym,
+               f"تراکنش آزمایشی {i}", "",
+               rng.randrange(1, parties + 1) if rng.random() < 0.8 else None,
+               rng.randrange(1, sims + 1) if rng.random() < 0.6 else None,
+               rng.choice(PAYMENT_METHODS), "", f"REF{i:08d}")
+
+def _payments(rng, count, transactions):
+    for i in range(count):
+        yield (rng.randrange(1, transactions + 1), rng.choice(PAYMENT_METHODS), rng.randrange(1, 1000) * 100_000,
+               "", f"P{i:08d}", "")
+
+def _checks(rng, count, banks, days):
+    future = _future_days(180)
+    for i in range(count):
+        due_text, due_epoch, due_ym = rng.choice(future) if rng.random() < 0.5 else rng.choice(days)
+        yield (f"{i:08d}", rng.choice(["دریافت", "پرداخت"]), rng.randrange(1, banks + 1),
+               rng.randrange(1, 500) * 1_000_000, due_text[:10], due_epoch, due_ym,
+               rng.choice(accounting.CHECK_STATUSES), "")
+
+def _contracts(rng, count, days):
+    for i in range(count):
+        text, _, _ = rng.choice(days)
+        yield (rng.choice(["فروش", "خرید"]), f"contract_{i:07d}.docx", f"{text} 10:00:00",
+               f"0912{rng.randrange(10 ** 7):07d}", f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+               f"{rng.randrange(10 ** 10):010d}", rng.randrange(1, 2000) * 100_000)
+
+def generate_data(counts, seed=1):
+    """درج داده مصنوعی در پایگاه داده فعلی (accounting.DB_FILE)؛ خروجی زمان هر جدول به ثانیه"""
+    rng = random.Random(seed)
+    days = _days()
+    steps = [
+        ("parties", """INSERT INTO parties (name, phone, mobile, national_id, address, type, account_status,
+                       initial_balance, notes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+         lambda: _parties(rng, counts["parties"])),
+        ("sim_cards", """INSERT INTO sim_cards (number, number_canonical, number_reversed, operator, status,
+                         purchase_date, purchase_epoch, purchase_jalali_ym, purchase_price, sale_date, sale_epoch,
+                         sale_jalali_ym, sale_price, current_owner_id, notes)
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+         lambda: _sim_cards(rng, counts["sim_cards"], counts["parties"], days)),
+        ("transactions", """INSERT INTO transactions (tx_type, amount, shamsi_datetime, tx_epoch, tx_jalali_ym,
+                            description, contract_file, party_id, sim_card_id, payment_method, bank_account,
+                            reference_number) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+         lambda: _transactions(rng, counts["transactions"], counts["parties"], counts["sim_cards"], days)),
+        ("transaction_payments", """INSERT INTO transaction_payments (transaction_id, payment_method, amount,
+                                    bank_account, reference_number, notes) VALUES (?, ?, ?, ?, ?, ?)""",
+         lambda: _payments(rng, counts["transaction_payments"], counts["transactions"])),
+        ("banks", "INSERT INTO banks (name, account_number, owner, notes) VALUES (?, ?, ?, ?)",
+         lambda: ((f"بانک {i}", f"{i:016d}", "", "") for i in range(counts["banks"]))),
+        ("checks", """INSERT INTO checks (check_number, type, bank_id, amount, due_date, due_epoch, due_jalali_ym,
+                      status, notes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+         lambda: _checks(rng, counts["checks"], counts["banks"], days)),
+        ("contracts", f"""INSERT INTO contracts ({", ".join(accounting.CONTRACT_COLUMNS)})
+                          VALUES ({", ".join("?" * len(accounting.CONTRACT_COLUMNS))})""",
+         lambda: _contracts(rng, counts["contracts"], days)),
+    ]
+    timings = {}
+    for table, sql, rows in steps:
+        start = time.perf_counter()
+        with accounting.transaction(table) as cur:
+            _insert(cur, sql, rows())
+        timings[table] = round(time.perf_counter() - start, 2)
+        print(f"  {table:<22} {counts[table]:>10,} سطر  {timings[table]:8.1f}s", flush=True)
+    start = time.perf_counter()
+    accounting.get_connection().execute("ANALYZE")
+    timings["analyze"] = round(time.perf_counter() - start, 2)
+    return timings
+
+def table_counts():
+    con = accounting.get_connection()
+    return {table: con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in BASE_COUNTS}
+
+
+# ===== اندازه‌گیری =====
+def timed(func, repeat=DEFAULT_REPEAT, budget=TIME_BUDGET):
+    """اجرای func(i) حداکثر repeat بار یا تا پایان budget ثانیه؛ آمار به میلی‌ثانیه"""
+    samples = []
+    started = time.perf_counter()
+    for i in range(repeat):
+        start = time.perf_counter()
+        func(i)
+        samples.append((time.perf_counter() - start) * 1e3)
+        if time.perf_counter() - started > budget:
+            break
+    samples.sort()
+    return {
+        "runs": len(samples),
+        "mean_ms": round(sum(samples) / len(samples), 3),
+        "p50_ms": round(samples[len(samples) // 2], 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "min_ms": round(samples[0], 3),
+    }
+
+def _uncached(func):
+    """تابع اصلی پشت cached_read تا زمان واقعی پرس‌وجو سنجیده شود"""
+    return getattr(func, "__wrapped__", func)
+
+def _csv_file(rows):
+    stream = io.StringIO()
+    writer = csv.DictWriter(stream, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+    data = io.BytesIO(stream.getvalue().encode("utf-8"))
+    data.name = "rows.csv"
+    return data
+
+def working_copy(db_file, folder):
+    """کپی سازگار پایگاه داده (همراه با محتوای WAL) با backup API؛ موردهای نوشتنی روی کپی اجرا می‌شوند"""
+    accounting.close_connections()
+    path = os.path.join(folder, "bench_scale_run.db")
+    source, target = sqlite3.connect(db_file), sqlite3.connect(path)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+    return path
+
+def cases(counts):
+    """(نام، تابع یک‌آرگومانی i، تعداد تکرار) برای همه توابع عمومی؛ ابتدا خواندنی‌ها و سپس نوشتنی‌ها"""
+    a = accounting
+    rng = random.Random(2)
+    run = time.strftime("%Y%m%d%H%M%S")  # کلیدهای یکتای متنی هر اجرا
+    party = lambda: rng.randrange(1, counts["parties"] + 1)
+    sim = lambda: rng.randrange(1, counts["sim_cards"] + 1)
+    tx = lambda: rng.randrange(1, counts["transactions"] + 1)
+    sim_rows = lambda i, n: [{"شماره": f"0990{i:03d}{j:04d}", "اپراتور": "ایرانسل", "قیمت خرید": "1000000",
+                              "تاریخ خرید": "1403-01-01"} for j in range(n)]
+    statement_rows = lambda i, n: [{"date": "1403-01-01", "amount": str(1000 + j), "ref": f"BS{run}_{i:04d}{j:05d}",
+                                    "desc": "واریز"} for j in range(n)]
+    csv_rows = sim_rows(999, 10_000)
+    contract_rows = lambda i: [{"tx_type": "دریافت فروش", "amount": 1000, "description": "قرارداد",
+                                "contract_file": f"bench_{run}_{i}_{j}.docx", "sim_number": f"0912{j:07d}",
+                                "party_national_id": f"{j:010d}"} for j in range(20)]
+    archive_rows = lambda i: [{"contract_type": "فروش", "filename": f"bench_{run}_{i}_{j}.docx",
+                               "shamsi_datetime": "1403-01-01 10:00:00", "sim_number": f"0912{j:07d}",
+                               "party_name": "بنچمارک", "party_national_id": "", "amount": 1000}
+                              for j in range(20)]
+    added = {"transactions": [], "payments": [], "jobs": []}
+
+    def add_transaction(i):
+        added["transactions"].append(
+            a.add_transaction("دریافت فروش", 1000, "بنچمارک", party_id=party(), sim_card_id=sim()))
+
+    def add_payment(i):
+        a.add_payment_to_transaction(tx(), "نقدی", 1000)
+        added["payments"].append(a.get_connection().execute("SELECT MAX(id) FROM transaction_payments").fetchone()[0])
+
+    return [
+        # ----- خواندن -----
+        ("get_all_transactions", lambda i: a.get_all_transactions(), 3),
+        ("get_transactions_page", lambda i: a.get_transactions_page(), DEFAULT_REPEAT),
+        ("get_transactions_page(party_id)", lambda i: a.get_transactions_page(party_id=party()), DEFAULT_REPEAT),
+        ("get_transactions_page(sim_card_id)", lambda i: a.get_transactions_page(sim_card_id=sim()), DEFAULT_REPEAT),
+        ("get_transactions_page(date range)",
+         lambda i: a.get_transactions_page(start_date="1403-01-01", end_date="1403-06-31"), DEFAULT_REPEAT),
+        ("finance_summary", lambda i: a.finance_summary(), DEFAULT_REPEAT),
+        ("get_financial_reports", lambda i: a.get_financial_reports(), 5),
+        ("get_financial_reports(range)", lambda i: a.get_financial_reports("1403-01-01", "1403-12-29"), 5),
+        ("get_parties", lambda i: _uncached(a.get_parties)(), 3),
+        ("get_parties_page", lambda i: a.get_parties_page(), DEFAULT_REPEAT),
+        ("get_party_balances", lambda i: _uncached(a.get_party_balances)(), 3),
+        ("get_party_statement", lambda i: a.get_party_statement(party()), DEFAULT_REPEAT),
+        ("get_sim_cards", lambda i: _uncached(a.get_sim_cards)(), 3),
+        ("get_sim_cards_page", lambda i: a.get_sim_cards_page(), DEFAULT_REPEAT),
+        ("get_sim_cards_page(owner_id)", lambda i: a.get_sim_cards_page(owner_id=party()), DEFAULT_REPEAT),
+        ("get_sim_inventory_rollups", lambda i: _uncached(a.get_sim_inventory_rollups)(), DEFAULT_REPEAT),
+        ("search_sim_numbers(prefix)", lambda i: _uncached(a.search_sim_numbers)("0912", "prefix"), DEFAULT_REPEAT),
+        ("search_sim_numbers(suffix)", lambda i: _uncached(a.search_sim_numbers)("1234", "suffix"), DEFAULT_REPEAT),
+        ("search_sim_numbers(mask)",
+         lambda i: _uncached(a.search_sim_numbers)("0912***AB12", "mask"), DEFAULT_REPEAT),
+        ("search_parties", lambda i: _uncached(a.search_parties)("علی رض"), DEFAULT_REPEAT),
+        ("search_sim_cards", lambda i: _uncached(a.search_sim_cards)("09351"), DEFAULT_REPEAT),
+        ("get_banks", lambda i: _uncached(a.get_banks)(), DEFAULT_REPEAT),
+        ("get_checks", lambda i: a.get_checks(), 5),
+        ("get_checks_page", lambda i: a.get_checks_page(), DEFAULT_REPEAT),
+        ("get_checks_due", lambda i: a.get_checks_due(30), DEFAULT_REPEAT),
+        ("get_overdue_checks", lambda i: a.get_overdue_checks(), DEFAULT_REPEAT),
+        ("get_check_totals_by_bank", lambda i: a.get_check_totals_by_bank(), DEFAULT_REPEAT),
+        ("get_payments_by_transaction", lambda i: a.get_payments_by_transaction(tx()), DEFAULT_REPEAT),
+        ("get_payments_grouped", lambda i: a.get_payments_grouped([tx() for _ in range(50)]), DEFAULT_REPEAT),
+        ("get_contracts_page", lambda i: _uncached(a.get_contracts_page)(), DEFAULT_REPEAT),
+        ("get_contracts_page(search)", lambda i: _uncached(a.get_contracts_page)(search="0912"), DEFAULT_REPEAT),
+        ("check_ledger_totals", lambda i: a.check_ledger_totals(), 1),
+        ("check_party_balances", lambda i: a.check_party_balances(), 1),
+        ("check_sim_rollups", lambda i: a.check_sim_rollups(), 1),
+        ("get_schema_version", lambda i: a.get_schema_version(), DEFAULT_REPEAT),
+        ("table_versions", lambda i: a.table_versions(("transactions", "parties")), DEFAULT_REPEAT),
+        ("to_jalali", lambda i: a.to_jalali("2024-03-20 10:00:00"), DEFAULT_REPEAT),
+        ("to_gregorian", lambda i: a.to_gregorian("1403-01-01"), DEFAULT_REPEAT),
+        ("shamsi_date_keys", lambda i: a.shamsi_date_keys("1403-01-01 10:00:00"), DEFAULT_REPEAT),
+        ("date_keys", lambda i: a.date_keys("1403-01-01"), DEFAULT_REPEAT),
+        ("today_epoch", lambda i: a.today_epoch(), DEFAULT_REPEAT),
+        ("normalize_sim_number", lambda i: a.normalize_sim_number("+98 912 123 4567"), DEFAULT_REPEAT),
+        ("sim_number_keys", lambda i: a.sim_number_keys("09121234567"), DEFAULT_REPEAT),
+        ("get_export_row_count(transactions)", lambda i: a.get_export_row_count("transactions"), DEFAULT_REPEAT),
+        ("export_dataset(transactions csv)", lambda i: exports.export_dataset("transactions", "csv", os.devnull), 1),
+        ("export_dataset(sim_cards parquet)", lambda i: exports.export_dataset("sim_cards", "parquet", os.devnull), 1),
+        ("export_dataset(parties xlsx)", lambda i: exports.export_dataset("parties", "xlsx", os.devnull), 1),
+        ("iter_file_rows(csv 10k)", lambda i: sum(1 for _ in a.iter_file_rows(_csv_file(csv_rows), "rows.csv")), 3),
+        # ----- نوشتن -----
+        ("add_party", lambda i: a.add_party(f"بنچمارک {i}", mobile="0912", national_id=f"B{run}_{i}"), DEFAULT_REPEAT),
+        ("add_sim_card", lambda i: a.add_sim_card(f"0999{i:07d}", "رایتل", 1000), DEFAULT_REPEAT),
+        ("update_sim_owner", lambda i: a.update_sim_owner(sim(), party(), 2000), DEFAULT_REPEAT),
+        ("add_transaction", add_transaction, DEFAULT_REPEAT),
+        ("record_transaction(3 payments)", lambda i: a.record_transaction(
+            {"tx_type": "دریافت فروش", "amount": 3000, "party_id": party(), "sim_card_id": sim()},
+            [{"payment_method": "نقدی", "amount": 1000}] * 3), DEFAULT_REPEAT),
+        ("update_transaction", lambda i: a.update_transaction(tx(), "سایر", 1000, "ویرایش"), DEFAULT_REPEAT),
+        ("update_transactions(50)", lambda i: a.update_transactions(
+            [{"id": tx(), "tx_type": "سایر", "amount": 1000, "description": "ویرایش"} for _ in range(50)]),
+         DEFAULT_REPEAT),
+        ("delete_transaction", lambda i: a.delete_transaction(added["transactions"].pop()), DEFAULT_REPEAT),
+        ("add_payment_to_transaction", add_payment, DEFAULT_REPEAT),
+        ("delete_payment", lambda i: a.delete_payment(added["payments"].pop()), DEFAULT_REPEAT),
+        ("add_bank", lambda i: a.add_bank(f"بانک بنچمارک {i}", str(i)), DEFAULT_REPEAT),
+        ("add_check", lambda i: a.add_check(f"B{run}_{i}", "دریافت", 1, 1000, "1403-01-01"), DEFAULT_REPEAT),
+        ("update_check", lambda i: a.update_check(i + 1, notes="ویرایش"), DEFAULT_REPEAT),
+        ("set_checks_status(100)", lambda i: a.set_checks_status(range(i * 100 + 1, i * 100 + 101), "وصول شد"),
+         DEFAULT_REPEAT),
+        ("delete_check", lambda i: a.delete_check(counts["checks"] - i), DEFAULT_REPEAT),
+        ("add_job", lambda i: added["jobs"].append(a.add_job("benchmark", f"بنچمارک {i}")), DEFAULT_REPEAT),
+        ("update_job", lambda i: a.update_job(added["jobs"][i], status=a.JOB_DONE, done=1, total=1), DEFAULT_REPEAT),
+        ("get_jobs", lambda i: a.get_jobs(added["jobs"]), DEFAULT_REPEAT),
+        ("get_recent_jobs", lambda i: a.get_recent_jobs(), DEFAULT_REPEAT),
+        ("fail_interrupted_jobs", lambda i: a.fail_interrupted_jobs(), DEFAULT_REPEAT),
+        ("add_contracts(20)", lambda i: a.add_contracts(archive_rows(i)), DEFAULT_REPEAT),
+        ("add_contract_transactions(20)", lambda i: a.add_contract_transactions(contract_rows(i)), DEFAULT_REPEAT),
+        ("import_sim_cards(1000)", lambda i: a.import_sim_cards(sim_rows(i, 1000)), 5),
+        ("import_bank_statement(1000)",
+         lambda i: a.import_bank_statement(statement_rows(i, 1000),
+                                           {"date": "date", "amount": "amount", "reference_number": "ref",
+                                            "description": "desc"}), 5),
+        # ----- قرارداد -----
+        ("ContractGenerator.generate_contract",
+         lambda i: contract_generator.ContractGenerator().generate_contract(SAMPLE_CONTRACT), DEFAULT_REPEAT),
+        ("generate_buy_contract", lambda i: contract_generator.render_contract("خرید", SAMPLE_CONTRACT),
+         DEFAULT_REPEAT),
+    ]
+
+def run_cases(counts, only=None):
+    results = {}
+    for name, func, repeat in cases(counts):
+        if only and not any(part in name for part in only):
+            continue
+        try:
+            stats = timed(func, repeat)
+        except Exception as e:  # یک مورد خراب نباید کل سنجش را متوقف کند
+            results[name] = {"error": f"{type(e).__name__}: {e}"}
+            print(f"ERR  {name:<45} {results[name]['error']}", flush=True)
+            continue
+        results[name] = stats
+        print(f"{name:<50} p50={stats['p50_ms']:10.3f}ms  p95={stats['p95_ms']:10.3f}ms  runs={stats['runs']}",
+              flush=True)
+    return results
+
+
+# ===== مقایسه با baseline =====
+def compare(results, baseline, tolerance, min_delta_ms=MIN_DELTA_MS):
+    """فهرست (نام، p50 قبلی، p50 فعلی، نسبت، وضعیت) برای موردهای مشترک؛ وضعیت REGRESSION، FASTER یا OK"""
+    rows = []
+    for name, stats in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before or "p50_ms" not in before or "p50_ms" not in stats:
+            continue
+        old, new = before["p50_ms"], stats["p50_ms"]
+        ratio = new / old if old else float("inf")
+        if new - old > min_delta_ms and ratio > 1 + tolerance:
+            status = "REGRESSION"
+        elif old - new > min_delta_ms and ratio < 1 / (1 + tolerance):
+            status = "FASTER"
+        else:
+            status = "OK"
+        rows.append((name, old, new, ratio, status))
+    return rows
+
+def print_comparison(rows):
+    for name, old, new, ratio, status in rows:
+        print(f"{status:<10} {name:<50} {old:10.3f}ms → {new:10.3f}ms  x{ratio:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1.0, help="ضریب تعداد سطرها نسبت به BASE_COUNTS")
+    parser.add_argument("--db", help="فایل پایگاه داده (اگر داده داشته باشد دوباره ساخته نمی‌شود)")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="فایل JSON یک اجرای قبلی برای مقایسه")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="کندی مجاز نسبت به baseline (0.25 یعنی ۲۵٪)")
+    parser.add_argument("--only", nargs="*", help="فقط موردهایی که نامشان شامل یکی از این عبارت‌هاست")
+    args = parser.parse_args()
+
+    counts = {table: max(1, int(count * args.scale)) for table, count in BASE_COUNTS.items()}
+    with tempfile.TemporaryDirectory() as tmp:
+        accounting.DB_FILE = args.db or os.path.join(tmp, "bench_scale.db")
+        accounting.init_db()
+        try:
+            generate_seconds = None
+            if not accounting.get_connection().execute("SELECT 1 FROM transactions LIMIT 1").fetchone():
+                print(f"ساخت داده مصنوعی در {accounting.DB_FILE}", flush=True)
+                generate_seconds = generate_data(counts)
+            if args.db:
+                accounting.DB_FILE = working_copy(args.db, tmp)
+            counts = table_counts()
+            results = run_cases(counts, args.only)
+        finally:
+            accounting.close_connections()
+
+    report = {
+        "meta": {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "scale": args.scale,
+            "counts": counts,
+            "generate_seconds": generate_seconds,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"نتیجه در {args.output} ذخیره شد")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            rows = compare(results, json.load(f), args.tolerance)
+        print_comparison(rows)
+        if any(status == "REGRESSION" for *_, status in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
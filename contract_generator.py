@@ -1,11 +1,32 @@
 from docx import Document
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.shared import Pt, Inches
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 import io
+import multiprocessing
 import os
 
+from docx_template import DocxTemplate
+
+LOGO_PATH = "logo/uploaded_logo.png"
+
+CONTRACT_FIELDS = [
+    "seller_name", "seller_phone", "seller_address", "seller_birth", "seller_issued",
+    "seller_national_id", "seller_child",
+    "buyer_name", "buyer_phone", "buyer_address", "buyer_birth", "buyer_issued",
+    "buyer_national_id", "buyer_child",
+    "sim_number", "sale_amount", "sale_amount_toman",
+    "payment_date", "invoice_amount", "invoice_date", "notes",
+]
+PAYMENT_COLUMNS = 5
+
+
 class ContractGenerator:
     def __init__(self):
+        self.doc = None
+
+    def _new_document(self):
         self.doc = Document()
         self._setup_document_style()
         self._add_logo_if_exists()
@@ -18,9 +39,8 @@ class ContractGenerator:
         style.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.RIGHT
 
     def _add_logo_if_exists(self):
-        logo_path = "logo/uploaded_logo.png"
-        if os.path.exists(logo_path):
-            self.doc.add_picture(logo_path, width=Inches(2))
+        if os.path.exists(LOGO_PATH):
+            self.doc.add_picture(LOGO_PATH, width=Inches(2))
             last_paragraph = self.doc.paragraphs[-1]
             last_paragraph.alignment = WD_ALIGN_PARAGRAPH.RIGHT
 
@@ -33,6 +53,11 @@ class ContractGenerator:
         return paragraph
 
     def generate_contract(self, contract_data):
+        return render_contract("فروش", contract_data)
+
+    def build_document(self, contract_data):
+        """ساخت قرارداد فروش با python-docx؛ برای ساخت قالب (با فیلدهای {{name}}) استفاده می‌شود"""
+        self._new_document()
         self._add_rtl_paragraph("بسمه تعالی", bold=True)
         self.doc.add_paragraph().alignment = WD_ALIGN_PARAGRAPH.RIGHT
         self.doc.add_paragraph().alignment = WD_ALIGN_PARAGRAPH.RIGHT
@@ -73,11 +98,7 @@ class ContractGenerator:
             f"\nشاهد                                     شاهد         خریدار         فروشنده"
         )
         self._add_rtl_paragraph(remaining_text)
-
-        file_stream = io.BytesIO()
-        self.doc.save(file_stream)
-        file_stream.seek(0)
-        return file_stream
+        return self.doc
 
     def _add_payment_table(self, payment_methods):
         table = self.doc.add_table(rows=1, cols=5)
@@ -96,3 +117,169 @@ class ContractGenerator:
                     row_cells[i].text = str(item)
                     row_cells[i].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
                     row_cells[i].paragraphs[0].runs[0].font.name = 'B Nazanin'
+
+
+def build_buy_document(contract_data):
+    """ساخت قرارداد خرید/صلح با python-docx؛ برای ساخت قالب (با فیلدهای {{name}}) استفاده می‌شود"""
+    doc = Document()
+    if os.path.exists(LOGO_PATH):
+        doc.add_picture(LOGO_PATH, width=Pt(100))
+        doc.paragraphs[-1].alignment = WD_ALIGN_PARAGRAPH.RIGHT
+
+    def rtl(text, bold=False):
+        p = doc.add_paragraph()
+        run = p.add_run(text)
+        run.bold = bold
+        p.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+        p.paragraph_format.space_after = Pt(0)
+
+    rtl("بسمه تعالی", bold=True)
+    doc.add_paragraph().alignment = WD_ALIGN_PARAGRAPH.RIGHT
+
+    rtl(f"فروشنده: {contract_data['seller_name']}")
+    rtl(f"تلفن: {contract_data['seller_phone']}")
+    rtl(f"نشانی: {contract_data['seller_address']}")
+    rtl(f"متولد: {contract_data['seller_birth']}   صادره از: {contract_data['seller_issued']}   شماره کد ملی: {contract_data['seller_national_id']}   فرزند: {contract_data['seller_child']}")
+
+    rtl(f"متصالح (خریدار): {contract_data['buyer_name']}")
+    rtl(f"تلفن: {contract_data['buyer_phone']}")
+    rtl(f"نشانی: {contract_data['buyer_address']}")
+    rtl(f"متولد: {contract_data['buyer_birth']}   صادره از: {contract_data['buyer_issued']}   شماره کد ملی: {contract_data['buyer_national_id']}   فرزند: {contract_data['buyer_child']}")
+
+    rtl(f"مورد فروش: کلیه حقوق عینه، متصوره و فرضیه متعلق به یک رشته سیم کارت شرکت همراه اول به شماره {contract_data['sim_number']}\n"
+        "اعم از حق الامتیاز و حق الاشتراک و وام و ودیعه متعلقه احتمالی به نحوی که دیگر هیچگونه حق و ادعایی برای فروشنده در مورد صلح باقی نماند و خریدار قائم مقام قانونی و رسمی فروشنده در شرکت همراه اول می باشد تا مطابق مقررات بنام و نفع خود استفاده نماید.")
+    rtl(f"مبلغ مورد فروش: مبلغ {contract_data['sale_amount']} ریال معادل {contract_data['sale_amount_toman']} تومان که تمامی آن به اقرار تسلیم فروشنده گردیده است.")
+
+    table = doc.add_table(rows=1, cols=5)
+    hdrs = ["توضیحات", "مبلغ واریزی (ریال)", "بانک", "شرح واریز", "نحوه پرداخت"]
+    for i, h in enumerate(hdrs):
+        cell = table.rows[0].cells[i]
+        cell.text = h
+        cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
+        cell.paragraphs[0].runs[0].font.bold = True
+        cell.paragraphs[0].runs[0].font.name = "B Nazanin"
+    for payment in contract_data['payment_methods']:
+        if any(payment):
+            row = table.add_row().cells
+            for i, item in enumerate(payment):
+                row[i].text = str(item)
+                row[i].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
+                row[i].paragraphs[0].runs[0].font.name = "B Nazanin"
+    rtl(f"تاریخ و زمان تحویل سیم کارت به متصالح: {contract_data['payment_date']}")
+
+    solh_text = (
+"""مفاد و شرایط:
+1- مورد صلح صحیح و سالم به رویت متصالح رسیده و متصالح اقرار به دریافت و تصرف صحیح و سالم آن نموده است.
+2- هزینه کلیه مکالمات داخل و خارج کشور تا زمان تنظیم صلحنامه به عهده متصالح خواهد بود.
+3- متصالح متعهد به همکاری و حضور در تمام مراجع قانونی و قضایی در صورت لزوم می‌باشد.
+4- مسئولیت کامل هرگونه سوءاستفاده یا مزاحمت و پرداخت حقوق و دیون مربوطه از زمان تنظیم صلحنامه به عهده متصالح است.
+5- متصالح ضامن کشف فساد احتمالی گردید و تعهد به جبران خسارت دارد.
+6- سیم کارت تلفن همراه به صورت مال الاجاره می‌باشد و هزینه‌های ما به التفاوت به عهده متصالح است.
+7- متصالح هیچگونه حقی نسبت به قطع و سلب امتیاز نخواهد داشت.
+8- در صورت کشف فساد مبلغ سیم کارت به خریدار عودت خواهد شد.
+9- این سیم کارت به صورت اسقاط کافه خیارات حتی خیار غبن تنظیم و بر اساس مواد 10، 190 و 362 قانون مدنی معتبر است.
+""")
+    rtl(solh_text)
+    rtl(f"توضیحات: {contract_data['notes']}")
+    rtl("شاهد                                     شاهد         خریدار         فروشنده")
+    return doc
+
+
+# ===== قالب‌های پیش‌کامپایل‌شده =====
+TEMPLATE_BUILDERS = {
+    "فروش": lambda data: ContractGenerator().build_document(data),
+    "خرید": build_buy_document,
+}
+
+
+def _placeholder_data():
+    data = {field: "{{%s}}" % field for field in CONTRACT_FIELDS}
+    data["payment_methods"] = [tuple("{{pay_%d}}" % i for i in range(PAYMENT_COLUMNS))]
+    return data
+
+
+@lru_cache(maxsize=8)
+def _load_template(contract_kind, logo_mtime):
+    stream = io.BytesIO()
+    TEMPLATE_BUILDERS[contract_kind](_placeholder_data()).save(stream)
+    return DocxTemplate(stream.getvalue(), row_marker="pay_0")
+
+
+def get_contract_template(contract_kind):
+    """قالب کش‌شده نوع قرارداد («فروش» یا «خرید»)؛ با تغییر لوگو دوباره ساخته می‌شود"""
+    logo_mtime = os.path.getmtime(LOGO_PATH) if os.path.exists(LOGO_PATH) else None
+    return _load_template(contract_kind, logo_mtime)
+
+
+def render_contract(contract_kind, contract_data):
+    """تولید فایل Word قرارداد از قالب؛ خروجی BytesIO"""
+    rows = [
+        {"pay_%d" % i: item for i, item in enumerate(payment)}
+        for payment in contract_data['payment_methods'] if any(payment)
+    ]
+    return get_contract_template(contract_kind).render(contract_data, rows)
+
+
+# ===== تولید گروهی قرارداد =====
+CONTRACT_KINDS = {
+    "فروش": "فروش", "sale": "فروش",
+    "خرید": "خرید", "صلح": "خرید", "خرید/صلح": "خرید", "buy": "خرید",
+}
+PAYMENT_FIELDS = ["description", "bank", "amount", "method", "notes"]
+BATCH_PAYMENT_ROWS = 3
+BATCH_COLUMNS = ["contract_type"] + CONTRACT_FIELDS + [
+    f"pay{n}_{field}" for n in range(1, BATCH_PAYMENT_ROWS + 1) for field in PAYMENT_FIELDS
+]
+BATCH_REQUIRED = ["seller_name", "buyer_name", "sim_number", "sale_amount"]
+_AMOUNT_DIGITS = str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "01234567890123456789", ",٬ ")
+
+
+def parse_sale_amount(text):
+    """مبلغ متنی قرارداد (با ارقام فارسی یا جداکننده هزارگان) به عدد صحیح ریال"""
+    return int(float(str(text).translate(_AMOUNT_DIGITS)))
+
+
+def contract_data_from_row(row, default_kind="فروش"):
+    """تبدیل یک سطر فایل گروهی به (نوع قرارداد، داده قرارداد)؛ در صورت نقص ValueError با دلیل"""
+    def value(name):
+        cell = row.get(name)
+        return "" if cell is None else str(cell).strip()
+
+    kind_text = value("contract_type")
+    kind = CONTRACT_KINDS.get(kind_text.lower(), None) if kind_text else default_kind
+    if kind is None:
+        raise ValueError(f"نوع قرارداد نامعتبر: {kind_text}")
+    missing = [name for name in BATCH_REQUIRED if not value(name)]
+    if missing:
+        raise ValueError("ستون‌های خالی: " + "، ".join(missing))
+    try:
+        parse_sale_amount(value("sale_amount"))
+    except ValueError:
+        raise ValueError(f"مبلغ نامعتبر: {value('sale_amount')}")
+
+    data = {field: value(field) for field in CONTRACT_FIELDS}
+    data["payment_methods"] = [
+        tuple(value(f"pay{n}_{field}") for field in PAYMENT_FIELDS)
+        for n in range(1, BATCH_PAYMENT_ROWS + 1)
+    ]
+    return kind, data
+
+
+def _render_job(job):
+    kind, data = job
+    return render_contract(kind, data).getvalue()
+
+
+def render_contracts(jobs, workers=None):
+    """رندر موازی قراردادها روی هسته‌های پردازنده؛ خروجی bytes هر فایل به ترتیب jobs.
+    هر پروسه قالب‌ها را یک بار می‌سازد و برای بقیه قراردادهای خودش استفاده می‌کند.
+    پروسه‌ها با spawn ساخته می‌شوند چون این تابع از thread کارهای پس‌زمینه داخل سرور چندنخی Streamlit
+    صدا زده می‌شود و fork در آن‌جا ممکن است روی قفل‌های thread‌های دیگر گیر کند."""
+    jobs = list(jobs)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) < 2 * workers:
+        yield from map(_render_job, jobs)
+        return
+    chunksize = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        yield from pool.map(_render_job, jobs, chunksize=chunksize)
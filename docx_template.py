@@ -0,0 +1,81 @@
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+DOCUMENT_XML = "word/document.xml"
+_FIELD_RE = re.compile(r"\{\{(\w+)\}\}")
+_ROW_START_RE = re.compile(r"<w:tr[ >]")
+
+
+def _compile(xml):
+    """تقسیم XML به بخش‌های ثابت و نام فیلدها (اندیس زوج: متن ثابت، اندیس فرد: نام فیلد)"""
+    return _FIELD_RE.split(xml)
+
+
+def _xml_text(value):
+    """متن امن برای درج داخل <w:t>؛ خط جدید و tab به عناصر خودشان تبدیل می‌شوند"""
+    text = escape("" if value is None else str(value))
+    if "\n" in text:
+        text = text.replace("\n", '</w:t><w:br/><w:t xml:space="preserve">')
+    if "\t" in text:
+        text = text.replace("\t", '</w:t><w:tab/><w:t xml:space="preserve">')
+    return text
+
+
+def _fill(parts, values):
+    out = parts[:]
+    for i in range(1, len(out), 2):
+        out[i] = values.get(out[i], "")
+    return "".join(out)
+
+
+class DocxTemplate:
+    """قالب docx پیش‌کامپایل‌شده.
+
+    فایل پایه یک بار باز می‌شود: همه بخش‌های zip به جز word/document.xml (استایل‌ها، لوگو، فونت‌ها)
+    یک بار در یک zip آماده نوشته می‌شوند و document.xml به تکه‌های ثابت و فیلدهای {{name}} شکسته می‌شود.
+    برای هر سند فقط متن فیلدها جایگزین و document.xml به انتهای کپی zip آماده اضافه می‌شود.
+
+    ردیفی از جدول که شامل {{<row_marker>}} است قالب ردیف‌های تکرارشونده است و برای هر ردیف
+    ورودی render یک بار تکرار می‌شود."""
+
+    def __init__(self, docx_bytes, row_marker="row_0"):
+        with zipfile.ZipFile(io.BytesIO(docx_bytes)) as zin:
+            xml = zin.read(DOCUMENT_XML).decode("utf-8")
+            prefix = io.BytesIO()
+            with zipfile.ZipFile(prefix, "w") as zout:
+                for info in zin.infolist():
+                    if info.filename != DOCUMENT_XML:
+                        zout.writestr(info, zin.read(info.filename))
+        self._prefix = prefix.getvalue()
+
+        xml = xml.replace("<w:t>", '<w:t xml:space="preserve">')
+        marker = "{{" + row_marker + "}}"
+        position = xml.find(marker)
+        if position == -1:
+            head, row, tail = xml, "", ""
+        else:
+            start = [m.start() for m in _ROW_START_RE.finditer(xml, 0, position)][-1]
+            end = xml.index("</w:tr>", position) + len("</w:tr>")
+            head, row, tail = xml[:start], xml[start:end], xml[end:]
+        self._head = _compile(head)
+        self._row = _compile(row)
+        self._tail = _compile(tail)
+
+    @property
+    def fields(self):
+        return set(self._head[1::2]) | set(self._tail[1::2])
+
+    def render_xml(self, values, rows=()):
+        values = {k: _xml_text(v) for k, v in values.items()}
+        body = "".join(_fill(self._row, {k: _xml_text(v) for k, v in row.items()}) for row in rows)
+        return _fill(self._head, values) + body + _fill(self._tail, values)
+
+    def render(self, values, rows=()):
+        """ساخت فایل docx؛ values برای فیلدهای سند و rows فهرست dict برای ردیف‌های جدول"""
+        stream = io.BytesIO(self._prefix)
+        with zipfile.ZipFile(stream, "a", compression=zipfile.ZIP_DEFLATED) as zout:
+            zout.writestr(DOCUMENT_XML, self.render_xml(values, rows))
+        stream.seek(0)
+        return stream
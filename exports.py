@@ -0,0 +1,102 @@
+"""خروجی کامل جداول به CSV، XLSX و Parquet به صورت جریانی.
+
+سطرها با accounting.iter_export_chunks (cursor.fetchmany) تکه‌تکه خوانده و همان‌جا در فایل نوشته می‌شوند؛
+مصرف حافظه به اندازه یک تکه است و به تعداد سطرهای جدول بستگی ندارد:
+  - CSV با csv.writer مستقیم در فایل
+  - XLSX با Workbook(write_only=True) در openpyxl که سطرها را در فایل موقت می‌نویسد
+    (هر برگه حداکثر XLSX_MAX_ROWS سطر؛ بقیه در برگه‌های بعدی)
+  - Parquet با pyarrow.parquet.ParquetWriter که هر تکه یک row group می‌شود
+"""
+import csv
+
+import accounting
+import jobs
+
+XLSX_MAX_ROWS = 1_048_575  # سقف سطرهای یک برگه Excel منهای سطر عنوان
+
+
+def _write_csv(path, dataset, names, kinds, chunks, on_chunk):
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(names)
+        for rows in chunks:
+            writer.writerows(rows)
+            on_chunk(len(rows))
+
+
+def _write_xlsx(path, dataset, names, kinds, chunks, on_chunk):
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet, sheet_rows, sheets = None, XLSX_MAX_ROWS, 0
+    for rows in chunks:
+        for row in rows:
+            if sheet_rows >= XLSX_MAX_ROWS:
+                sheets += 1
+                sheet = workbook.create_sheet(dataset if sheets == 1 else f"{dataset}_{sheets}")
+                sheet.append(names)
+                sheet_rows = 0
+            sheet.append(row)
+            sheet_rows += 1
+        on_chunk(len(rows))
+    if sheet is None:
+        workbook.create_sheet(dataset).append(names)
+    workbook.save(path)
+
+
+def _arrow_column(values, kind, pa):
+    if kind == "int":
+        return pa.array(values, type=pa.int64())
+    return pa.array([v if v is None or isinstance(v, str) else str(v) for v in values], type=pa.string())
+
+
+def _write_parquet(path, dataset, names, kinds, chunks, on_chunk):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.schema([(name, pa.int64() if kind == "int" else pa.string()) for name, kind in zip(names, kinds)])
+    with pq.ParquetWriter(path, schema) as writer:
+        for rows in chunks:
+            columns = zip(*rows)
+            writer.write_table(pa.Table.from_arrays(
+                [_arrow_column(list(values), kind, pa) for values, kind in zip(columns, kinds)], schema=schema))
+            on_chunk(len(rows))
+
+
+# قالب -> (پسوند فایل، MIME، تابع نوشتن)
+EXPORT_FORMATS = {
+    "csv": ("csv", "text/csv", _write_csv),
+    "xlsx": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", _write_xlsx),
+    "parquet": ("parquet", "application/vnd.apache.parquet", _write_parquet),
+}
+
+
+def export_dataset(dataset, fmt, path, progress=None, chunk_size=accounting.EXPORT_CHUNK_SIZE):
+    """نوشتن همه سطرهای مجموعه dataset از accounting.EXPORT_DATASETS در path با قالب fmt؛
+    progress(done, total) پس از هر تکه صدا زده می‌شود. خروجی تعداد سطرهای نوشته‌شده است.
+    برای XLSX به openpyxl و برای Parquet به pyarrow نیاز است."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"invalid export format: {fmt}")
+    _, columns = accounting.EXPORT_DATASETS[dataset]
+    names = [name for _, name, _ in columns]
+    kinds = [kind for _, _, kind in columns]
+    total = accounting.get_export_row_count(dataset) if progress else None
+    done = 0
+
+    def on_chunk(count):
+        nonlocal done
+        done += count
+        if progress:
+            progress(done, max(total, done))
+
+    EXPORT_FORMATS[fmt][2](path, dataset, names, kinds,
+                           accounting.iter_export_chunks(dataset, chunk_size), on_chunk)
+    return done
+
+
+def export_job(progress, dataset, fmt):
+    """کار پس‌زمینه خروجی کامل یک مجموعه؛ خروجی (مسیر فایل، پیام)"""
+    path = jobs.output_path(f"{dataset}.{EXPORT_FORMATS[fmt][0]}")
+    try:
+        count = export_dataset(dataset, fmt, path, progress)
+    except ImportError as e:
+        raise ValueError(f"برای خروجی {fmt.upper()} بسته {e.name} باید نصب باشد.")
+    return path, f"{count:,} سطر"
@@ -0,0 +1,140 @@
+"""پیش‌بینی روزانه جریان نقدی و مانده حساب برای روزهای آینده.
+
+مانده فعلی از ledger_totals خوانده می‌شود و دو جزء به آن اضافه می‌شود:
+  - چک‌های در جریان در روز سررسید (چک‌های سررسید گذشته در روز اول)
+  - الگوی تکرارشونده تراکنش‌ها: میانگین دریافت/پرداخت هر روز هفته به اضافه میانگین باقی‌مانده هر روز ماه
+    شمسی در بازه سابقه (مثلاً اجاره اول ماه یا فروش بیشتر آخر هفته)
+همه محاسبات روی آرایه‌های روزانه با numpy/pandas انجام می‌شود و نتیجه تا تغییر جداول transactions یا checks
+کش می‌ماند.
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+import accounting
+
+FORECAST_DAYS = 90
+HISTORY_DAYS = 182
+FLOW_COLUMNS = ["checks_in", "checks_out", "recurring_in", "recurring_out"]
+
+
+def _gregorian(day):
+    return datetime.date(1970, 1, 1) + datetime.timedelta(days=int(day))
+
+
+def _jalali_parts(days):
+    """سال، ماه و روز شمسی برای آرایه شماره روزها (epoch / 86400).
+    فقط روز اول یک بار تبدیل می‌شود؛ ابتدای ماه‌های بازه از _day_info کش‌شده خوانده می‌شود (حلقه روی ماه‌ها،
+    نه روزها) و روز هر تاریخ با searchsorted روی ابتدای ماه‌ها به دست می‌آید."""
+    if len(days) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    first = accounting.to_jalali(_gregorian(days.min()))
+    year, month, last = first.year, first.month, int(days.max())
+    starts, months = [], []
+    while True:
+        start = accounting._day_info(year, month, 1)[0] // 86400
+        if start > last:
+            break
+        starts.append(start)
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    index = np.searchsorted(starts, days, side="right") - 1
+    year_month = np.array(months, dtype=np.int64)[index]
+    return year_month[:, 0], year_month[:, 1], days - np.array(starts, dtype=np.int64)[index] + 1
+
+
+def _calendar(days):
+    """روز هفته (دوشنبه=0) و روز ماه شمسی برای آرایه شماره روزها (epoch / 86400)"""
+    weekday = (days + 3) % 7  # ۱ ژانویه ۱۹۷۰ پنجشنبه بود
+    return weekday, _jalali_parts(days)[2]
+
+
+def _daily(days, values, start, length):
+    """جمع مقادیر هر روز در آرایه‌ای به طول length که اندیس صفر آن روز start است"""
+    out = np.zeros((length, values.shape[1]), dtype=np.int64)
+    np.add.at(out, days - start, values)
+    return out
+
+
+def _history(today_day, history_days):
+    """جمع روزانه دریافت و پرداخت تراکنش‌ها از history_days روز قبل تا دیروز"""
+    start_epoch = (today_day - history_days) * 86400
+    rows = accounting.get_connection().execute("""
+        SELECT tx_epoch / 86400 AS day,
+               SUM(CASE WHEN tx_type LIKE 'دریافت%' THEN amount ELSE 0 END),
+               SUM(CASE WHEN tx_type LIKE 'پرداخت%' THEN amount ELSE 0 END)
+        FROM transactions
+        WHERE tx_epoch >= ? AND tx_epoch < ?
+        GROUP BY day
+    """, (start_epoch, today_day * 86400)).fetchall()
+    if not rows:
+        return None
+    data = np.array(rows, dtype=np.int64)
+    # سابقه از اولین روز دارای تراکنش شروع می‌شود تا روزهای پیش از شروع کار میانگین‌ها را کم نکنند
+    start = int(data[:, 0].min())
+    days = np.arange(start, today_day)
+    return days, _daily(data[:, 0], data[:, 1:], start, len(days))
+
+
+def _recurring(history, future_days):
+    """الگوی روز هفته + روز ماه شمسی سابقه، اعمال‌شده روی روزهای آینده (ستون‌ها: دریافت، پرداخت)"""
+    if history is None:
+        return np.zeros((len(future_days), 2))
+    days, flows = history
+    weekday, jalali_day = _calendar(days)
+    flows = pd.DataFrame(flows, dtype=float)
+    weekday_mean = flows.groupby(weekday).mean()
+    residual = flows - weekday_mean.loc[weekday].to_numpy()
+    day_of_month_mean = residual.groupby(jalali_day).mean()
+
+    future_weekday, future_jalali_day = _calendar(future_days)
+    expected = (weekday_mean.reindex(future_weekday).fillna(0).to_numpy()
+                + day_of_month_mean.reindex(future_jalali_day).fillna(0).to_numpy())
+    # مقدار منفی (روزی که کمتر از میانگین هفته تراکنش دارد) صفر می‌شود و بقیه به همان نسبت کوچک می‌شوند
+    # تا جمع کل بازه با الگوی بدون برش برابر بماند
+    clipped = expected.clip(min=0)
+    totals = clipped.sum(axis=0)
+    scale = np.divide(expected.sum(axis=0).clip(min=0), totals, out=np.zeros_like(totals), where=totals > 0)
+    return clipped * scale
+
+
+def _checks(today_day, days):
+    """مبلغ چک‌های در جریان دریافتی و پرداختی به تفکیک روز سررسید؛ سررسید گذشته در روز اول"""
+    rows = accounting.get_connection().execute("""
+        SELECT due_epoch / 86400 AS day,
+               SUM(CASE WHEN type = 'دریافت' THEN amount ELSE 0 END),
+               SUM(CASE WHEN type = 'پرداخت' THEN amount ELSE 0 END)
+        FROM checks
+        WHERE status = ? AND due_epoch < ?
+        GROUP BY day
+    """, (accounting.CHECK_IN_FLIGHT, (today_day + days) * 86400)).fetchall()
+    if not rows:
+        return np.zeros((days, 2), dtype=np.int64)
+    data = np.array(rows, dtype=np.int64)
+    return _daily(np.maximum(data[:, 0], today_day), data[:, 1:], today_day, days)
+
+
+@accounting.cached_read("transactions", "checks")
+def _cash_flow_forecast(today_day, days, history_days):
+    future_days = np.arange(today_day, today_day + days)
+    flows = pd.DataFrame(
+        np.hstack([_checks(today_day, days), _recurring(_history(today_day, history_days), future_days)]),
+        columns=FLOW_COLUMNS,
+        index=pd.to_datetime(future_days, unit="D"),
+    ).round().astype("int64")
+    flows["net"] = flows["checks_in"] + flows["recurring_in"] - flows["checks_out"] - flows["recurring_out"]
+    flows["balance"] = accounting.finance_summary()["balance"] + flows["net"].cumsum()
+    flows.insert(0, "jalali_date", [f"{y:04d}-{m:02d}-{d:02d}" for y, m, d in zip(*_jalali_parts(future_days))])
+    return flows
+
+
+def cash_flow_forecast(days=FORECAST_DAYS, history_days=HISTORY_DAYS):
+    """پیش‌بینی روزانه days روز آینده از امروز.
+
+    خروجی DataFrame با اندیس تاریخ میلادی و ستون‌های jalali_date، checks_in/checks_out (چک‌های در جریان)،
+    recurring_in/recurring_out (الگوی تراکنش‌های history_days روز گذشته)، net و balance (مانده پیش‌بینی‌شده
+    پایان هر روز با شروع از مانده فعلی دفتر)."""
+    today_day = accounting.today_epoch() // 86400
+    return _cash_flow_forecast(today_day, days, history_days).copy()
@@ -0,0 +1,122 @@
+"""اجرای کارهای سنگین (تولید قرارداد و خروجی فایل) در پس‌زمینه.
+
+هر کار یک سطر در جدول jobs دارد و در یک ThreadPoolExecutor مشترک پروسه با تعداد کارگر محدود اجرا می‌شود؛
+کارهای اضافه در صف می‌مانند و هم‌زمانی کاربران بیش از MAX_WORKERS هسته را درگیر نمی‌کند.
+رابط کاربری فقط id کار را نگه می‌دارد و وضعیت، پیشرفت و فایل نتیجه را از جدول jobs می‌خواند.
+
+تابع کار به شکل func(progress, *args) است: progress(done, total) پیشرفت را ثبت می‌کند و خروجی تابع مسیر فایل
+نتیجه یا (مسیر فایل، پیام) است. هر استثنا کار را با پیام آن به وضعیت خطا می‌برد.
+"""
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import jdatetime
+
+import accounting
+
+JOBS_FOLDER = "exports"
+MAX_WORKERS = int(os.environ.get("ACCOUNTING_JOB_WORKERS", 0)) or min(4, os.cpu_count() or 1)
+# سهم هر کار از هسته‌ها برای کارهایی که خودشان موازی اجرا می‌شوند (رندر گروهی قرارداد)؛
+# با MAX_WORKERS کار هم‌زمان جمع پروسه‌ها از تعداد هسته‌ها بیشتر نمی‌شود
+CPU_SHARE = max(1, (os.cpu_count() or 1) // MAX_WORKERS)
+PROGRESS_INTERVAL = 0.5  # حداقل فاصله ثبت پیشرفت در پایگاه داده (ثانیه)
+RETENTION_DAYS = 7  # فایل‌های نتیجه و سطر کارهای قدیمی‌تر در راه‌اندازی برنامه پاک می‌شوند
+FINISH_RETRIES = 5
+FINISH_RETRY_DELAY = 0.2  # ثانیه؛ در هر تلاش بیشتر می‌شود
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="job")
+_names_lock = threading.Lock()
+
+
+def _now():
+    return jdatetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def output_path(filename):
+    """مسیر یکتا برای فایل نتیجه در JOBS_FOLDER با پیشوند زمان"""
+    os.makedirs(JOBS_FOLDER, exist_ok=True)
+    stem, ext = os.path.splitext(filename)
+    with _names_lock:
+        stamp = jdatetime.datetime.now().strftime("%Y-%m-%d_%H%M%S")
+        path = os.path.join(JOBS_FOLDER, f"{stem}_{stamp}{ext}")
+        i = 1
+        while os.path.exists(path):
+            i += 1
+            path = os.path.join(JOBS_FOLDER, f"{stem}_{stamp}_{i}{ext}")
+        open(path, "wb").close()
+    return path
+
+
+def cleanup(retention_days=RETENTION_DAYS):
+    """حذف سطر کارهای پایان‌یافته قدیمی‌تر از retention_days روز و فایل‌های قدیمی JOBS_FOLDER.
+    فقط فایل‌های داخل JOBS_FOLDER پاک می‌شوند (نتیجه تولید تکی قرارداد در آرشیو قراردادها می‌ماند).
+    خروجی تعداد فایل‌های حذف‌شده"""
+    cutoff = jdatetime.datetime.now() - jdatetime.timedelta(days=retention_days)
+    accounting.prune_jobs(cutoff.strftime("%Y-%m-%d %H:%M:%S"))
+    if not os.path.isdir(JOBS_FOLDER):
+        return 0
+    # سطر کارهای جدیدتر از cutoff مانده است و فایل آن‌ها هم جدیدتر است؛ پس هر فایل قدیمی‌تر بی‌صاحب است
+    cutoff_ts = time.time() - retention_days * 86400
+    removed = 0
+    for entry in os.scandir(JOBS_FOLDER):
+        if entry.is_file() and entry.stat().st_mtime < cutoff_ts:
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+def _progress_reporter(job_id):
+    """تابع progress(done, total) که حداکثر هر PROGRESS_INTERVAL ثانیه (و همیشه در پایان) می‌نویسد"""
+    last = [0.0]
+
+    def report(done, total=None):
+        now = time.monotonic()
+        if now - last[0] < PROGRESS_INTERVAL and (total is None or done < total):
+            return
+        last[0] = now
+        accounting.update_job(job_id, done=done, total=total)
+    return report
+
+
+def _finish(job_id, **fields):
+    """ثبت وضعیت پایانی کار؛ اگر نوشتن روی اتصال thread شکست بخورد روی اتصال تازه دوباره تلاش می‌شود
+    تا کار هیچ‌گاه در وضعیت «در حال اجرا» نماند"""
+    try:
+        accounting.update_job(job_id, **fields)
+        return
+    except sqlite3.Error:
+        pass
+    for attempt in range(FINISH_RETRIES):
+        try:
+            accounting.update_job_on_new_connection(job_id, **fields)
+            return
+        except sqlite3.Error:
+            if attempt == FINISH_RETRIES - 1:
+                raise
+            time.sleep(FINISH_RETRY_DELAY * (attempt + 1))
+
+
+def _run(job_id, func, args, kwargs):
+    status, fields = accounting.JOB_FAILED, {"message": "کار ناتمام ماند"}
+    try:
+        accounting.update_job(job_id, status=accounting.JOB_RUNNING, started_at=_now())
+        result = func(_progress_reporter(job_id), *args, **kwargs)
+        result_path, message = result if isinstance(result, tuple) else (result, None)
+        status, fields = accounting.JOB_DONE, {"result_path": result_path, "message": message}
+    except Exception as e:
+        fields = {"message": str(e) or type(e).__name__}
+    finally:
+        _finish(job_id, status=status, finished_at=_now(), **fields)
+
+
+def submit(kind, title, func, *args, **kwargs):
+    """ثبت کار در جدول jobs و سپردن آن به pool؛ خروجی id کار بلافاصله برمی‌گردد"""
+    job_id = accounting.add_job(kind, title)
+    _executor.submit(_run, job_id, func, args, kwargs)
+    return job_id
@@ -0,0 +1,101 @@
+"""گزارش‌های تحلیلی روی جمع‌های ذخیره‌شده پایگاه داده.
+
+داده خام از جداول rollup (که با trigger به‌روز می‌مانند) با یک پرس‌وجوی کش‌شده خوانده می‌شود و
+محاسبات با عملیات برداری pandas انجام می‌شود؛ هزینه گزارش به تعداد سیم کارت‌ها بستگی ندارد.
+"""
+import numpy as np
+import pandas as pd
+
+import accounting
+
+# ===== گزارش ارزش موجودی و سودآوری سیم کارت =====
+ROLLUP_COLUMNS = ["kind", "operator", "purchase_day", "purchase_jalali_ym", "sale_jalali_ym",
+                  "sim_count", "cost", "revenue", "days_held", "dated_count"]
+AGING_BINS = [-np.inf, 30, 90, 180, 365, np.inf]
+AGING_LABELS = ["تا ۳۰ روز", "۳۱ تا ۹۰ روز", "۹۱ تا ۱۸۰ روز", "۱۸۱ تا ۳۶۵ روز", "بیش از ۳۶۵ روز"]
+AGING_UNKNOWN = "تاریخ خرید نامعلوم"
+UNKNOWN_MONTH = "نامعلوم"
+
+
+def _today_day():
+    """شماره روز امروز با همان مبنای purchase_day (epoch ابتدای روز / 86400)"""
+    return accounting.today_epoch() // 86400
+
+
+def format_jalali_ym(values):
+    """سری سال‌ماه عددی (140305) به متن 1403-05؛ مقدار 0 یعنی تاریخ نامعلوم"""
+    values = pd.Series(values, dtype="int64")
+    text = (values // 100).astype(str).str.zfill(4) + "-" + (values % 100).astype(str).str.zfill(2)
+    return text.where(values != 0, UNKNOWN_MONTH)
+
+
+def _stock_aging(stock, today_day):
+    age = today_day - stock["purchase_day"]
+    bucket = pd.cut(age, AGING_BINS, labels=AGING_LABELS).cat.add_categories(AGING_UNKNOWN)
+    bucket = bucket.where(stock["purchase_day"] >= 0, AGING_UNKNOWN)
+    aging = (stock.assign(bucket=bucket)
+             .groupby(["operator", "bucket"], observed=True)
+             .agg(stock_count=("sim_count", "sum"), stock_value=("cost", "sum"))
+             .reset_index())
+    dated = stock[stock["purchase_day"] >= 0]
+    age_total = (dated["sim_count"] * (today_day - dated["purchase_day"])).groupby(dated["operator"]).sum()
+    avg_age = age_total / dated.groupby("operator")["sim_count"].sum()
+    return aging, avg_age
+
+
+def _monthly_flows(rollups):
+    """خرید، فروش و مانده پایان ماه موجودی برای هر اپراتور و ماه شمسی"""
+    purchases = (rollups.groupby(["operator", "purchase_jalali_ym"])[["sim_count", "cost"]].sum()
+                 .rename(columns={"sim_count": "purchased_count", "cost": "purchased_cost"})
+                 .rename_axis(["operator", "jalali_ym"]))
+    sold = rollups[rollups["kind"] == "sold"]
+    sales = (sold.groupby(["operator", "sale_jalali_ym"])[["sim_count", "cost", "revenue", "days_held", "dated_count"]]
+             .sum()
+             .rename(columns={"sim_count": "sold_count", "cost": "cost_of_sold"})
+             .rename_axis(["operator", "jalali_ym"]))
+    monthly = purchases.join(sales, how="outer").fillna(0).astype("int64").sort_index()
+
+    by_operator = monthly.groupby(level="operator")
+    monthly["stock_count"] = (by_operator["purchased_count"].cumsum() - by_operator["sold_count"].cumsum())
+    monthly["stock_value"] = (by_operator["purchased_cost"].cumsum() - by_operator["cost_of_sold"].cumsum())
+    monthly["margin"] = monthly["revenue"] - monthly["cost_of_sold"]
+    return monthly.reset_index()
+
+
+def _with_ratios(df):
+    """ستون‌های میانگین روز نگهداری و درصد سود (نسبت به مبلغ فروش) از ستون‌های جمع"""
+    df["avg_days_held"] = (df["days_held"] / df["dated_count"].replace(0, np.nan)).round(1)
+    df["margin_pct"] = (df["margin"] * 100 / df["revenue"].replace(0, np.nan)).round(1)
+    return df.drop(columns=["days_held", "dated_count"])
+
+
+def sim_inventory_report(today_day=None):
+    """ارزش موجودی و سودآوری سیم کارت‌ها از جداول sim_stock_rollup و sim_sales_rollup.
+
+    خروجی dict شامل سه DataFrame:
+      summary: برای هر اپراتور موجودی فعلی (تعداد، ارزش خرید، میانگین سن به روز) و جمع فروش، سود محقق‌شده و
+               میانگین روز نگهداری سیم کارت‌های فروخته‌شده
+      monthly: برای هر اپراتور و ماه شمسی خرید، فروش، سود محقق‌شده، میانگین روز نگهداری و موجودی پایان ماه
+      aging:   موجودی فروش‌نرفته هر اپراتور در دسته‌های سنی AGING_LABELS
+    today_day مبنای محاسبه سن موجودی است (پیش‌فرض امروز)."""
+    if today_day is None:
+        today_day = _today_day()
+    rollups = pd.DataFrame(accounting.get_sim_inventory_rollups(), columns=ROLLUP_COLUMNS)
+    stock = rollups[rollups["kind"] == "stock"]
+
+    aging, avg_age = _stock_aging(stock, today_day)
+    monthly = _monthly_flows(rollups)
+
+    summary = monthly.groupby("operator")[
+        ["sold_count", "revenue", "cost_of_sold", "margin", "days_held", "dated_count"]].sum()
+    current = stock.groupby("operator")[["sim_count", "cost"]].sum()
+    summary = (current.rename(columns={"sim_count": "stock_count", "cost": "stock_value"})
+               .join(summary, how="outer").fillna(0).astype("int64"))
+    summary.insert(2, "avg_stock_age_days", avg_age.reindex(summary.index).round(1))
+
+    monthly.insert(1, "month", format_jalali_ym(monthly["jalali_ym"]))
+    return {
+        "summary": _with_ratios(summary.reset_index()),
+        "monthly": _with_ratios(monthly),
+        "aging": aging,
+    }
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import accounting  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    """پایگاه داده خالی موقت با همه مهاجرت‌ها؛ پس از آزمون اتصال‌ها بسته و مسیر قبلی برگردانده می‌شود"""
+    previous = accounting.DB_FILE
+    accounting.DB_FILE = str(tmp_path / "test.db")
+    accounting.run_migrations()
+    try:
+        yield accounting
+    finally:
+        accounting.close_connections()
+        accounting.DB_FILE = previous
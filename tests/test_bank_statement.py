@@ -0,0 +1,60 @@
+"""ورود صورتحساب بانکی: شماره پیگیری تکراری و سطرهای نامعتبر رد می‌شوند و جمع‌ها درست می‌مانند"""
+MAPPING = {"date": "تاریخ", "amount": "مبلغ", "description": "شرح", "reference_number": "پیگیری"}
+
+
+def _row(date, amount, ref="", description=""):
+    return {"تاریخ": date, "مبلغ": amount, "شرح": description, "پیگیری": ref}
+
+
+ROWS = [
+    _row("1403-01-05 10:00", "1,000,000", "R1"),   # 2
+    _row("1403-01-05 11:00", "-250000", "R2"),     # 3
+    _row("1403-01-06", "500", "R1"),               # 4 تکراری در همان دسته
+    _row("1403-01-07", "0", "R3"),                 # 5 مبلغ صفر
+    _row("1403-02-31", "700", "R4"),               # 6 آخرین روز اردیبهشت
+    _row("1403-02-32", "700", "R5"),               # 7 تاریخ نامعتبر
+    _row("", "700", "R6"),                         # 8 تاریخ خالی
+    _row("2024-04-01", "abc", "R7"),               # 9 مبلغ نامعتبر
+    _row("2024-04-01", "300", "R2"),               # 10 تکراری در دسته بعدی
+    _row("1403-03-01", "-40", ""),                 # 11 بدون شماره پیگیری
+    _row("1403-03-01", "-40", ""),                 # 12 بدون شماره پیگیری (تکراری حساب نمی‌شود)
+]
+
+
+def _counts(db):
+    con = db.get_connection()
+    return (con.execute("SELECT COUNT(*) FROM transactions").fetchone()[0],
+            con.execute("SELECT COUNT(*) FROM transaction_payments").fetchone()[0])
+
+
+def test_import_bank_statement(db):
+    progress = []
+    result = db.import_bank_statement(ROWS, MAPPING, bank_account="ملت", batch_size=2, progress=progress.append)
+
+    assert result["imported"] == 5
+    assert result["duplicates"] == [(4, "R1"), (10, "R2")]
+    assert result["invalid"] == [(5, "مبلغ صفر است"), (7, "تاریخ نامعتبر"), (8, "تاریخ خالی است"),
+                                 (9, "مبلغ نامعتبر")]
+    assert progress == [2, 4, 6, 8, 10, 11]
+    assert _counts(db) == (5, 5)
+    assert db.check_ledger_totals() == []
+    summary = db.finance_summary()
+    assert (summary["total_income"], summary["total_outcome"]) == (1_000_700, 250_080)
+
+
+def test_reimport_skips_known_references(db):
+    db.import_bank_statement(ROWS, MAPPING, batch_size=3)
+    result = db.import_bank_statement(ROWS, MAPPING, batch_size=3)
+    assert result["imported"] == 2  # فقط دو سطر بدون شماره پیگیری
+    assert [line for line, _ in result["duplicates"]] == [2, 3, 4, 6, 10]
+    assert _counts(db) == (7, 7)
+    assert db.check_ledger_totals() == []
+
+
+def test_reference_already_on_a_payment_is_duplicate(db):
+    tx_id = db.record_transaction({"tx_type": "دریافت فروش", "amount": 100},
+                                  [{"payment_method": "کارت", "amount": 100, "reference_number": "R9"}])
+    result = db.import_bank_statement([_row("1403-01-01", "100", "R9")], MAPPING)
+    assert (result["imported"], result["duplicates"]) == (0, [(2, "R9")])
+    assert db.get_payments_by_transaction(tx_id)[0]["reference_number"] == "R9"
+    assert db.check_ledger_totals() == []
@@ -0,0 +1,64 @@
+"""تغییر وضعیت گروهی چک‌ها و سررسیدها"""
+import pytest
+
+
+def _checks(db, count):
+    db.add_bank("ملت", "123")
+    for i in range(count):
+        db.add_check(f"C{i}", "دریافت", 1, 1000 * (i + 1), "1403-01-10")
+    return [row[0] for row in db.get_connection().execute("SELECT id FROM checks ORDER BY id")]
+
+
+def _statuses(db):
+    return [row[0] for row in db.get_connection().execute("SELECT status FROM checks ORDER BY id")]
+
+
+def test_only_in_flight_checks_change_by_default(db):
+    ids = _checks(db, 3)
+    assert db.set_checks_status(ids[:2], "وصول شد") == 2
+    assert db.set_checks_status(ids, "برگشتی") == 1
+    assert _statuses(db) == ["وصول شد", "وصول شد", "برگشتی"]
+
+
+def test_from_status_none_changes_any_status(db):
+    ids = _checks(db, 2)
+    db.set_checks_status(ids[:1], "برگشتی")
+    assert db.set_checks_status(ids, "در جریان", from_status=None) == 2
+    assert _statuses(db) == ["در جریان", "در جریان"]
+
+
+def test_explicit_from_status(db):
+    ids = _checks(db, 2)
+    db.set_checks_status(ids[:1], "برگشتی")
+    assert db.set_checks_status(ids, "در جریان", from_status="برگشتی") == 1
+    assert _statuses(db) == ["در جریان", "در جریان"]
+
+
+def test_invalid_status_is_rejected(db):
+    ids = _checks(db, 1)
+    with pytest.raises(ValueError):
+        db.set_checks_status(ids, "باطل")
+    assert _statuses(db) == ["در جریان"]
+
+
+def test_cleared_checks_leave_overdue_list(db):
+    ids = _checks(db, 2)
+    overdue, _ = db.get_overdue_checks()
+    assert [c["id"] for c in overdue] == ids
+    db.set_checks_status(ids[:1], "وصول شد")
+    overdue, _ = db.get_overdue_checks()
+    assert [c["id"] for c in overdue] == ids[1:]
+
+
+def test_checks_page_due_range(db):
+    db.add_bank("ملت", "123")
+    for i, due in enumerate(["1403-01-10", "1403-02-10", "1403-03-10"]):
+        db.add_check(f"C{i}", "دریافت", 1, 1000, due)
+    rows, _ = db.get_checks_page(due_from="1403-02-10", due_to="2024-05-30")  # 1403-03-10
+    assert [r["check_number"] for r in rows] == ["C2", "C1"]
+
+
+@pytest.mark.parametrize("bad", [{"due_from": "1403-13-01"}, {"due_to": "فردا"}])
+def test_checks_page_rejects_invalid_due_dates(db, bad):
+    with pytest.raises(ValueError):
+        db.get_checks_page(**bad)
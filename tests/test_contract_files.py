@@ -0,0 +1,59 @@
+"""نام فایل قراردادها حتی برای چند تولید در یک ثانیه یکتا می‌ماند"""
+import importlib
+import os
+from types import SimpleNamespace
+
+import jdatetime
+import pytest
+
+from contract_generator import BATCH_COLUMNS
+
+
+@pytest.fixture
+def app(db, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    module = importlib.import_module("app")
+    os.makedirs(module.CONTRACTS_FOLDER, exist_ok=True)
+    # همه فراخوانی‌های now در یک ثانیه
+    frozen = jdatetime.datetime(1403, 1, 1, 10, 0, 0)
+    monkeypatch.setattr(module, "jdatetime", SimpleNamespace(datetime=SimpleNamespace(now=lambda: frozen)))
+    return module
+
+
+def _contract_data(i):
+    data = {column: "" for column in BATCH_COLUMNS}
+    data.update(seller_name=f"فروشنده {i}", buyer_name=f"خریدار {i}", sim_number=f"0912{i:07d}",
+                sale_amount="1000", buyer_national_id=str(i))
+    return data
+
+
+def test_create_contract_file_never_reuses_a_name(app):
+    paths = []
+    for _ in range(3):
+        path, f = app.create_contract_file("contract_فروش_1403-01-01_100000")
+        f.close()
+        paths.append(os.path.basename(path))
+    assert paths == ["contract_فروش_1403-01-01_100000.docx", "contract_فروش_1403-01-01_100000_2.docx",
+                     "contract_فروش_1403-01-01_100000_3.docx"]
+
+
+def test_contracts_saved_in_same_second_keep_their_own_files(app, db):
+    paths = []
+    for i in range(2):
+        _, data = app.contract_data_from_row(_contract_data(i), "فروش")
+        paths.append(app.save_contract_file(app.generate_contract("قرارداد فروش", data), "فروش", data))
+    assert len(set(paths)) == 2
+    rows, _ = db.get_contracts_page()
+    by_file = {row["filename"]: row["sim_number"] for row in rows}
+    assert by_file == {os.path.basename(paths[0]): "09120000000", os.path.basename(paths[1]): "09120000001"}
+
+
+def test_batches_in_same_second_do_not_collide(app, db, tmp_path):
+    for n in range(2):
+        count, invalid = app.generate_contract_batch([_contract_data(10 * n + i) for i in range(3)], "فروش",
+                                                     str(tmp_path / f"batch{n}.zip"), workers=1)
+        assert (count, invalid) == (3, [])
+    files = [name for name in os.listdir(app.CONTRACTS_FOLDER) if name.endswith(".docx")]
+    rows, _ = db.get_contracts_page()
+    assert len(files) == 6
+    assert sorted(row["filename"] for row in rows) == sorted(files)
@@ -0,0 +1,79 @@
+"""خروجی جریانی: همه سطرها در چند تکه به CSV، XLSX و Parquet نوشته می‌شوند"""
+import csv
+
+import pytest
+
+import exports
+
+CHUNK_SIZE = 7
+
+
+@pytest.fixture
+def transactions(db):
+    """تراکنش‌هایی با صفر، یک و دو پرداخت؛ خروجی تعداد سطرهای مورد انتظار JOIN"""
+    expected = 0
+    for i in range(40):
+        payments = [{"payment_method": "نقد", "amount": 100}] * (i % 3)
+        db.record_transaction({"tx_type": "دریافت فروش", "amount": 100 * len(payments) or 50,
+                               "description": f"تراکنش {i}"}, payments)
+        expected += max(1, len(payments))
+    return expected
+
+
+def _csv_rows(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        header, *rows = list(csv.reader(f))
+    return header, rows
+
+
+def test_iter_export_chunks_streams_in_chunks(db, transactions):
+    chunks = list(db.iter_export_chunks("transactions", CHUNK_SIZE))
+    assert all(len(chunk) == CHUNK_SIZE for chunk in chunks[:-1])
+    assert 0 < len(chunks[-1]) <= CHUNK_SIZE
+    assert sum(map(len, chunks)) == transactions == db.get_export_row_count("transactions")
+
+
+def test_csv_export(db, transactions, tmp_path):
+    path = tmp_path / "out.csv"
+    progress = []
+    assert exports.export_dataset("transactions", "csv", path, lambda done, total: progress.append((done, total)),
+                                  chunk_size=CHUNK_SIZE) == transactions
+    header, rows = _csv_rows(path)
+    assert header == [name for _, name, _ in db.EXPORT_DATASETS["transactions"][1]]
+    assert len(rows) == transactions
+    assert len(progress) == -(-transactions // CHUNK_SIZE)
+    assert progress[-1] == (transactions, transactions)
+
+
+def test_xlsx_export_rolls_over_to_new_sheets(db, transactions, tmp_path, monkeypatch):
+    openpyxl = pytest.importorskip("openpyxl")
+    monkeypatch.setattr(exports, "XLSX_MAX_ROWS", 20)
+    path = tmp_path / "out.xlsx"
+    assert exports.export_dataset("transactions", "xlsx", path, chunk_size=CHUNK_SIZE) == transactions
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    sheets = [list(sheet.iter_rows(values_only=True)) for sheet in workbook.worksheets]
+    assert workbook.sheetnames[:2] == ["transactions", "transactions_2"]
+    assert len(sheets) == -(-transactions // 20)
+    assert all(rows[0][0] == "transaction_id" for rows in sheets)
+    assert all(len(rows) - 1 == 20 for rows in sheets[:-1])
+    assert sum(len(rows) - 1 for rows in sheets) == transactions
+
+
+def test_parquet_export(db, transactions, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "out.parquet"
+    assert exports.export_dataset("transactions", "parquet", path, chunk_size=CHUNK_SIZE) == transactions
+    parquet = pq.ParquetFile(path)
+    assert parquet.metadata.num_rows == transactions
+    assert parquet.metadata.num_row_groups == -(-transactions // CHUNK_SIZE)
+    table = parquet.read()
+    assert str(table.schema.field("amount").type) == "int64"
+    assert table.column("transaction_id").to_pylist() == sorted(table.column("transaction_id").to_pylist())
+
+
+@pytest.mark.parametrize("fmt", list(exports.EXPORT_FORMATS))
+def test_empty_dataset_writes_header_only(db, tmp_path, fmt):
+    if fmt != "csv":
+        pytest.importorskip({"xlsx": "openpyxl", "parquet": "pyarrow"}[fmt])
+    assert exports.export_dataset("banks", fmt, tmp_path / f"banks.{fmt}") == 0
+    assert (tmp_path / f"banks.{fmt}").stat().st_size > 0
@@ -0,0 +1,27 @@
+"""پیش‌بینی جریان نقدی: تقویم شمسی برداری و اثر چک‌های در جریان"""
+import numpy as np
+import pytest
+
+import forecast
+
+
+@pytest.mark.parametrize("start", [0, 19_800, 20_150])  # هر بازه چند تغییر سال و یک سال کبیسه دارد
+def test_jalali_parts_match_day_by_day_conversion(db, start):
+    days = np.arange(start, start + 800)
+    years, months, month_days = forecast._jalali_parts(days)
+    expected = [db.to_jalali(forecast._gregorian(day)) for day in days]
+    assert list(zip(years, months, month_days)) == [(j.year, j.month, j.day) for j in expected]
+
+
+def test_forecast_includes_in_flight_checks(db):
+    db.add_bank("ملت", "1")
+    today = db.today_epoch() // 86400
+    due = db.to_jalali(forecast._gregorian(today + 5)).strftime("%Y-%m-%d")
+    db.add_check("C1", "دریافت", 1, 1000, due)
+    db.add_check("C2", "پرداخت", 1, 300, due, status="وصول شد")
+    flows = forecast.cash_flow_forecast(days=10)
+    assert len(flows) == 10
+    assert flows["jalali_date"].iloc[5] == due
+    assert flows["checks_in"].tolist() == [0] * 5 + [1000] + [0] * 4
+    assert flows["checks_out"].sum() == 0
+    assert flows["balance"].iloc[-1] == 1000
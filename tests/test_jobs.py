@@ -0,0 +1,85 @@
+"""صف کارهای پس‌زمینه: وضعیت پایانی همیشه ثبت می‌شود و کارهای نیمه‌کاره و قدیمی پاک یا بسته می‌شوند"""
+import os
+import sqlite3
+import time
+
+import pytest
+
+import jobs
+
+
+def _wait(db, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = db.get_jobs([job_id])[0]
+        if job["status"] not in db.JOB_ACTIVE_STATUSES:
+            return job
+        time.sleep(0.02)
+    pytest.fail(f"job {job_id} did not finish")
+
+
+def _succeed(progress, count):
+    for i in range(1, count + 1):
+        progress(i, count)
+    return "result.csv", f"{count} سطر"
+
+
+def _raise(progress, error):
+    progress(1, 2)
+    raise error
+
+
+def test_job_moves_to_done(db):
+    job_id = jobs.submit("export", "خروجی", _succeed, 3)
+    job = _wait(db, job_id)
+    assert job["status"] == db.JOB_DONE
+    assert (job["result_path"], job["message"]) == ("result.csv", "3 سطر")
+    assert (job["done"], job["total"]) == (3, 3)
+    assert job["started_at"] and job["finished_at"]
+
+
+@pytest.mark.parametrize("error, message", [(ValueError("فایل نامعتبر"), "فایل نامعتبر"),
+                                            (KeyError(), "KeyError")])
+def test_raising_job_moves_to_failed(db, error, message):
+    job = _wait(db, jobs.submit("export", "خروجی", _raise, error))
+    assert job["status"] == db.JOB_FAILED
+    assert job["message"] == message
+    assert job["result_path"] is None and job["finished_at"]
+
+
+def test_final_status_retries_on_new_connection(db, monkeypatch):
+    update_job = db.update_job
+
+    def failing_final_write(job_id, **fields):
+        if "finished_at" in fields:
+            raise sqlite3.OperationalError("database is locked")
+        update_job(job_id, **fields)
+
+    monkeypatch.setattr(db, "update_job", failing_final_write)
+    job = _wait(db, jobs.submit("export", "خروجی", _succeed, 1))
+    assert job["status"] == db.JOB_DONE
+    assert job["message"] == "1 سطر"
+
+
+def test_interrupted_jobs_fail_on_startup(db):
+    queued, running, done = (db.add_job("export") for _ in range(3))
+    db.update_job(running, status=db.JOB_RUNNING)
+    db.update_job(done, status=db.JOB_DONE)
+    assert db.fail_interrupted_jobs() == 2
+    statuses = [job["status"] for job in db.get_jobs([queued, running, done])]
+    assert statuses == [db.JOB_FAILED, db.JOB_FAILED, db.JOB_DONE]
+
+
+def test_cleanup_removes_old_jobs_and_files(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_FOLDER", str(tmp_path / "exports"))
+    old_done, old_queued, recent = (db.add_job("export") for _ in range(3))
+    with db.transaction("jobs") as cur:
+        cur.execute("UPDATE jobs SET created_at = '1400-01-01 00:00:00' WHERE id IN (?, ?)", (old_done, old_queued))
+        cur.execute("UPDATE jobs SET status = ? WHERE id IN (?, ?)", (db.JOB_DONE, old_done, recent))
+    old_file, new_file = jobs.output_path("old.csv"), jobs.output_path("new.csv")
+    stale = time.time() - (jobs.RETENTION_DAYS + 1) * 86400
+    os.utime(old_file, (stale, stale))
+
+    assert jobs.cleanup() == 1
+    assert not os.path.exists(old_file) and os.path.exists(new_file)
+    assert [job["id"] for job in db.get_jobs([old_done, old_queued, recent])] == [old_queued, recent]
@@ -0,0 +1,84 @@
+"""صفحه‌بندی keyset: همه سطرها دقیقاً یک بار و به ترتیب درست برمی‌گردند"""
+import pytest
+
+
+def _all_pages(fetch_page, limit, **filters):
+    rows, cursor, pages = [], None, 0
+    while True:
+        page, cursor = fetch_page(cursor=cursor, limit=limit, **filters)
+        rows.extend(page)
+        pages += 1
+        if cursor is None:
+            return rows, pages
+
+
+def _insert_transactions(db, dates):
+    rows = []
+    for i, date in enumerate(dates):
+        epoch, ym = db.date_keys(date)
+        rows.append(("دریافت فروش" if i % 3 else "پرداخت خرید", 100 + i, date, epoch, ym, 1 + i % 2))
+    db.add_party("الف")
+    db.add_party("ب")
+    with db.transaction("transactions") as cur:
+        cur.executemany("INSERT INTO transactions (tx_type, amount, shamsi_datetime, tx_epoch, tx_jalali_ym, party_id)"
+                        " VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+
+@pytest.mark.parametrize("limit", [1, 4, 5, 50])
+def test_transactions_page_ties_on_same_time(db, limit):
+    """تراکنش‌های هم‌زمان با id از هم جدا می‌شوند و هیچ سطری تکرار یا جا نمی‌افتد"""
+    _insert_transactions(db, ["1403-01-01 10:00:00"] * 10 + ["1403-01-02 09:00:00"] * 10)
+    rows, pages = _all_pages(db.get_transactions_page, limit)
+    assert [r["id"] for r in rows] == list(range(20, 10, -1)) + list(range(10, 0, -1))
+    assert pages == max(1, -(-20 // limit))
+
+
+def test_transactions_page_filters(db):
+    dates = [f"1403-{1 + i % 6:02d}-{1 + i % 28:02d} {i % 24:02d}:30:00" for i in range(60)]
+    _insert_transactions(db, dates)
+    rows, _ = _all_pages(db.get_transactions_page, 7, party_id=2, tx_type="دریافت فروش",
+                         start_date="1403-02-01", end_date="1403-04-31")
+    expected = [i + 1 for i, date in enumerate(dates)
+                if i % 2 == 1 and i % 3 and "1403-02-01" <= date[:10] <= "1403-04-31"]
+    assert sorted(r["id"] for r in rows) == expected
+    assert [(r["tx_epoch"], r["id"]) for r in rows] == sorted(((r["tx_epoch"], r["id"]) for r in rows), reverse=True)
+
+
+def test_transactions_page_gregorian_dates(db):
+    _insert_transactions(db, ["1403-01-01 10:00:00", "1403-01-02 23:59:59", "1403-01-03 00:00:00"])
+    rows, _ = db.get_transactions_page(start_date="2024-03-20", end_date="2024-03-21")
+    assert [r["id"] for r in rows] == [2, 1]
+
+
+def test_sim_cards_page_ascending_by_number(db):
+    numbers = [f"0912{i:07d}" for i in range(0, 130, 7)]
+    for number in reversed(numbers):
+        db.add_sim_card(number, "همراه اول")
+    rows, _ = _all_pages(db.get_sim_cards_page, 6)
+    assert [r["number"] for r in rows] == numbers
+
+
+def test_parties_page_newest_first(db):
+    for i in range(11):
+        db.add_party(f"طرف {i}", party_type="مشتری" if i % 2 else "همکار")
+    rows, pages = _all_pages(db.get_parties_page, 3, party_type="مشتری")
+    assert [r["name"] for r in rows] == [f"طرف {i}" for i in (9, 7, 5, 3, 1)]
+    assert pages == 2
+
+
+@pytest.mark.parametrize("limit", [1, 3, 4, 7, 50])
+def test_transactions_with_null_epoch_are_reached(db, limit):
+    """سطرهای بدون tx_epoch (تاریخ نامعتبر) در انتهای ترتیب نزولی می‌آیند و از صفحه دوم به بعد هم دیده می‌شوند"""
+    _insert_transactions(db, ["1403-01-01 10:00:00", "تاریخ خراب", "1403-01-03 10:00:00", "",
+                              "1403-01-02 10:00:00", "1403-01-02 10:00:00", None])
+    rows, _ = _all_pages(db.get_transactions_page, limit)
+    assert [r["id"] for r in rows] == [3, 6, 5, 1, 7, 4, 2]
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 10])
+def test_keyset_page_ascending_null_group_first(db, limit):
+    _insert_transactions(db, ["1403-01-02", None, "1403-01-01", "", "1403-01-02"])
+    fetch = lambda cursor, limit: db._keyset_page(
+        "SELECT t.id, t.tx_epoch FROM transactions t", [], [], ["t.tx_epoch", "t.id"], cursor, limit, descending=False)
+    rows, _ = _all_pages(fetch, limit)
+    assert [r["id"] for r in rows] == [2, 4, 3, 1, 5]
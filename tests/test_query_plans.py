@@ -0,0 +1,64 @@
+"""پرس‌وجوهای پرتکرار باید از ایندکس مورد انتظار خود استفاده کنند (EXPLAIN QUERY PLAN)"""
+import pytest
+
+import accounting
+import forecast
+
+
+def _raw(func):
+    """تابع اصلی پشت ردیابی و cached_read تا دستورهایش واقعاً اجرا شوند"""
+    return getattr(func, "__wrapped__", func)
+
+
+EXPECTED_PLANS = [
+    ("get_transactions_page(start_date)",
+     lambda: _raw(accounting.get_transactions_page)(start_date="1403-01-01", end_date="1403-12-29"),
+     "idx_transactions_tx_epoch"),
+    ("get_transactions_page(party_id)",
+     lambda: _raw(accounting.get_transactions_page)(party_id=1), "idx_transactions_party_epoch"),
+    ("get_party_statement(party_id, range)",
+     lambda: _raw(accounting.get_party_statement)(1, "1403-01-01", "1403-12-29"), "idx_transactions_party_epoch"),
+    ("get_transactions_page(sim_card_id)",
+     lambda: _raw(accounting.get_transactions_page)(sim_card_id=1), "idx_transactions_sim_card_id"),
+    ("get_payments_grouped",
+     lambda: _raw(accounting.get_payments_grouped)([1, 2, 3]), "idx_transaction_payments_transaction_id"),
+    ("get_sim_cards_page(owner_id)",
+     lambda: _raw(accounting.get_sim_cards_page)(owner_id=1), "idx_sim_cards_current_owner_id"),
+    ("get_financial_reports(start, end)",
+     lambda: _raw(accounting.get_financial_reports)("1403-01-01", "1403-12-29"), "idx_transactions_jalali_ym"),
+    ("get_checks_due(days)",
+     lambda: _raw(accounting.get_checks_due)(30), "idx_checks_status_due"),
+    ("get_overdue_checks",
+     lambda: _raw(accounting.get_overdue_checks)(), "idx_checks_status_due"),
+    ("cash_flow_forecast",
+     lambda: _raw(forecast._cash_flow_forecast)(accounting.today_epoch() // 86400, 90, 182),
+     "idx_transactions_tx_epoch"),
+    ("get_contracts_page(search)",
+     lambda: _raw(accounting.get_contracts_page)(search="0912"), "idx_contracts_sim_number"),
+    ("search_sim_numbers(prefix)",
+     lambda: _raw(accounting.search_sim_numbers)("912", "prefix"), "idx_sim_cards_number_canonical"),
+    ("search_sim_numbers(mask)",
+     lambda: _raw(accounting.search_sim_numbers)("09*****1234", "mask"), "idx_sim_cards_number_reversed"),
+]
+
+
+def query_plans(func):
+    """اجرای func و برگرداندن EXPLAIN QUERY PLAN هر دستور SELECT که اجرا کرده است"""
+    con = accounting.get_connection()
+    statements = []
+    con.set_trace_callback(statements.append)
+    try:
+        func()
+    finally:
+        con.set_trace_callback(None)
+    return [
+        " / ".join(row[3] for row in con.execute(f"EXPLAIN QUERY PLAN {sql}"))
+        for sql in statements if sql.lstrip().upper().startswith(("SELECT", "WITH"))
+    ]
+
+
+@pytest.mark.parametrize("name, func, index", EXPECTED_PLANS, ids=[name for name, _, _ in EXPECTED_PLANS])
+def test_query_uses_index(db, name, func, index):
+    plans = query_plans(func)
+    assert plans, f"{name} هیچ دستور SELECT اجرا نکرد"
+    assert any(index in plan for plan in plans), "\n".join(plans)
@@ -0,0 +1,57 @@
+"""cached_read: نوشتن روی یک جدول فقط کش همان جدول را باطل می‌کند و داخل تراکنش نوشتنی کش استفاده نمی‌شود"""
+import pytest
+
+
+@pytest.fixture
+def reads(db):
+    calls = []
+
+    @db.cached_read("banks")
+    def bank_names():
+        calls.append("banks")
+        return [r["name"] for r in db._fetch_dicts("SELECT name FROM banks ORDER BY id")]
+
+    @db.cached_read("checks")
+    def check_count():
+        calls.append("checks")
+        return db.get_connection().execute("SELECT COUNT(*) FROM checks").fetchone()[0]
+
+    return bank_names, check_count, calls
+
+
+def test_repeated_reads_are_cached(reads):
+    bank_names, check_count, calls = reads
+    assert bank_names() == bank_names() == []
+    assert check_count() == check_count() == 0
+    assert calls == ["banks", "checks"]
+
+
+def test_write_invalidates_only_its_table(db, reads):
+    bank_names, check_count, calls = reads
+    bank_names(), check_count()
+    db.add_bank("ملت", "1")
+    assert bank_names() == ["ملت"]
+    assert check_count() == 0
+    assert calls == ["banks", "checks", "banks"]
+
+    with db.transaction("checks") as cur:
+        cur.execute("INSERT INTO checks (check_number, type, amount, status) VALUES ('C1', 'دریافت', 10, 'در جریان')")
+    assert check_count() == 1
+    assert bank_names() == ["ملت"]
+    assert calls == ["banks", "checks", "banks", "checks"]
+
+
+def test_reads_inside_write_transaction_bypass_cache(db, reads):
+    bank_names, _, calls = reads
+    assert bank_names() == []
+    with pytest.raises(RuntimeError):
+        with db.transaction("banks") as cur:
+            cur.execute("INSERT INTO banks (name, account_number) VALUES ('ملی', '2')")
+            # داده commit نشده دیده می‌شود ولی در کش نمی‌ماند
+            assert bank_names() == ["ملی"]
+            assert bank_names() == ["ملی"]
+            raise RuntimeError("rollback")
+    assert calls == ["banks", "banks", "banks"]
+    # rollback نسخه جدول را بالا نمی‌برد و نتیجه قبلی از کش برمی‌گردد
+    assert bank_names() == []
+    assert calls == ["banks", "banks", "banks"]
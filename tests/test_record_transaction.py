@@ -0,0 +1,46 @@
+"""record_transaction: تراکنش و پرداخت‌هایش با هم ثبت می‌شوند یا هیچ‌کدام"""
+import sqlite3
+
+import pytest
+
+
+def _counts(db):
+    con = db.get_connection()
+    return (con.execute("SELECT COUNT(*) FROM transactions").fetchone()[0],
+            con.execute("SELECT COUNT(*) FROM transaction_payments").fetchone()[0])
+
+
+def test_records_transaction_with_payments(db):
+    tx_id = db.record_transaction({"tx_type": "دریافت فروش", "amount": 1000}, [
+        {"payment_method": "نقد", "amount": 400},
+        {"payment_method": "کارت", "amount": 600, "reference_number": "R1"},
+    ])
+    payments = db.get_payments_by_transaction(tx_id)
+    assert sorted(p["amount"] for p in payments) == [400, 600]
+    assert _counts(db) == (1, 2)
+    assert db.check_ledger_totals() == []
+
+
+@pytest.mark.parametrize("payments", [
+    [{"payment_method": "نقد", "amount": 400}, {"payment_method": "کارت", "amount": 500}],
+    [{"payment_method": "نقد", "amount": 1200}, {"payment_method": "کارت", "amount": -200}],
+    [{"payment_method": "نقد", "amount": 0}, {"payment_method": "کارت", "amount": 1000}],
+], ids=["sum_mismatch", "negative", "zero"])
+def test_invalid_payments_write_nothing(db, payments):
+    with pytest.raises(ValueError):
+        db.record_transaction({"tx_type": "دریافت فروش", "amount": 1000}, payments)
+    assert _counts(db) == (0, 0)
+
+
+def test_failed_payment_insert_rolls_back_transaction(db):
+    """خطای پایگاه داده در درج پرداخت دوم پس از درج تراکنش، کل تراکنش را برمی‌گرداند"""
+    db.add_transaction("دریافت فروش", 500)
+    before = db.finance_summary()
+    with pytest.raises(sqlite3.Error):
+        db.record_transaction({"tx_type": "دریافت فروش", "amount": 1000}, [
+            {"payment_method": "نقد", "amount": 400},
+            {"payment_method": "کارت", "amount": 600, "notes": {"not": "bindable"}},
+        ])
+    assert _counts(db) == (1, 0)
+    assert db.check_ledger_totals() == []
+    assert db.finance_summary() == before
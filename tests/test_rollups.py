@@ -0,0 +1,93 @@
+"""جدول‌های جمع تدریجی (trigger) پس از درج، ویرایش و حذف با محاسبه از ابتدا یکی می‌مانند"""
+
+
+def test_ledger_totals_follow_transaction_writes(db):
+    ids = [db.record_transaction({"tx_type": tx_type, "amount": amount})
+           for tx_type, amount in [("دریافت فروش", 1000), ("دریافت فروش", 250), ("پرداخت خرید", 700)]]
+    assert db.check_ledger_totals() == []
+
+    db.update_transactions([
+        {"id": ids[0], "tx_type": "پرداخت خرید", "amount": 900, "description": ""},
+        {"id": ids[1], "tx_type": "دریافت فروش", "amount": 300, "description": ""},
+    ])
+    assert db.check_ledger_totals() == []
+
+    db.delete_transactions([ids[1], ids[2]])
+    assert db.check_ledger_totals() == []
+    assert db.finance_summary() == {"total_income": 0, "total_outcome": 900, "balance": -900,
+                                    "counts": {"پرداخت خرید": 1}}
+
+
+def test_check_ledger_totals_rebuild(db):
+    db.record_transaction({"tx_type": "دریافت فروش", "amount": 1000})
+    with db.transaction() as cur:
+        cur.execute("UPDATE ledger_totals SET total_amount = total_amount + 1")
+    assert db.check_ledger_totals(rebuild=True) == [("دریافت فروش", (1001, 1), (1000, 1))]
+    assert db.check_ledger_totals() == []
+
+
+def _party(db, name, national_id):
+    db.add_party(name, national_id=national_id)
+    return db.get_connection().execute("SELECT id FROM parties WHERE national_id = ?", (national_id,)).fetchone()[0]
+
+
+def test_party_balances_follow_transaction_writes(db):
+    a, b = _party(db, "الف", "1"), _party(db, "ب", "2")
+    ids = [db.record_transaction({"tx_type": tx_type, "amount": amount, "party_id": party})
+           for tx_type, amount, party in [("دریافت فروش", 1000, a), ("پرداخت خرید", 400, a), ("پرداخت خرید", 300, b)]]
+    assert db.check_party_balances() == []
+
+    db.update_transactions([{"id": ids[0], "tx_type": "دریافت فروش", "amount": 600, "description": ""}])
+    with db.transaction("transactions") as cur:
+        cur.execute("UPDATE transactions SET party_id = ? WHERE id = ?", (b, ids[1]))
+    assert db.check_party_balances() == []
+
+    db.delete_transactions([ids[2]])
+    assert db.check_party_balances() == []
+    balances = {p["id"]: (p["debit"], p["credit"], p["tx_count"]) for p in db.get_party_balances()}
+    assert balances == {a: (0, 600, 1), b: (400, 0, 1)}
+
+
+def test_party_balance_rebuild_invalidates_cached_balances(db):
+    a = _party(db, "الف", "1")
+    db.record_transaction({"tx_type": "پرداخت خرید", "amount": 500, "party_id": a})
+    with db.transaction() as cur:
+        cur.execute("UPDATE party_balances SET debit = 9")
+    db.get_party_balances.cache_clear()
+    assert db.get_party_balances()[0]["debit"] == 9
+    assert db.check_party_balances(rebuild=True)
+    assert db.get_party_balances()[0]["debit"] == 500
+
+
+def _sim(db, number):
+    return db.get_connection().execute("SELECT id FROM sim_cards WHERE number = ?", (number,)).fetchone()[0]
+
+
+def test_sim_rollups_follow_sim_card_writes(db):
+    buyer = _party(db, "خریدار", "1")
+    for number, operator, price, date in [("09120000001", "همراه اول", 100, "1403-01-05"),
+                                          ("09120000002", "همراه اول", 200, "1403-01-05"),
+                                          ("09350000003", "ایرانسل", 300, "1403-02-10")]:
+        db.add_sim_card(number, operator, price, date)
+    assert db.check_sim_rollups() == []
+
+    db.update_sim_owner(_sim(db, "09120000001"), buyer, 150)
+    with db.transaction("sim_cards") as cur:
+        cur.execute("UPDATE sim_cards SET purchase_price = 250, operator = 'ایرانسل' WHERE number = '09120000002'")
+    assert db.check_sim_rollups() == []
+
+    with db.transaction("sim_cards") as cur:
+        cur.execute("DELETE FROM sim_cards WHERE number IN ('09120000001', '09350000003')")
+    assert db.check_sim_rollups() == []
+    groups = [(g["kind"], g["operator"], g["sim_count"], g["cost"]) for g in db.get_sim_inventory_rollups()]
+    assert groups == [("stock", "ایرانسل", 1, 250)]
+
+
+def test_sim_rollup_rebuild_invalidates_cached_groups(db):
+    db.add_sim_card("09120000001", "همراه اول", 100, "1403-01-05")
+    with db.transaction() as cur:
+        cur.execute("UPDATE sim_stock_rollup SET sim_count = 9")
+    db.get_sim_inventory_rollups.cache_clear()
+    assert db.get_sim_inventory_rollups()[0]["sim_count"] == 9
+    assert db.check_sim_rollups(rebuild=True)
+    assert db.get_sim_inventory_rollups()[0]["sim_count"] == 1
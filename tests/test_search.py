@@ -0,0 +1,58 @@
+"""جستجوی متنی (FTS5) طرف حساب‌ها و سیم کارت‌ها"""
+import pytest
+
+
+@pytest.fixture
+def indexed(db):
+    db.add_party("علی رضایی", mobile="09121234567", national_id="0012345678")
+    db.add_party("علیرضا کریمی", mobile="09351112233", national_id="0098765432")
+    db.add_party("مریم یکتا", mobile="09190000000")
+    db.add_sim_card("09121234567", "همراه اول", notes="رند طلایی")
+    db.add_sim_card("9122223344", "همراه اول")
+    db.add_sim_card("+989351112233", "ایرانسل", notes="خط اعتباری")
+    return db
+
+
+def _names(rows):
+    return sorted(row["name"] for row in rows)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("علی", ["علی رضایی", "علیرضا کریمی"]),
+    ("علی رضا", ["علی رضایی"]),
+    ("كريمي", ["علیرضا کریمی"]),             # ی و ک عربی
+    ("0935", ["علیرضا کریمی"]),
+    ("۰۰۱۲۳", ["علی رضایی"]),                # ارقام فارسی در کد ملی
+    ("یکتا", ["مریم یکتا"]),
+    ('"', []),
+    ("", []),
+])
+def test_search_parties(indexed, text, expected):
+    assert _names(indexed.search_parties(text)) == expected
+
+
+def _sim_numbers(rows):
+    return sorted(row["number"] for row in rows)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("0912", ["09121234567", "9122223344"]),
+    ("912", ["09121234567", "9122223344"]),         # بدون صفر ابتدایی
+    ("+98912", ["09121234567", "9122223344"]),
+    ("۰۹۱۲۲", ["9122223344"]),
+    ("93511", ["+989351112233"]),
+    ("0935 اعتباری", ["+989351112233"]),
+    ("طلایی", ["09121234567"]),
+    ("0936", []),
+])
+def test_search_sim_cards_canonicalises_numbers(indexed, text, expected):
+    assert _sim_numbers(indexed.search_sim_cards(text)) == expected
+
+
+def test_search_index_follows_updates_and_deletes(indexed):
+    with indexed.transaction("parties", "sim_cards") as cur:
+        cur.execute("UPDATE parties SET name = 'مریم احمدی' WHERE name = 'مریم یکتا'")
+        cur.execute("DELETE FROM sim_cards WHERE number = '9122223344'")
+    assert _names(indexed.search_parties("یکتا")) == []
+    assert _names(indexed.search_parties("احمدی")) == ["مریم احمدی"]
+    assert _sim_numbers(indexed.search_sim_cards("912")) == ["09121234567"]
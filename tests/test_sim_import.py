@@ -0,0 +1,46 @@
+"""ورود گروهی سیم کارت‌ها: شماره‌های هم‌ارز تکراری‌اند و سطرهای نامعتبر با شماره سطر گزارش می‌شوند"""
+
+
+def _row(number, operator="همراه اول", **extra):
+    return {"number": number, "operator": operator, **extra}
+
+
+ROWS = [
+    _row("09121111111", "mci"),                                # 2
+    _row("+989121111111"),                                     # 3 تکراری در همان تکه
+    _row("9121111111"),                                        # 4 تکراری در تکه بعدی
+    _row("12345"),                                             # 5 شماره نامعتبر
+    _row("09122222222", "xyz"),                                # 6 اپراتور نامعتبر
+    _row("09123333333", "irancell", purchase_date="2024-03-20", purchase_price="1,200"),  # 7
+    _row("00989123333333"),                                    # 8 تکراری در تکه بعدی
+    _row("09124444444", purchase_price="abc"),                 # 9 قیمت نامعتبر
+    _row("09125555555"),                                       # 10 از قبل در پایگاه داده
+    _row("09126666666", "رایتل", purchase_date="1403-13-01"),  # 11 تاریخ نامعتبر
+    _row("۰۹۱۲۷۷۷۷۷۷۷", "رایتل"),                              # 12
+]
+
+
+def test_import_sim_cards_reports_rows(db):
+    db.add_sim_card("09125555555", "همراه اول")
+    progress = []
+    result = db.import_sim_cards(ROWS, chunk_size=2, progress=progress.append)
+
+    assert result["inserted"] == 3
+    assert [line for line, _ in result["duplicates"]] == [3, 4, 8, 10]
+    assert [(line, reason) for line, _, reason in result["invalid"]] == [
+        (5, "شماره نامعتبر"), (6, "اپراتور نامعتبر"), (9, "قیمت خرید نامعتبر"), (11, "تاریخ خرید نامعتبر")]
+    assert progress == [2, 4, 6, 8, 10, 11]
+
+    cards = {row[0]: row[1:] for row in db.get_connection().execute(
+        "SELECT number_canonical, operator, purchase_date, purchase_price FROM sim_cards")}
+    assert set(cards) == {"09121111111", "09123333333", "09125555555", "09127777777"}
+    assert cards["09121111111"][0] == "همراه اول"
+    assert cards["09123333333"] == ("ایرانسل", "1403-01-01", 1200)
+    assert db.check_sim_rollups() == []
+
+
+def test_import_sim_cards_is_idempotent(db):
+    db.import_sim_cards(ROWS, chunk_size=3)
+    result = db.import_sim_cards(ROWS, chunk_size=3)
+    assert result["inserted"] == 0
+    assert [line for line, _ in result["duplicates"]] == [2, 3, 4, 7, 8, 10, 12]
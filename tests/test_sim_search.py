@@ -0,0 +1,48 @@
+"""جستجوی شماره سیم کارت با پیشوند، پسوند و الگوی رند"""
+import pytest
+
+NUMBERS = ["09121234567", "09121231212", "09123451212", "09351231212", "09127777777", "09121112222"]
+
+
+@pytest.fixture
+def sims(db):
+    for number in NUMBERS:
+        db.add_sim_card(number, "ایرانسل" if number.startswith("0935") else "همراه اول")
+    return db
+
+
+def _numbers(rows):
+    return sorted(row["number"] for row in rows)
+
+
+@pytest.mark.parametrize("pattern, kind, expected", [
+    ("912", "prefix", sorted(n for n in NUMBERS if n.startswith("0912"))),
+    ("+98935", "prefix", ["09351231212"]),
+    ("1212", "suffix", ["09121231212", "09123451212", "09351231212"]),
+    ("0912***1212", "mask", ["09121231212", "09123451212"]),
+    ("09*****1212", "mask", ["09121231212", "09123451212", "09351231212"]),
+    ("0912***ABAB", "mask", ["09121231212", "09123451212"]),
+    ("0912AAAAAAA", "mask", ["09127777777"]),
+    ("0912xxxAAAA", "mask", ["09121112222", "09127777777"]),
+    ("0912???AAAB", "mask", []),
+    ("0912123AABB", "mask", []),
+    ("0912111AAAA", "mask", ["09121112222"]),
+], ids=lambda value: value if isinstance(value, str) else None)
+def test_search_sim_numbers(sims, pattern, kind, expected):
+    assert _numbers(sims.search_sim_numbers(pattern, kind)) == expected
+
+
+def test_distinct_letters_need_distinct_digits(sims):
+    # AB با رقم‌های یکسان (مثل 7777) نباید منطبق شود
+    assert _numbers(sims.search_sim_numbers("0912777ABAB", "mask")) == []
+
+
+def test_operator_filter(sims):
+    assert _numbers(sims.search_sim_numbers("09*****1212", "mask", operator="ایرانسل")) == ["09351231212"]
+
+
+@pytest.mark.parametrize("pattern, kind", [("0912***", "mask"), ("0912#**1212", "mask"), ("12a", "prefix"),
+                                           ("912", "other")])
+def test_invalid_patterns(sims, pattern, kind):
+    with pytest.raises(ValueError):
+        sims.search_sim_numbers(pattern, kind)
@@ -0,0 +1,207 @@
+"""ردیابی زمان اجرای توابع و دستورهای SQL که در زمان اجرا روشن و خاموش می‌شود.
+
+توابعی که با traced پوشانده شده‌اند (توابع عمومی accounting.py و تولید قرارداد) وقتی ردیابی خاموش است
+فقط یک بررسی پرچم اضافه دارند. وقتی روشن است:
+  - زمان هر فراخوانی و تعداد سطرهای خروجی در هیستوگرام تابع ثبت می‌شود
+  - در طول بیرونی‌ترین فراخوانی، set_trace_callback روی اتصال thread جاری نصب می‌شود و زمان هر دستور
+    (از شروع آن تا شروع دستور بعدی یا پایان فراخوانی) و تعداد سطرهای تغییرکرده در هیستوگرام دستور ثبت می‌شود
+  - کندترین دستورها همراه با EXPLAIN QUERY PLAN نگه داشته می‌شوند
+"""
+import bisect
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+# مرز بالای دسته‌های هیستوگرام به میلی‌ثانیه (دسته آخر: بیشتر از آخرین مرز)
+HISTOGRAM_BOUNDS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+SLOW_QUERY_LIMIT = 20
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+# تابعی که اتصال SQLite thread جاری را برمی‌گرداند (accounting.get_connection)؛ بدون آن فقط زمان توابع ثبت می‌شود
+connection_getter = None
+
+_enabled = os.environ.get("ACCOUNTING_TRACE") == "1"
+_lock = threading.Lock()
+_local = threading.local()
+_functions = {}
+_statements = {}
+_slowest = []  # (مدت، sql کامل، تابع، plan) به ترتیب نزولی مدت
+_started = time.time()
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def is_enabled():
+    return _enabled
+
+def set_enabled(enabled):
+    global _enabled
+    _enabled = bool(enabled)
+
+def reset():
+    global _started
+    with _lock:
+        _functions.clear()
+        _statements.clear()
+        _slowest.clear()
+        _started = time.time()
+
+
+# ===== ثبت آمار =====
+def _new_stats():
+    return {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "histogram": [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)}
+
+def _record(table, key, elapsed_ms, rows):
+    stats = table.get(key)
+    if stats is None:
+        stats = table[key] = _new_stats()
+    stats["count"] += 1
+    stats["total_ms"] += elapsed_ms
+    stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+    stats["rows"] += rows or 0
+    stats["histogram"][bisect.bisect_left(HISTOGRAM_BOUNDS_MS, elapsed_ms)] += 1
+
+def normalize_sql(sql):
+    """متن دستور با مقادیر ثابت جایگزین‌شده با ? تا دستورهای هم‌شکل با هم جمع شوند"""
+    return _SPACE_RE.sub(" ", _LITERAL_RE.sub("?", sql)).strip()
+
+def _result_rows(result):
+    """تعداد سطرهای خروجی توابع خواندنی: فهرست، (سطرها، cursor) صفحه‌بندی یا dict با کلید rows"""
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple) and result and isinstance(result[0], list):
+        return len(result[0])
+    if isinstance(result, dict) and isinstance(result.get("rows"), list):
+        return len(result["rows"])
+    return 0
+
+
+# ===== ردیابی دستورهای SQL =====
+class _CallState:
+    """وضعیت ردیابی بیرونی‌ترین فراخوانی در thread جاری"""
+
+    def __init__(self, con):
+        self.con = con
+        self.stack = []
+        self.pending = None  # (sql، زمان شروع، total_changes در شروع، تابع)
+        self.finished = []
+
+    def on_statement(self, sql):
+        if sql.startswith("--"):
+            # دستورهای داخل trigger هنگام اجرای دستور والد گزارش می‌شوند؛ زمانشان جزو همان دستور است
+            return
+        now = time.perf_counter()
+        self.close_pending(now)
+        self.pending = (sql, now, self.con.total_changes, self.stack[-1] if self.stack else "")
+
+    def close_pending(self, now):
+        if self.pending is None:
+            return
+        sql, start, changes, function = self.pending
+        self.pending = None
+        self.finished.append((sql, (now - start) * 1e3, self.con.total_changes - changes, function))
+
+def _explain(con, sql):
+    if not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    try:
+        return [row[3] for row in con.execute(f"EXPLAIN QUERY PLAN {sql}")]
+    except sqlite3.Error:
+        return None
+
+def _flush_statements(state):
+    """ثبت دستورهای یک فراخوانی؛ EXPLAIN فقط برای دستوری اجرا می‌شود که وارد فهرست کندترین‌ها شود"""
+    state.close_pending(time.perf_counter())
+    slow = []
+    with _lock:
+        for sql, elapsed_ms, changes, function in state.finished:
+            _record(_statements, normalize_sql(sql), elapsed_ms, changes)
+            if len(_slowest) < SLOW_QUERY_LIMIT or elapsed_ms > _slowest[-1][0]:
+                slow.append((elapsed_ms, sql, function))
+    if not slow:
+        return
+    entries = [(elapsed_ms, sql, function, _explain(state.con, sql)) for elapsed_ms, sql, function in slow]
+    with _lock:
+        _slowest.extend(entries)
+        _slowest.sort(key=lambda entry: entry[0], reverse=True)
+        del _slowest[SLOW_QUERY_LIMIT:]
+
+
+# ===== پوشاندن توابع =====
+def _traced_call(name, func, args, kwargs):
+    state = getattr(_local, "state", None)
+    outer = state is None
+    if outer:
+        con = connection_getter() if connection_getter else None
+        state = _CallState(con)
+        if con is not None:
+            con.set_trace_callback(state.on_statement)
+        _local.state = state
+    state.stack.append(name)
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1e3
+        state.stack.pop()
+        if outer:
+            _local.state = None
+            if state.con is not None:
+                state.con.set_trace_callback(None)
+                _flush_statements(state)
+    with _lock:
+        _record(_functions, name, elapsed_ms, _result_rows(result))
+    return result
+
+def traced(func):
+    """ثبت زمان و سطرهای func (و دستورهای SQL آن) وقتی ردیابی روشن است.
+    __wrapped__ به تابع زیرین (پشت کش cached_read، اگر باشد) اشاره می‌کند."""
+    name = func.__qualname__ if func.__module__ == "__main__" else f"{func.__module__}.{func.__qualname__}"
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        return _traced_call(name, func, args, kwargs)
+
+    wrapper.__wrapped__ = getattr(func, "__wrapped__", func)
+    return wrapper
+
+
+# ===== گزارش =====
+def _summary(stats):
+    count = stats["count"]
+    return {
+        "count": count,
+        "total_ms": round(stats["total_ms"], 3),
+        "mean_ms": round(stats["total_ms"] / count, 3) if count else 0,
+        "max_ms": round(stats["max_ms"], 3),
+        "rows": stats["rows"],
+        "histogram": dict(zip([f"<={b}ms" for b in HISTOGRAM_BOUNDS_MS] + [f">{HISTOGRAM_BOUNDS_MS[-1]}ms"],
+                              stats["histogram"])),
+    }
+
+def snapshot():
+    """آمار فعلی: توابع و دستورها (به ترتیب مجموع زمان) و کندترین دستورها با plan"""
+    with _lock:
+        functions = {name: _summary(stats) for name, stats in _functions.items()}
+        statements = {sql: _summary(stats) for sql, stats in _statements.items()}
+        slowest = [{"elapsed_ms": round(elapsed_ms, 3), "sql": sql, "function": function, "plan": plan}
+                   for elapsed_ms, sql, function, plan in _slowest]
+    by_total = lambda item: item[1]["total_ms"]
+    return {
+        "enabled": _enabled,
+        "since": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(_started)),
+        "histogram_bounds_ms": list(HISTOGRAM_BOUNDS_MS),
+        "functions": dict(sorted(functions.items(), key=by_total, reverse=True)),
+        "statements": dict(sorted(statements.items(), key=by_total, reverse=True)),
+        "slowest": slowest,
+    }
+
+def export_json():
+    return json.dumps(snapshot(), ensure_ascii=False, indent=2)